@@ -0,0 +1,102 @@
+"""
+Micro-benchmark for the comment tree builder.
+
+Compares the previous recursive builder from api.py, which scans every comment
+to find the replies of each comment, with utils.build_comment_tree. Two shapes
+are measured: a wide thread (every comment replies to one of the first few
+comments) and a deep thread (every comment replies to the previous one). The
+previous builder is quadratic, so it is skipped past 3,000 comments, and it
+overflows the recursion limit on deep threads.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/bench_comment_tree.py
+"""
+
+import random
+import time
+from types import SimpleNamespace
+
+from deaddit.utils import build_comment_tree
+
+SIZES = [1_000, 3_000, 30_000]
+LEGACY_MAX_SIZE = 3_000
+
+
+def legacy_build_comment_tree(comments):
+    """The implementation replaced by utils.build_comment_tree."""
+    comment_map = {comment.id: comment for comment in comments}
+
+    def format_comment(comment):
+        formatted_comment = {
+            "id": comment.id,
+            "user": comment.user,
+            "content": comment.content.replace("reddit", "deaddit"),
+            "parent_id": comment.parent_id,
+            "replies": [],
+        }
+        for _reply_id, reply_comment in comment_map.items():
+            if reply_comment.parent_id == comment.id:
+                formatted_comment["replies"].append(format_comment(reply_comment))
+        return formatted_comment
+
+    return [
+        format_comment(comment)
+        for comment in comments
+        if comment.parent_id is None or comment.parent_id == ""
+    ]
+
+
+def format_comment(comment):
+    return {
+        "id": comment.id,
+        "user": comment.user,
+        "content": comment.content,
+        "parent_id": comment.parent_id,
+    }
+
+
+def make_comment(comment_id, parent_id):
+    return SimpleNamespace(
+        id=comment_id, parent_id=parent_id, user="user", content="a comment"
+    )
+
+
+def make_wide_thread(size):
+    return [
+        make_comment(i, None if i < 10 else random.randint(1, 10))
+        for i in range(1, size + 1)
+    ]
+
+
+def make_deep_thread(size):
+    return [make_comment(i, None if i == 1 else i - 1) for i in range(1, size + 1)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    try:
+        func(*args)
+    except RecursionError:
+        return f"{'overflow':>12}"
+    return f"{(time.perf_counter() - start) * 1000:12.1f}"
+
+
+def main():
+    print(f"{'comments':>10} {'shape':>6} {'legacy ms':>12} {'linear ms':>12}")
+    for size in SIZES:
+        for shape, make_thread in (
+            ("wide", make_wide_thread),
+            ("deep", make_deep_thread),
+        ):
+            comments = make_thread(size)
+            legacy = (
+                timed(legacy_build_comment_tree, comments)
+                if size <= LEGACY_MAX_SIZE
+                else f"{'skipped':>12}"
+            )
+            linear = timed(build_comment_tree, comments, format_comment)
+            print(f"{size:>10} {shape:>6} {legacy} {linear}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Fuzz corpus and throughput benchmark for completions.extract_json_object.
+
+Generates model-like responses around random post, comment, user and
+subdeaddit objects: chatter, code fences and <think> blocks around the object,
+braces and quotes inside strings, and broken JSON (single quotes, bare keys,
+trailing commas, Python literals, raw newlines, unescaped quotes and
+apostrophes, truncation). Each parser is scored on how many objects it
+recovers, how many of those equal the generated object (truncated responses
+only count as recovered), and its throughput, against copies of the parsers it
+replaced in jobs and loader.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/bench_json_extract.py
+"""
+
+import json
+import random
+import re
+import time
+
+from deaddit.completions import extract_json_object
+
+SEED = 24
+CORPUS_SIZE = 2000
+ROUNDS = 5
+MUTATIONS = [
+    "single_quotes",
+    "bare_keys",
+    "trailing_commas",
+    "python_literals",
+    "raw_newlines",
+    "loose_quotes",
+]
+PREFIXES = [
+    "",
+    "Sure! Here is the JSON:\n",
+    "```json\n",
+    "Here is {your} post:\n```\n",
+    '<think>Plan the post, maybe {"title": "draft"} first.</think>\n',
+]
+SUFFIXES = [
+    "",
+    "\n```",
+    "\n```\nLet me know if you want changes {or more posts}!",
+    "\n\nThis post fits the community's tone.",
+]
+WORDS = (
+    "the a community post thread people think it's don't really {braces} "
+    '{"nested": 1} idea question answer week today honestly garden code'
+).split()
+
+
+def legacy_parse_json_response(response):
+    """The extraction replaced in jobs._parse_json_response."""
+    response = response.strip()
+    response = re.sub(
+        r"<think>.*?</think>", "", response, flags=re.DOTALL | re.IGNORECASE
+    )
+    response = response.strip()
+    json_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response, re.DOTALL)
+    if json_match:
+        response = json_match.group(1)
+    else:
+        start_idx = response.find("{")
+        if start_idx != -1:
+            brace_count = 0
+            end_idx = start_idx
+            for i in range(start_idx, len(response)):
+                if response[i] == "{":
+                    brace_count += 1
+                elif response[i] == "}":
+                    brace_count -= 1
+                    if brace_count == 0:
+                        end_idx = i + 1
+                        break
+            if brace_count == 0:
+                response = response[start_idx:end_idx]
+            else:
+                response = response[start_idx:]
+                if brace_count > 0:
+                    response += "}" * brace_count
+    response = re.sub(r",\s*}", "}", response)
+    response = re.sub(r",\s*]", "]", response)
+    try:
+        return json.loads(response)
+    except json.JSONDecodeError:
+        return None
+
+
+def legacy_fix_json(json_str):
+    json_str = json_str.replace("'", '"')
+    json_str = re.sub(r",\s*}", "}", json_str)
+    json_str = re.sub(r",\s*]", "]", json_str)
+    json_str = re.sub(r'"\s*}\s*"', '",\n"', json_str)
+    json_str = re.sub(r"(\w+)(?=\s*:)", r'"\1"', json_str)
+    json_str = re.sub(r"^[^{]*", "", json_str)
+    json_str = re.sub(r"[^}]*$", "", json_str)
+    json_str = json_str.replace("<p>", "<br>")
+    json_str = json_str.replace("</p>", "")
+    json_str = json_str.replace("\\n", "<br>")
+    return json_str.strip()
+
+
+def legacy_parse_data(generated_text):
+    """The extraction replaced in loader.parse_data."""
+    generated_text = re.sub(
+        r"<think>.*?</think>", "", generated_text, flags=re.DOTALL | re.IGNORECASE
+    )
+    generated_text = generated_text.strip()
+    json_str = ""
+    brace_count = 0
+    in_json = False
+    for line in generated_text.split("\n"):
+        if "{" in line and not in_json:
+            in_json = True
+        if in_json:
+            json_str += line + "\n"
+            brace_count += line.count("{") - line.count("}")
+        if brace_count == 0 and in_json:
+            break
+    if brace_count > 0:
+        json_str += "}" * brace_count
+    if not json_str:
+        return None
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        try:
+            return json.loads(legacy_fix_json(json_str))
+        except json.JSONDecodeError:
+            return None
+
+
+def make_text(words):
+    sentence = " ".join(random.choice(WORDS) for _ in range(words))
+    if random.random() < 0.3:
+        sentence += ' and then "hi" to everyone'
+    if random.random() < 0.3:
+        sentence += "\n\nSecond paragraph."
+    return sentence
+
+
+def make_object():
+    kind = random.choice(["post", "comment", "user", "subdeaddit", "posts"])
+    if kind == "post":
+        return {"title": make_text(6), "content": make_text(60), "type": "discussion"}
+    if kind == "comment":
+        return {"content": make_text(30), "upvotes": random.randint(0, 500)}
+    if kind == "user":
+        return {
+            "username": f"user_{random.randint(1, 9999)}",
+            "age": random.randint(18, 80),
+            "interests": [make_text(2) for _ in range(3)],
+            "verified": random.random() < 0.5,
+            "bio": make_text(20) if random.random() < 0.7 else None,
+        }
+    if kind == "subdeaddit":
+        return {
+            "name": f"Sub{random.randint(1, 9999)}",
+            "description": make_text(80),
+            "post_types": ["discussion", "question", "story"],
+        }
+    return {"posts": [{"title": make_text(6), "content": make_text(60)}]}
+
+
+def render(value, style):
+    """Serialize like json.dumps, with the mistakes enabled in style."""
+    if isinstance(value, dict):
+        items = [
+            f"{render_key(key, style)}: {render(item, style)}"
+            for key, item in value.items()
+        ]
+        return "{" + render_items(items, style) + "}"
+    if isinstance(value, list):
+        return "[" + render_items([render(item, style) for item in value], style) + "]"
+    if isinstance(value, str):
+        return render_string(value, style)
+    if "python_literals" in style and (value is None or isinstance(value, bool)):
+        return repr(value)
+    return json.dumps(value)
+
+
+def render_key(key, style):
+    return key if "bare_keys" in style else render_string(key, style)
+
+
+def render_items(items, style):
+    joined = ", ".join(items)
+    return joined + "," if items and "trailing_commas" in style else joined
+
+
+def render_string(value, style):
+    text = json.dumps(value, ensure_ascii=False)[1:-1]
+    if "raw_newlines" in style:
+        text = text.replace("\\n", "\n")
+    if "single_quotes" in style:
+        text = text.replace('\\"', '"')
+        if "loose_quotes" not in style:
+            text = text.replace("'", "\\'")
+        # Otherwise apostrophes stay unescaped, as in 'It's a test'
+        return f"'{text}'"
+    if "loose_quotes" in style:
+        # Quoted words in prose, unescaped quotes around JSON are ambiguous
+        text = text.replace('\\"hi\\"', '"hi"')
+    return f'"{text}"'
+
+
+def make_corpus(size, broken):
+    """Build (response, expected object or None if truncated) pairs."""
+    corpus = []
+    for _ in range(size):
+        value = make_object()
+        style = set(random.sample(MUTATIONS, random.randint(1, 3))) if broken else set()
+        text = render(value, style)
+        if broken and random.random() < 0.15:
+            text = text[: random.randint(len(text) // 2, len(text) - 1)]
+            value = None
+        corpus.append((random.choice(PREFIXES) + text + random.choice(SUFFIXES), value))
+    return corpus
+
+
+def score(parser, corpus):
+    recovered = exact = 0
+    for response, expected in corpus:
+        result = parser(response)
+        if isinstance(result, dict):
+            recovered += 1
+            exact += expected is not None and result == expected
+    return recovered, exact
+
+
+def throughput(parser, corpus):
+    size = sum(len(response) for response, _ in corpus) * ROUNDS
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for response, _ in corpus:
+            parser(response)
+    elapsed = time.perf_counter() - start
+    return size / elapsed / 1e6, elapsed / (len(corpus) * ROUNDS) * 1e6
+
+
+def main():
+    random.seed(SEED)
+    corpora = {
+        "clean": make_corpus(CORPUS_SIZE, broken=False),
+        "fuzz": make_corpus(CORPUS_SIZE, broken=True),
+    }
+    parsers = {
+        "jobs legacy": legacy_parse_json_response,
+        "loader legacy": legacy_parse_data,
+        "extract": extract_json_object,
+    }
+
+    print(
+        f"{'corpus':>6} {'parser':>14} {'recovered':>10} {'exact':>7} "
+        f"{'MB/s':>7} {'us/resp':>8}"
+    )
+    for name, corpus in corpora.items():
+        for label, parser in parsers.items():
+            recovered, exact = score(parser, corpus)
+            rate, per_response = throughput(parser, corpus)
+            print(
+                f"{name:>6} {label:>14} {recovered:>10} {exact:>7} "
+                f"{rate:7.1f} {per_response:8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
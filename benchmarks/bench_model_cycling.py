@@ -0,0 +1,99 @@
+"""
+Micro-benchmark for the model round-robin interleaver.
+
+Compares the previous list.pop(0) pagination with a page drawn from
+utils.interleave_by_model, as the feed builder draws it, for the first page
+and a deep page. The previous implementation is quadratic, so it is skipped
+past 100k posts.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/bench_model_cycling.py
+"""
+
+import random
+import time
+from itertools import cycle, islice
+from types import SimpleNamespace
+
+from deaddit.utils import interleave_by_model
+
+SIZES = [10_000, 100_000, 1_000_000]
+MODELS = ["llama3", "gpt-4", "claude-3-haiku", "mistral-7b", "qwen"]
+POSTS_PER_PAGE = 20
+LEGACY_MAX_SIZE = 100_000
+
+
+def legacy_paginate(all_posts, all_models, page, posts_per_page):
+    """The implementation replaced by the lazy interleaver."""
+    models_copy = all_models.copy()
+    random.shuffle(models_copy)
+    model_cycle = cycle(models_copy)
+    posts_by_model = {model: [] for model in models_copy}
+    for post in all_posts:
+        if post.model in posts_by_model:
+            posts_by_model[post.model].append(post)
+    ordered_posts = []
+    while len(ordered_posts) < len(all_posts):
+        current_model = next(model_cycle)
+        if posts_by_model[current_model]:
+            ordered_posts.append(posts_by_model[current_model].pop(0))
+    offset = (page - 1) * posts_per_page
+    return ordered_posts[offset : offset + posts_per_page]
+
+
+def interleaved_page(lanes, all_models, page, posts_per_page):
+    """Draw a page from per-model lanes, one post past it to detect more."""
+    models_copy = all_models.copy()
+    random.shuffle(models_copy)
+    offset = (page - 1) * posts_per_page
+    drawn = list(
+        islice(interleave_by_model(lanes, models_copy), page * posts_per_page + 1)
+    )
+    return drawn[offset : offset + posts_per_page]
+
+
+def group_by_model(posts):
+    lanes = {model: [] for model in MODELS}
+    for post in posts:
+        lanes[post.model].append(post)
+    return lanes
+
+
+def grouped_page(posts, all_models, page, posts_per_page):
+    return interleaved_page(group_by_model(posts), all_models, page, posts_per_page)
+
+
+def make_posts(size):
+    return [SimpleNamespace(id=i, model=random.choice(MODELS)) for i in range(size)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    print(
+        f"{'posts':>10} {'page':>6} {'legacy ms':>12} {'grouped ms':>11} "
+        f"{'lanes ms':>10}"
+    )
+    for size in SIZES:
+        posts = make_posts(size)
+        lanes = group_by_model(posts)
+
+        for page in (1, 500):
+            legacy = (
+                f"{timed(legacy_paginate, posts, MODELS, page, POSTS_PER_PAGE):12.1f}"
+                if size <= LEGACY_MAX_SIZE
+                else f"{'skipped':>12}"
+            )
+            # Grouping a flat list first, or per-model lanes standing in for
+            # database cursors
+            grouped = timed(grouped_page, posts, MODELS, page, POSTS_PER_PAGE)
+            per_model = timed(interleaved_page, lanes, MODELS, page, POSTS_PER_PAGE)
+            print(f"{size:>10} {page:>6} {legacy} {grouped:11.2f} {per_model:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,8 @@ app = Flask(__name__, static_folder="static")
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///deaddit.db"
 
 # Configure caching
-app.config["CACHE_TYPE"] = "simple"  # Use simple in-memory cache for single-user app
+# Simple in-memory LRU cache for single-user app, with hit/miss/eviction counters
+app.config["CACHE_TYPE"] = "deaddit.cache_backend.LRUSimpleCache"
 app.config["CACHE_DEFAULT_TIMEOUT"] = 300  # 5 minutes default timeout
 
 db = SQLAlchemy(app)
@@ -43,7 +44,7 @@ if not API_TOKEN:
 
 @app.before_request
 def authenticate():
-    if request.path.startswith("/api/ingest"):
+    if request.path.startswith(("/api/ingest", "/api/export")):
         token = request.headers.get("Authorization")
         # Use Config to get API_TOKEN (database first, then environment)
         api_token = None
@@ -77,14 +78,35 @@ def inject_config():
     }
 
 
+# Keep the in-process cache size in sync with the CACHE_THRESHOLD setting
+def apply_cache_threshold(key):
+    if key != "CACHE_THRESHOLD":
+        return
+    try:
+        cache.cache.threshold = int(Config.get("CACHE_THRESHOLD"))
+    except (TypeError, ValueError):
+        logger.warning("Invalid CACHE_THRESHOLD setting, keeping the current one")
+
+
 with app.app_context():
     db.create_all()
+    # Add columns introduced after the database was created
+    from .counters import COUNTER_COLUMNS, refresh_counts
+    from .schema import rewrite_reddit_references, upgrade_schema
+
+    if COUNTER_COLUMNS & set(upgrade_schema()):
+        refresh_counts()
+        db.session.commit()
+    rewrite_reddit_references()
     # Set SECRET_KEY from config system
     app.config["SECRET_KEY"] = Config.get("SECRET_KEY")
     # Configure session settings for admin authentication
     app.config["PERMANENT_SESSION_LIFETIME"] = 24 * 60 * 60  # 24 hours
     # Initialize default settings if database is empty
     Config.initialize_defaults()
+    # Cap the number of entries held by the in-process cache, now and on change
+    Config.subscribe(apply_cache_threshold)
+    apply_cache_threshold("CACHE_THRESHOLD")
 
     # Check API_TOKEN status using Config (database first, then environment)
     if not Config.is_api_token_set():
@@ -92,10 +114,13 @@ with app.app_context():
             "No API_TOKEN set in database or environment. Admin and API routes will be publicly accessible."
         )
     
-    # Restart any pending jobs after app restart
+    # Restart any pending jobs after app restart, worker processes claim
+    # queued jobs themselves
     try:
-        from .jobs import restart_pending_jobs
-        restart_pending_jobs()
+        from .jobs import WORKER_PROCESS_ENV, restart_pending_jobs
+
+        if not os.environ.get(WORKER_PROCESS_ENV):
+            restart_pending_jobs()
     except Exception as e:
         logger.error(f"Failed to restart pending jobs: {e}")
 
@@ -121,7 +146,7 @@ def handle_exception(e):
 
 
 # Import routes and handlers after app/db initialization
-from . import websocket  # noqa: E402, F401
+from . import commands, websocket  # noqa: E402, F401
 from .admin import admin_bp  # noqa: E402
 from .api import *  # noqa: E402, F403
 from .routes import *  # noqa: E402, F403
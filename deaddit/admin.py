@@ -20,8 +20,16 @@ from flask import (
 from loguru import logger
 from sqlalchemy import desc
 
-from deaddit import db
+from deaddit import db, http_client
+from deaddit.authors import invalidate_author_index
+from deaddit.caching import (
+    get_cache_stats,
+    invalidate_post_caches,
+    invalidate_tags,
+    subdeaddit_models_tag,
+)
 from deaddit.config import Config
+from deaddit.counters import refresh_counts
 from deaddit.jobs import cancel_job, create_job, get_job_status, get_queue_stats
 from deaddit.models import (
     ApiEndpointConfig,
@@ -35,6 +43,8 @@ from deaddit.models import (
     Subdeaddit,
     User,
 )
+from deaddit.process_stats import get_worker_stats
+from deaddit.prompt_cache import get_prompt_cache_stats
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -44,15 +54,13 @@ def fetch_all_models_from_api(api_url, api_key, timeout=30):
     Fetch all models from an AI API with comprehensive pagination support.
     Tries multiple pagination methods and fallbacks to ensure we get all models.
     """
-    import requests
-
     headers = {"Authorization": f"Bearer {api_key}"}
     all_models = []
 
     # Strategy 1: Try single request first (most APIs return all models this way)
     try:
         logger.info("Attempting to fetch all models in single request...")
-        response = requests.get(
+        response = http_client.get(
             f"{api_url.rstrip('/')}/models", headers=headers, timeout=timeout
         )
 
@@ -107,7 +115,7 @@ def fetch_all_models_from_api(api_url, api_key, timeout=30):
                 # Remove None values from params
                 params = {k: v for k, v in params.items() if v is not None}
 
-                response = requests.get(
+                response = http_client.get(
                     f"{api_url.rstrip('/')}/models",
                     headers=headers,
                     params=params,
@@ -400,9 +408,15 @@ def generate_post():
     replies = request.form.get("replies", "5-10")
     model = request.form.get("model")
     wait = int(request.form.get("wait", 0))
+    concurrency = int(request.form.get("concurrency", 1))
     priority = int(request.form.get("priority", 5))
 
-    parameters = {"count": count, "wait": wait, "replies": replies}
+    parameters = {
+        "count": count,
+        "wait": wait,
+        "replies": replies,
+        "concurrency": concurrency,
+    }
     if subdeaddit:
         parameters["subdeaddit"] = subdeaddit
     if model:
@@ -429,9 +443,10 @@ def generate_comment():
     subdeaddit = request.form.get("subdeaddit")
     model = request.form.get("model")
     wait = int(request.form.get("wait", 0))
+    concurrency = int(request.form.get("concurrency", 1))
     priority = int(request.form.get("priority", 5))
 
-    parameters = {"count": count, "wait": wait}
+    parameters = {"count": count, "wait": wait, "concurrency": concurrency}
     if post_id:
         parameters["post_id"] = int(post_id)
     if subdeaddit:
@@ -603,6 +618,37 @@ def jobs_stats_api():
     return jsonify(stats)
 
 
+@admin_bp.route("/api/cache/stats")
+@admin_required
+def cache_stats_api():
+    """API endpoint to get cache hit, miss and eviction counters."""
+    return jsonify(get_cache_stats())
+
+
+@admin_bp.route("/api/http/stats")
+@admin_required
+def http_stats_api():
+    """
+    API endpoint to get connection reuse counters of the HTTP client, of this
+    process and of the worker processes running jobs.
+    """
+    workers = get_worker_stats()
+    stats = http_client.get_http_stats(worker.http or {} for worker in workers)
+    return jsonify({**stats, "worker_processes": len(workers)})
+
+
+@admin_bp.route("/api/prompt-cache/stats")
+@admin_required
+def prompt_cache_stats_api():
+    """
+    API endpoint to get prompt prefix cache hit rates per model, of this
+    process and of the worker processes running jobs.
+    """
+    workers = get_worker_stats()
+    stats = get_prompt_cache_stats(worker.prompt_cache or {} for worker in workers)
+    return jsonify({**stats, "worker_processes": len(workers)})
+
+
 @admin_bp.route("/content")
 @admin_required
 def content():
@@ -715,13 +761,22 @@ def api_delete_user(username):
         # Get impact stats before deletion
         posts_count = Post.query.filter_by(user=username).count()
         comments_count = Comment.query.filter_by(user=username).count()
+        commented_post_ids = [
+            post_id
+            for (post_id,) in db.session.query(Comment.post_id)
+            .filter_by(user=username)
+            .distinct()
+        ]
 
         # Delete associated content (cascade should handle this, but being explicit)
         Comment.query.filter_by(user=username).delete()
         Post.query.filter_by(user=username).delete()
 
         db.session.delete(user)
+        refresh_counts(commented_post_ids)
         db.session.commit()
+        invalidate_post_caches(commented_post_ids)
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -751,12 +806,19 @@ def api_bulk_delete_users():
         deleted_count = 0
         total_posts = 0
         total_comments = 0
+        commented_post_ids = set()
 
         for username in usernames:
             user = User.query.get(username)
             if user:
                 posts_count = Post.query.filter_by(user=username).count()
                 comments_count = Comment.query.filter_by(user=username).count()
+                commented_post_ids.update(
+                    post_id
+                    for (post_id,) in db.session.query(Comment.post_id)
+                    .filter_by(user=username)
+                    .distinct()
+                )
 
                 Comment.query.filter_by(user=username).delete()
                 Post.query.filter_by(user=username).delete()
@@ -766,7 +828,10 @@ def api_bulk_delete_users():
                 total_posts += posts_count
                 total_comments += comments_count
 
+        refresh_counts(commented_post_ids)
         db.session.commit()
+        invalidate_post_caches(commented_post_ids)
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -881,6 +946,8 @@ def api_delete_subdeaddit(name):
 
         db.session.delete(subdeaddit)
         db.session.commit()
+        invalidate_tags([subdeaddit_models_tag(name)])
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -911,6 +978,8 @@ def api_bulk_delete_subdeaddits():
         total_posts = 0
         total_comments = 0
 
+        deleted_names = []
+
         for name in names:
             subdeaddit = Subdeaddit.query.get(name)
             if subdeaddit:
@@ -933,12 +1002,15 @@ def api_bulk_delete_subdeaddits():
 
                 Post.query.filter_by(subdeaddit_name=name).delete()
                 db.session.delete(subdeaddit)
+                deleted_names.append(name)
 
                 deleted_count += 1
                 total_posts += posts_count
                 total_comments += comments_count
 
         db.session.commit()
+        invalidate_tags(subdeaddit_models_tag(name) for name in deleted_names)
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -993,7 +1065,7 @@ def api_posts():
                     "subdeaddit_name": post.subdeaddit_name,
                     "upvote_count": post.upvote_count or 0,
                     "post_type": post.post_type or "",
-                    "comments_count": Comment.query.filter_by(post_id=post.id).count(),
+                    "comments_count": post.comment_count,
                     "created_at": post.created_at.isoformat()
                     if post.created_at
                     else "",
@@ -1043,6 +1115,7 @@ def api_delete_post(post_id):
 
         db.session.delete(post)
         db.session.commit()
+        invalidate_author_index()
 
         return jsonify(
             {"success": True, "deleted": {"post": post_id, "comments": comments_count}}
@@ -1077,6 +1150,7 @@ def api_bulk_delete_posts():
                 total_comments += comments_count
 
         db.session.commit()
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -1148,6 +1222,7 @@ def api_update_comment(comment_id):
         comment.upvote_count = data.get("upvote_count", comment.upvote_count)
 
         db.session.commit()
+        invalidate_post_caches([comment.post_id])
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
@@ -1179,7 +1254,10 @@ def api_delete_comment(comment_id):
 
         # Delete the comment itself
         db.session.delete(comment)
+        refresh_counts([comment.post_id])
         db.session.commit()
+        invalidate_post_caches([comment.post_id])
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -1204,6 +1282,7 @@ def api_bulk_delete_comments():
     try:
         deleted_count = 0
         total_children = 0
+        affected_post_ids = set()
 
         # Helper function to get child comments
         def get_child_comments(parent_id):
@@ -1225,11 +1304,15 @@ def api_bulk_delete_comments():
 
                 # Delete the comment itself
                 db.session.delete(comment)
+                affected_post_ids.add(comment.post_id)
 
                 deleted_count += 1
                 total_children += child_count
 
+        refresh_counts(affected_post_ids)
         db.session.commit()
+        invalidate_post_caches(affected_post_ids)
+        invalidate_author_index()
 
         return jsonify(
             {
@@ -1461,7 +1544,7 @@ def test_connection_api():
 
         # Test connection to AI service
         headers = {"Authorization": f"Bearer {api_key}"}
-        response = requests.get(
+        response = http_client.get(
             f"{api_url.rstrip('/')}/models", headers=headers, timeout=10
         )
 
@@ -1864,6 +1947,7 @@ def load_default_data_api():
 
         # Commit all changes
         db.session.commit()
+        invalidate_author_index()
 
         # Mark default data as loaded
         Config.set("DEFAULT_DATA_LOADED", "true")
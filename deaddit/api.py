@@ -1,26 +1,22 @@
 import json
 from datetime import datetime, timedelta
-from functools import cache as functools_cache
 
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context
 from sqlalchemy import func
 
 from deaddit import app, db
-from deaddit import cache as flask_cache
 
+from .export import EXPORT_FORMATS, export_lines, parse_since
+from .ingest import (
+    STREAM_CHUNK_SIZE,
+    IngestError,
+    get_available_models,
+    ingest_content,
+    ingest_stream,
+    ingest_user_data,
+)
 from .models import Comment, Post, Subdeaddit, User
-
-
-@functools_cache
-def get_available_models():
-    # Query unique models from both Post and Comment tables
-    post_models = db.session.query(Post.model).distinct().all()
-    comment_models = db.session.query(Comment.model).distinct().all()
-
-    # Combine and deduplicate the models
-    all_models = {model[0] for model in post_models + comment_models if model[0]}
-
-    return list(all_models)
+from .utils import build_comment_tree
 
 
 @app.route("/api/ingest", methods=["POST"])
@@ -30,151 +26,72 @@ def ingest():
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    posts = data.get("posts", [])
-    comments = data.get("comments", [])
-    subdeaddits = data.get("subdeaddits", [])
-    added = []
-    created_posts = []
+    try:
+        response_data = ingest_content(data)
+    except IngestError as e:
+        return jsonify({"error": str(e), "errors": e.errors}), 400
 
-    # Validate and create posts
-    for post_data in posts:
-        user = post_data.get("user")
-        if not User.query.filter_by(username=user).first():
-            return jsonify({"error": f"User '{user}' does not exist"}), 400
+    return jsonify(response_data), 201
 
-        title = post_data.get("title")
-        content = post_data.get("content")
-        upvote_count = post_data.get("upvote_count")
-        subdeaddit_name = post_data.get("subdeaddit")
-        model = post_data.get("model", "unknown")
 
-        if not all([title, content, upvote_count, user, subdeaddit_name]):
-            return jsonify({"error": "Invalid post data"}), 400
+# Largest number of records committed together by /api/ingest/stream
+MAX_STREAM_CHUNK_SIZE = 10000
 
-        subdeaddit = Subdeaddit.query.filter_by(name=subdeaddit_name).first()
-        if not subdeaddit:
-            return (
-                jsonify({"error": f"Subdeaddit '{subdeaddit_name}' does not exist"}),
-                400,
-            )
 
-        post = Post(
-            title=title,
-            content=content,
-            upvote_count=upvote_count,
-            user=user,
-            subdeaddit=subdeaddit,
-            model=model,
-        )
-        added.append(title)
-        db.session.add(post)
-        # We'll get the ID after commit, so store the post object for now
-        created_posts.append(post)
-
-    # Validate and create comments
-    created_comments = []
-    for comment_data in comments:
-        user = comment_data.get("user")
-        if not User.query.filter_by(username=user).first():
-            return jsonify({"error": f"User '{user}' does not exist"}), 400
-
-        post_id = comment_data.get("post_id")
-        parent_id = comment_data.get("parent_id")
-        content = comment_data.get("content")
-        upvote_count = comment_data.get("upvote_count", 0)
-        model = comment_data.get("model", "unknown")
-
-        if not all([post_id, content, user]):
-            missing_fields = []
-            if not post_id:
-                missing_fields.append("post_id")
-            if not content:
-                missing_fields.append("content")
-            if not user:
-                missing_fields.append("user")
-            return (
-                jsonify(
-                    {
-                        "error": f"Comment missing required fields: {', '.join(missing_fields)}"
-                    }
-                ),
-                400,
-            )
+@app.route("/api/ingest/stream", methods=["POST"])
+def stream_ingest():
+    """
+    Ingests newline-delimited JSON records without loading the whole body.
 
-        comment = Comment(
-            post_id=post_id,
-            parent_id=parent_id,
-            content=content,
-            upvote_count=upvote_count,
-            user=user,
-            model=model,
-        )
-        added.append(content)
-        db.session.add(comment)
-        # Store comment object to get ID after commit
-        created_comments.append(comment)
-
-    # Validate and create subdeaddits
-    for subdeaddit_data in subdeaddits:
-        name = subdeaddit_data.get("name")
-        description = subdeaddit_data.get("description")
-        post_types = subdeaddit_data.get("post_types", [])
-
-        if not all([name, description]):
-            missing_fields = []
-            if not name:
-                missing_fields.append("name")
-            if not description:
-                missing_fields.append("description")
-            return (
-                jsonify(
-                    {
-                        "error": f"Subdeaddit missing required fields: {', '.join(missing_fields)}"
-                    }
-                ),
-                400,
-            )
+    Each line is an object with a "type" (subdeaddit, user, post or comment)
+    and the fields /api/ingest takes for that type. Records are committed in
+    chunks of `chunk_size` and a JSON summary line is streamed back per chunk.
 
-        # Check if subdeaddit already exists
-        existing_subdeaddit = Subdeaddit.query.get(name)
-        if existing_subdeaddit:
-            # Update existing subdeaddit
-            existing_subdeaddit.description = description
-            existing_subdeaddit.set_post_types(post_types)
-            added.append(f"Updated subdeaddit: {name}")
-        else:
-            # Create new subdeaddit
-            subdeaddit = Subdeaddit(name=name, description=description)
-            subdeaddit.set_post_types(post_types)
-            db.session.add(subdeaddit)
-            added.append(f"Created subdeaddit: {name}")
-
-    db.session.commit()
-
-    # Clear caches when new content is added
-    get_available_models.cache_clear()
-    flask_cache.clear()  # Clear comment count caches
-
-    # Prepare response with created post IDs
-    response_data = {
-        "message": "Posts and comments created successfully",
-        "added": added,
-    }
+    Returns:
+        A newline-delimited JSON response with one summary per chunk and a
+        final summary with the totals.
+    """
+    chunk_size = request.args.get("chunk_size", default=STREAM_CHUNK_SIZE, type=int)
+    chunk_size = min(max(chunk_size, 1), MAX_STREAM_CHUNK_SIZE)
 
-    # Add post IDs to response if posts were created
-    if created_posts:
-        response_data["posts"] = [
-            {"id": post.id, "title": post.title} for post in created_posts
-        ]
+    summaries = ingest_stream(request.stream, chunk_size)
+    return Response(
+        stream_with_context(json.dumps(summary) + "\n" for summary in summaries),
+        mimetype="application/x-ndjson",
+    )
 
-    # Add comment IDs to response if comments were created
-    if created_comments:
-        response_data["comments"] = [
-            {"id": comment.id, "content": comment.content[:50]}
-            for comment in created_comments
-        ]
 
-    return jsonify(response_data), 201
+@app.route("/api/export", methods=["GET"])
+def export():
+    """
+    Streams the whole corpus as newline-delimited JSON.
+
+    Query Parameters:
+        since: Only export content created at or after this ISO 8601 date
+        format: "ndjson" (default) for records /api/ingest/stream can load,
+            "columnar" for one batch of rows per line
+
+    Returns:
+        A newline-delimited JSON response, produced while the database is read.
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify(
+            {"error": f"Unknown format, expected one of: {', '.join(EXPORT_FORMATS)}"}
+        ), 400
+
+    since = request.args.get("since")
+    if since:
+        try:
+            since = parse_since(since)
+        except ValueError:
+            return jsonify({"error": "since must be an ISO 8601 date"}), 400
+
+    lines = export_lines(since or None, export_format)
+    return Response(
+        stream_with_context(line + "\n" for line in lines),
+        mimetype="application/x-ndjson",
+    )
 
 
 @app.route("/api/subdeaddits", methods=["GET"])
@@ -199,6 +116,21 @@ def api_subdeaddits():
     return jsonify(response)
 
 
+# Fields returned by /api/posts and the columns behind them
+POST_FIELDS = {
+    "id": Post.id,
+    "subdeaddit": Post.subdeaddit_name,
+    "title": Post.title,
+    "content": Post.content,
+    "comment_count": Post.comment_count,
+    "created_at": Post.created_at,
+    "post_type": Post.post_type,
+    "user": Post.user,
+    "upvote_count": Post.upvote_count,
+    "model": Post.model,
+}
+
+
 @app.route("/api/posts", methods=["GET"])
 def api_posts():
     subdeaddit_name = request.args.get("subdeaddit")
@@ -207,8 +139,20 @@ def api_posts():
     max_comments = request.args.get("max_comments", type=int)
     limit = request.args.get("limit", default=50, type=int)
     title = request.args.get("title")  # New parameter for title filtering
+    fields = request.args.get("fields")  # Comma-separated subset of POST_FIELDS
+
+    if fields:
+        field_names = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown_fields = [field for field in field_names if field not in POST_FIELDS]
+        if unknown_fields:
+            return jsonify(
+                {"error": f"Unknown fields: {', '.join(unknown_fields)}"}
+            ), 400
+    else:
+        field_names = list(POST_FIELDS)
 
-    query = Post.query
+    # Only select the requested columns, so large content bodies stay in the database
+    query = db.session.query(*[POST_FIELDS[field] for field in field_names])
 
     # Filter by Subdeaddit if provided
     if subdeaddit_name:
@@ -217,7 +161,7 @@ def api_posts():
             return jsonify(
                 {"error": f"Subdeaddit '{subdeaddit_name}' does not exist"}
             ), 404
-        query = query.filter(Post.subdeaddit == subdeaddit)
+        query = query.filter(Post.subdeaddit_name == subdeaddit_name)
 
     # Filter by post_type if provided
     if post_type:
@@ -232,33 +176,21 @@ def api_posts():
     if title:
         query = query.filter(func.lower(Post.title) == func.lower(title))
 
+    # Filter by comment count before LIMIT, so callers get as many rows as asked for
+    if max_comments is not None:
+        query = query.filter(Post.comment_count <= max_comments)
+
     # Add sorting
     query = query.order_by(Post.created_at.desc())
 
     # Execute query and limit results
-    posts = query.limit(limit).all()
-
-    # Build response data, filtering by comment count if required
     post_data = []
-    for post in posts:
-        comment_count = Comment.query.filter_by(post_id=post.id).count()
-
-        # Apply max_comments filter if provided
-        if max_comments is not None and comment_count > max_comments:
-            continue
-
-        post_info = {
-            "id": post.id,
-            "subdeaddit": post.subdeaddit.name,
-            "title": post.title,
-            "content": post.content,
-            "comment_count": comment_count,
-            "created_at": post.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "post_type": post.post_type,
-            "user": post.user,
-            "upvote_count": post.upvote_count,
-            "model": post.model,
-        }
+    for row in query.limit(limit):
+        post_info = dict(zip(field_names, row))
+        if post_info.get("created_at"):
+            post_info["created_at"] = post_info["created_at"].strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
         post_data.append(post_info)
 
     return jsonify({"posts": post_data})
@@ -273,10 +205,8 @@ def api_post(post_id):
     if not post:
         return jsonify({"error": f"Post with ID {post_id} does not exist"}), 404
 
-    comment_count = Comment.query.filter_by(post_id=post.id).count()
-
     comments = Comment.query.filter_by(post_id=post.id).all()
-    comment_tree = build_comment_tree(comments)
+    comment_tree = build_comment_tree(comments, format_comment)
 
     post_data = {
         "id": post.id,
@@ -284,42 +214,22 @@ def api_post(post_id):
         "title": post.title,
         "upvote_count": post.upvote_count,
         "user": post.user,
-        "content": post.content.replace("reddit", "deaddit"),
-        "comment_count": comment_count,
+        "content": post.content,
+        "comment_count": post.comment_count,
         "comments": comment_tree,
     }
 
     return jsonify(post_data)
 
 
-def build_comment_tree(comments):
-    comment_map = {comment.id: comment for comment in comments}
-    comment_tree = []
-
-    for comment in comments:
-        if comment.parent_id is None or comment.parent_id == "":
-            comment_tree.append(format_comment(comment, comment_map))
-
-    return comment_tree
-
-
-def format_comment(comment, comment_map):
-    formatted_comment = {
+def format_comment(comment):
+    return {
         "id": comment.id,
         "user": comment.user,
-        "content": comment.content.replace("reddit", "deaddit"),
+        "content": comment.content,
         "parent_id": comment.parent_id,
-        "replies": [],
     }
 
-    for _reply_id, reply_comment in comment_map.items():
-        if reply_comment.parent_id == comment.id:
-            formatted_comment["replies"].append(
-                format_comment(reply_comment, comment_map)
-            )
-
-    return formatted_comment
-
 
 @app.route("/api/ingest/user", methods=["POST"])
 def ingest_user():
@@ -328,41 +238,10 @@ def ingest_user():
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    required_fields = [
-        "username",
-        "age",
-        "gender",
-        "bio",
-        "interests",
-        "occupation",
-        "education",
-        "writing_style",
-        "personality_traits",
-    ]
-
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Missing required field: {field}"}), 400
-
-    user = User(
-        username=data["username"],
-        age=data["age"],
-        gender=data["gender"] if data["gender"] in ["Male", "Female"] else "Male",
-        bio=data["bio"],
-        interests=json.dumps(data["interests"]),
-        occupation=data["occupation"],
-        education=data["education"],
-        writing_style=data["writing_style"],
-        personality_traits=json.dumps(data["personality_traits"]),
-        model=data.get("model", "unknown"),
-    )
-
-    db.session.add(user)
-    db.session.commit()
-
-    # Clear caches when new content is added
-    get_available_models.cache_clear()
-    flask_cache.clear()  # Clear comment count caches
+    try:
+        user = ingest_user_data(data)
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
 
     return (
         jsonify({"message": "User created successfully", "username": user.username}),
@@ -0,0 +1,228 @@
+"""
+In-process index of users and their activity for picking content authors.
+
+Generation jobs pick an author for every post and comment, favoring users with
+fewer posts and comments: a user's weight is (max activity + 1) - activity,
+as in deaddit.loader.select_user_weighted. The index keeps the activity counts
+in a Fenwick tree, so the cumulative weight of the first k users is
+k * (max + 1) - (activity of the first k users). That sum grows with k, which
+lets a sample descend the tree in O(log n) instead of scanning every user.
+
+The index is loaded from the database on first use, updated on ingest and
+reloaded every AUTHOR_INDEX_TTL seconds to pick up content written by other
+processes.
+"""
+
+import random
+import threading
+import time
+from collections.abc import Iterable
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from deaddit import db
+
+from .config import Config
+from .models import Comment, Post, User
+
+# Seconds before the index is reloaded from the database
+AUTHOR_INDEX_TTL = 300
+
+_lock = threading.Lock()
+_usernames: list[str] = []
+_positions: dict[str, int] = {}
+_activity: list[int] = []
+# Fenwick tree over _activity, 1-indexed
+_tree: list[int] = [0]
+_total_activity = 0
+_max_activity = 0
+_last_selected: Optional[str] = None
+_loaded_at: Optional[float] = None
+
+
+def _add(position: int, delta: int) -> None:
+    """Add delta to the activity of the user at a 0-based position."""
+    index = position + 1
+    while index < len(_tree):
+        _tree[index] += delta
+        index += index & -index
+
+
+def _build(usernames: list[str], activity: list[int]) -> None:
+    """Replace the index contents, building the tree in linear time."""
+    global _usernames, _positions, _activity, _tree, _total_activity, _max_activity
+
+    tree = [0, *activity]
+    for index in range(1, len(tree)):
+        parent = index + (index & -index)
+        if parent < len(tree):
+            tree[parent] += tree[index]
+
+    _usernames = usernames
+    _positions = {username: position for position, username in enumerate(usernames)}
+    _activity = activity
+    _tree = tree
+    _total_activity = sum(activity)
+    _max_activity = max(activity, default=0)
+
+
+def _load() -> None:
+    """Load the users and their post and comment counts from the database."""
+    global _loaded_at
+
+    counts = dict.fromkeys(db.session.scalars(select(User.username)), 0)
+    for model in (Post, Comment):
+        for username, count in db.session.execute(
+            select(model.user, func.count()).group_by(model.user)
+        ):
+            if username in counts:
+                counts[username] += count
+
+    _build(list(counts), list(counts.values()))
+    _loaded_at = time.monotonic()
+
+
+def _ensure_loaded() -> None:
+    """Load the index on first use and once it is older than the TTL."""
+    if _loaded_at is None or time.monotonic() - _loaded_at > AUTHOR_INDEX_TTL:
+        _load()
+
+
+def _sample_weighted() -> int:
+    """Draw a position with probability proportional to its weight."""
+    ceiling = _max_activity + 1
+    target = random.randrange(len(_usernames) * ceiling - _total_activity)
+
+    # Find the first position whose cumulative weight exceeds the target
+    position = 0
+    activity = 0
+    step = 1 << (len(_tree) - 1).bit_length()
+    while step:
+        candidate = position + step
+        if candidate < len(_tree):
+            weight = candidate * ceiling - (activity + _tree[candidate])
+            if weight <= target:
+                position = candidate
+                activity += _tree[candidate]
+        step >>= 1
+    return position
+
+
+def _select_weighted() -> int:
+    """Favor users with fewer posts and comments, and avoid repeats."""
+    while True:
+        position = _sample_weighted()
+        if _usernames[position] != _last_selected:
+            return position
+
+        # Keep a third of the last author's weight by rejecting the rest
+        weight = _max_activity + 1 - _activity[position]
+        if random.random() * weight < max(1, weight // 3):
+            return position
+
+
+def _select_round_robin() -> int:
+    """Pick among the least active users, avoiding the last author."""
+    least = min(_activity)
+    candidates = [
+        position for position, count in enumerate(_activity) if count == least
+    ]
+    if len(candidates) > 1 and _last_selected in _positions:
+        candidates = [
+            position
+            for position in candidates
+            if _usernames[position] != _last_selected
+        ] or candidates
+    return random.choice(candidates)
+
+
+def _select_random() -> int:
+    """Pick any user other than the last author."""
+    position = random.randrange(len(_usernames))
+    last = _positions.get(_last_selected)
+    if last is not None and position == last and len(_usernames) > 1:
+        position = (position + random.randrange(1, len(_usernames))) % len(_usernames)
+    return position
+
+
+def select_author() -> Optional[str]:
+    """
+    Pick the author of a new post or comment.
+
+    The USER_SELECTION_STRATEGY setting selects the strategy: "weighted"
+    (default) favors users with fewer posts and comments, "round_robin" picks
+    among the least active users and "improved_random" picks uniformly.
+    The previous author is avoided when there is an alternative.
+
+    Returns:
+        Username of the author, or None if there are no users
+    """
+    global _last_selected
+
+    strategy = Config.get("USER_SELECTION_STRATEGY", "weighted")
+    with _lock:
+        _ensure_loaded()
+        if not _usernames:
+            return None
+
+        if strategy == "round_robin":
+            position = _select_round_robin()
+        elif strategy == "improved_random":
+            position = _select_random()
+        else:
+            position = _select_weighted()
+
+        _last_selected = _usernames[position]
+        return _last_selected
+
+
+def record_activity(authors: Iterable[str]) -> None:
+    """
+    Count new posts and comments of their authors.
+
+    Args:
+        authors: Username of every new post and comment
+    """
+    global _total_activity, _max_activity
+
+    with _lock:
+        if _loaded_at is None:
+            return
+
+        for username in authors:
+            position = _positions.get(username)
+            if position is None:
+                continue
+            _activity[position] += 1
+            _add(position, 1)
+            _total_activity += 1
+            _max_activity = max(_max_activity, _activity[position])
+
+
+def record_users(usernames: Iterable[str]) -> None:
+    """
+    Add new users to the index, without activity.
+
+    Args:
+        usernames: Usernames of the new users
+    """
+    with _lock:
+        if _loaded_at is None:
+            return
+
+        new_users = [
+            name for name in dict.fromkeys(usernames) if name not in _positions
+        ]
+        if new_users:
+            # Appending to a Fenwick tree needs the partial sums of the new
+            # nodes, rebuilding is as cheap and much simpler
+            _build(_usernames + new_users, _activity + [0] * len(new_users))
+
+
+def invalidate_author_index() -> None:
+    """Reload the index on next use, e.g. after users or content were deleted."""
+    global _loaded_at
+
+    with _lock:
+        _loaded_at = None
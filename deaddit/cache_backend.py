@@ -0,0 +1,90 @@
+"""
+Instrumented, size-capped in-process cache backend.
+
+Selected with CACHE_TYPE = "deaddit.cache_backend.LRUSimpleCache". It behaves
+like flask-caching's SimpleCache, but evicts the least recently used entries
+once it holds more than `threshold` items, and counts hits, misses, expirations
+and evictions so the admin can check whether the cache actually helps. This
+module is imported while the app is being created, so it must not import from
+deaddit.
+"""
+
+from collections import Counter, OrderedDict
+from time import time
+
+from flask_caching.backends.simplecache import SimpleCache
+
+
+class LRUSimpleCache(SimpleCache):
+    """SimpleCache with least-recently-used eviction and usage counters."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = OrderedDict()
+        self.stats = Counter()
+
+    @property
+    def threshold(self) -> int:
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value: int) -> None:
+        self._threshold = max(int(value), 1)
+        self._prune()
+
+    def get(self, key):
+        try:
+            expires, value = self._cache[key]
+        except KeyError:
+            self.stats["misses"] += 1
+            return None
+
+        if expires != 0 and expires <= time():
+            # Expired entries are dropped when they are found
+            if self._cache.pop(key, None) is not None:
+                self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            # Deleted by another thread in the meantime
+            pass
+        self.stats["hits"] += 1
+        return self.serializer.loads(value)
+
+    def set(self, key, value, timeout=None):
+        expires = self._normalize_timeout(timeout)
+        self._cache[key] = (expires, self.serializer.dumps(value))
+        self._cache.move_to_end(key)
+        self._prune()
+        return True
+
+    def add(self, key, value, timeout=None):
+        if key in self._cache:
+            return False
+        return self.set(key, value, timeout)
+
+    def _prune(self):
+        # Pop from the least recently used end instead of sorting the whole
+        # cache by expiry time, which SimpleCache does on every full insert
+        while len(self._cache) > self._threshold:
+            try:
+                self._cache.popitem(last=False)
+            except KeyError:
+                break
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        """Get the counters along with the current size and hit rate."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+            "expirations": self.stats["expirations"],
+            "evictions": self.stats["evictions"],
+            "size": len(self._cache),
+            "threshold": self._threshold,
+        }
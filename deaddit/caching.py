@@ -0,0 +1,214 @@
+"""
+Targeted cache invalidation with version tags.
+
+Cache entries that depend on some data include the version token of a tag for
+that data in their key, e.g. "post:42" for everything derived from the comments
+of post 42. Invalidating the tag replaces its token, so the dependent entries
+are never read again and age out on their own, while the rest of the cache
+stays warm.
+
+The cache lives in each process. While jobs run in worker processes, content
+they ingest must also invalidate the web process's entries, so invalidated
+tags are also written to the database, and every process applies the tags
+invalidated by the others when it builds tagged keys, at most every
+CACHE_SYNC_SECONDS.
+"""
+
+import threading
+import time
+import uuid
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from deaddit import cache, db
+
+from .config import Config
+from .models import CacheInvalidation
+
+# Tag tokens outlive every tagged entry. A token that is evicted anyway gets
+# replaced by a fresh one, so stale entries can never be served again.
+TAG_VERSION_TIMEOUT = 24 * 60 * 60
+
+# Seconds between reads of the tags other processes invalidated
+CACHE_SYNC_SECONDS = 2
+# Seconds invalidated tags are kept in the database for other processes
+CACHE_SYNC_RETENTION = 60 * 60
+
+# Tag of the list of models that created content
+MODELS_TAG = "models"
+
+# Counts tag invalidations, reported next to the backend counters
+_invalidations = 0
+
+# Identifies the invalidations of this process in the database
+_process_token = uuid.uuid4().hex
+_sync_lock = threading.Lock()
+_last_synced_id: Optional[int] = None
+_next_sync = 0.0
+
+
+def _tag_key(tag: str) -> str:
+    return f"tag_version_{tag}"
+
+
+def tagged_keys(entries: list[tuple[str, Sequence[str]]]) -> list[str]:
+    """
+    Build several tagged cache keys, reading all tag versions in one lookup.
+
+    Args:
+        entries: (key, tags) pairs, see tagged_key
+
+    Returns:
+        Cache keys in the order of entries
+    """
+    sync_invalidations()
+
+    tag_keys = list({_tag_key(tag): None for _, tags in entries for tag in tags})
+    if not tag_keys:
+        return [key for key, _ in entries]
+
+    versions = dict(zip(tag_keys, cache.get_many(*tag_keys)))
+    missing = {
+        tag_key: uuid.uuid4().hex
+        for tag_key, version in versions.items()
+        if version is None
+    }
+    if missing:
+        cache.set_many(missing, timeout=TAG_VERSION_TIMEOUT)
+        versions.update(missing)
+
+    return [
+        f"{key}@{'.'.join(versions[_tag_key(tag)] for tag in tags)}" if tags else key
+        for key, tags in entries
+    ]
+
+
+def tagged_key(key: str, *tags: str) -> str:
+    """
+    Build a cache key that changes whenever one of the tags is invalidated.
+
+    Args:
+        key: Base cache key
+        *tags: Tags of the data the cached value depends on
+
+    Returns:
+        Cache key including the current version of every tag
+    """
+    return tagged_keys([(key, tags)])[0]
+
+
+def _replace_versions(tags: set[str]) -> None:
+    """Give the tags new versions in the cache of this process."""
+    global _invalidations
+
+    if tags:
+        cache.set_many(
+            {_tag_key(tag): uuid.uuid4().hex for tag in tags},
+            timeout=TAG_VERSION_TIMEOUT,
+        )
+        _invalidations += len(tags)
+
+
+def _shares_invalidations() -> bool:
+    """Check whether other processes ingest content, i.e. jobs run in workers."""
+    return Config.get("JOB_EXECUTION") == "worker"
+
+
+def invalidate_tags(tags: Iterable[str]) -> None:
+    """
+    Invalidate every cache entry built with one of the tags.
+
+    While jobs run in worker processes, the tags are also recorded for the
+    other processes, which commits the session.
+
+    Args:
+        tags: Tags whose data changed
+    """
+    tags = set(tags)
+    _replace_versions(tags)
+    if not tags or not _shares_invalidations():
+        return
+
+    now = datetime.utcnow()
+    db.session.execute(
+        insert(CacheInvalidation),
+        [{"tag": tag, "source": _process_token, "created_at": now} for tag in tags],
+    )
+    db.session.execute(
+        delete(CacheInvalidation).where(
+            CacheInvalidation.created_at < now - timedelta(seconds=CACHE_SYNC_RETENTION)
+        )
+    )
+    db.session.commit()
+
+
+def sync_invalidations() -> None:
+    """
+    Apply the tags other processes invalidated since the last sync.
+
+    Only reads the database while jobs run in worker processes, and at most
+    every CACHE_SYNC_SECONDS.
+    """
+    global _last_synced_id, _next_sync
+
+    if time.monotonic() < _next_sync or not _shares_invalidations():
+        return
+
+    with _sync_lock:
+        if time.monotonic() < _next_sync:
+            return
+        _next_sync = time.monotonic() + CACHE_SYNC_SECONDS
+
+        if _last_synced_id is None:
+            # Nothing was cached under older versions yet
+            _last_synced_id = (
+                db.session.scalar(select(func.max(CacheInvalidation.id))) or 0
+            )
+            return
+
+        rows = db.session.execute(
+            select(
+                CacheInvalidation.id, CacheInvalidation.tag, CacheInvalidation.source
+            )
+            .where(CacheInvalidation.id > _last_synced_id)
+            .order_by(CacheInvalidation.id)
+        ).all()
+        if rows:
+            _last_synced_id = rows[-1].id
+            _replace_versions({row.tag for row in rows if row.source != _process_token})
+
+
+def post_tag(post_id: int) -> str:
+    """Tag for cache entries derived from the comments of a post."""
+    return f"post:{post_id}"
+
+
+def invalidate_post_caches(post_ids: Iterable[int]) -> None:
+    """
+    Invalidate the cache entries derived from the comments of some posts.
+
+    Args:
+        post_ids: IDs of posts whose comments changed
+    """
+    invalidate_tags(post_tag(post_id) for post_id in post_ids)
+
+
+def subdeaddit_models_tag(subdeaddit_name: str) -> str:
+    """Tag for the list of models that posted in a subdeaddit."""
+    return f"models:{subdeaddit_name}"
+
+
+def get_cache_stats() -> dict:
+    """
+    Get cache effectiveness counters.
+
+    Returns:
+        Dictionary of backend counters plus the number of tag invalidations
+    """
+    backend = cache.cache
+    stats = backend.get_stats() if hasattr(backend, "get_stats") else {}
+    stats["tag_invalidations"] = _invalidations
+    return stats
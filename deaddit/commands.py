@@ -0,0 +1,78 @@
+"""
+Maintenance commands, run through the Flask CLI:
+    flask --app deaddit <command>
+"""
+
+import click
+
+from deaddit import app, cache, db
+
+from .counters import refresh_counts
+from .export import EXPORT_FORMATS, export_lines, parse_since
+from .jobs import WORKER_POLL_SECONDS, run_worker_processes
+
+
+@app.cli.command("reconcile-counts")
+def reconcile_counts():
+    """Rebuild the denormalized comment counters from the comment rows."""
+    corrected = refresh_counts()
+    db.session.commit()
+    cache.clear()
+    click.echo(f"Reconciled comment counters, {corrected} rows corrected")
+
+
+@app.cli.command("export")
+@click.option(
+    "--since", help="Only export content created at or after this ISO 8601 date."
+)
+@click.option(
+    "--format",
+    "export_format",
+    type=click.Choice(EXPORT_FORMATS),
+    default="ndjson",
+    show_default=True,
+    help="One record per line, or one batch of rows per line.",
+)
+@click.option(
+    "--output", "-o", type=click.File("w"), default="-", help="File to write to."
+)
+def export(since, export_format, output):
+    """Stream subdeaddits, users, posts and comments as JSON lines."""
+    if since:
+        try:
+            since = parse_since(since)
+        except ValueError as e:
+            raise click.BadParameter(
+                "expected an ISO 8601 date", param_hint="--since"
+            ) from e
+
+    for line in export_lines(since or None, export_format):
+        output.write(line + "\n")
+
+
+@app.cli.command("worker")
+@click.option(
+    "--processes",
+    "-p",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Worker processes, each runs one job at a time.",
+)
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0.1),
+    default=WORKER_POLL_SECONDS,
+    show_default=True,
+    help="Seconds an idle worker waits before looking for jobs again.",
+)
+def worker(processes, poll_interval):
+    """Run queued jobs in separate processes.
+
+    Set JOB_EXECUTION to "worker" so the web process only queues jobs.
+    """
+    click.echo(f"Starting {processes} worker process(es), Ctrl+C to stop")
+    try:
+        run_worker_processes(processes, poll_interval)
+    except RuntimeError as e:
+        raise click.ClickException(str(e)) from e
@@ -0,0 +1,394 @@
+"""
+Chat completion requests to OpenAI-compatible services.
+
+Generation prompts ask for a single JSON object, but models often keep writing
+after it, and stop strings only catch some of that. With the LLM_STREAMING
+setting on, completions are streamed as server-sent events and the connection
+is closed as soon as the first top-level JSON object is complete, so nothing
+waits for, or pays for, the tail. That costs the pooled keep-alive connection
+and the usage the service sends last, so streaming is off by default. Servers
+that answer a streaming request with a plain JSON body are handled as well.
+
+extract_json_object reads the object out of a completion, repairing the
+mistakes models commonly make in a single pass.
+"""
+
+import json
+import re
+from typing import Any, Optional
+
+import requests
+from loguru import logger
+
+from . import http_client
+from .config import Config
+
+_THINK_START = "<think>"
+_THINK_END = re.compile(r"</think>", re.IGNORECASE)
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", re.IGNORECASE | re.DOTALL)
+
+# Objects tried before giving up on a completion
+MAX_JSON_CANDIDATES = 8
+
+_decoder = json.JSONDecoder()
+_VALID_ESCAPES = set('"\\/bfnrtu')
+# Characters after a closing quote, "" is the end of the text
+_STRING_ENDS = {",", ":", "}", "]", ""}
+_BARE_WORDS = {
+    "true": "true",
+    "false": "false",
+    "null": "null",
+    "True": "true",
+    "False": "false",
+    "None": "null",
+}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+# Run of string characters that need no repair
+_PLAIN_STRING = re.compile(r"[^\"'\\\x00-\x1f]+")
+
+
+class CompletionError(Exception):
+    """A completion request was answered with an error status."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class JsonObjectScanner:
+    """
+    Find the end of the first top-level JSON object in text fed in pieces.
+
+    Braces inside strings and text before the object, including <think>
+    blocks, are skipped. Strings are read like _repair_json does: they may be
+    single-quoted, and a quote followed by more text is part of the string.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.end: Optional[int] = None
+        self._position = 0
+        self._depth = 0
+        self._quote: Optional[str] = None
+        self._escaped = False
+
+    def feed(self, text: str) -> bool:
+        """
+        Add streamed text.
+
+        Returns:
+            True once the first JSON object is complete, its end is then
+            available as `end`
+        """
+        self.text += text
+        while self.end is None and self._position < len(self.text):
+            char = self.text[self._position]
+
+            if self._depth == 0:
+                if char == "<":
+                    tag = self.text[self._position : self._position + len(_THINK_START)]
+                    if tag.lower() == _THINK_START:
+                        think_end = _THINK_END.search(self.text, self._position)
+                        if think_end is None:
+                            return False
+                        self._position = think_end.end()
+                        continue
+                    if _THINK_START.startswith(tag.lower()) and len(tag) < len(
+                        _THINK_START
+                    ):
+                        # Wait for the rest of a possible <think> tag
+                        return False
+                elif char == "{":
+                    self._depth = 1
+            elif self._quote is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == self._quote:
+                    following = _next_significant(self.text, self._position + 1)
+                    if following == "":
+                        # Wait for the text deciding whether the string ends
+                        return False
+                    if following in _STRING_ENDS:
+                        self._quote = None
+            elif char in "\"'":
+                self._quote = char
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = self._position + 1
+
+            self._position += 1
+
+        return self.end is not None
+
+
+def streaming_enabled() -> bool:
+    """Check whether completions are streamed, see the LLM_STREAMING setting."""
+    return Config.get("LLM_STREAMING", "false") == "true"
+
+
+def chat_completion(
+    api_url: str,
+    payload: dict[str, Any],
+    headers: dict[str, str],
+    timeout: Optional[float] = None,
+) -> dict[str, Any]:
+    """
+    Request a chat completion.
+
+    Args:
+        api_url: Base URL of the OpenAI-compatible API
+        payload: Request body of /chat/completions
+        headers: Request headers, including the authorization
+        timeout: Seconds to wait for the connection and for each read
+
+    Returns:
+        The completion in the non-streamed response format. Streamed
+        completions stop after the first JSON object and only include usage
+        if the stream was read to its end.
+
+    Raises:
+        CompletionError: If the service answers with an error status
+        requests.RequestException: If the request fails
+    """
+    url = f"{api_url}/chat/completions"
+    if not streaming_enabled():
+        response = http_client.post(url, json=payload, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            raise CompletionError(response.status_code, response.text)
+        return response.json()
+
+    with http_client.post(
+        url,
+        json={**payload, "stream": True, "stream_options": {"include_usage": True}},
+        headers=headers,
+        timeout=timeout,
+        stream=True,
+    ) as response:
+        if response.status_code != 200:
+            raise CompletionError(response.status_code, response.text)
+        if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            return response.json()
+        return _read_stream(response)
+
+
+def _read_stream(response: requests.Response) -> dict[str, Any]:
+    """
+    Collect streamed chunks until the JSON object or the stream ends.
+
+    If the object found doesn't parse, even repaired, the stream is read to
+    its end instead, so the whole completion can be searched.
+    """
+    scanner = JsonObjectScanner()
+    close_early = True
+    reasoning = []
+    completion = {"object": "chat.completion"}
+    finish_reason = None
+    chunks = 0
+
+    # Lines are split on ASCII newlines, so each line decodes on its own
+    for line in response.iter_lines(chunk_size=None):
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+
+        chunk = json.loads(data)
+        chunks += 1
+        for key in ("id", "created", "model", "usage"):
+            if chunk.get(key) is not None:
+                completion[key] = chunk[key]
+        if chunk.get("error"):
+            raise CompletionError(response.status_code, json.dumps(chunk["error"]))
+
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("reasoning"):
+                reasoning.append(delta["reasoning"])
+            finish_reason = choice.get("finish_reason") or finish_reason
+            if delta.get("content"):
+                scanner.feed(delta["content"])
+
+        if close_early and scanner.end is not None:
+            if extract_json_object(scanner.text[: scanner.end]) is None:
+                logger.debug(
+                    "The streamed JSON object doesn't parse, reading the whole "
+                    "completion"
+                )
+                close_early = False
+                continue
+            logger.debug(
+                f"Closed the completion stream after {chunks} chunks, "
+                "the JSON object was complete"
+            )
+            finish_reason = "stop"
+            break
+
+    content = scanner.text
+    if close_early and scanner.end is not None:
+        content = content[: scanner.end]
+    message = {"role": "assistant", "content": content}
+    if reasoning:
+        message["reasoning"] = "".join(reasoning)
+    completion["choices"] = [
+        {"index": 0, "message": message, "finish_reason": finish_reason}
+    ]
+    return completion
+
+
+def extract_json_object(text: str) -> Optional[dict[str, Any]]:
+    """
+    Find the first JSON object in a completion.
+
+    Every "{" outside <think> blocks starts a candidate. A candidate is parsed
+    with JSONDecoder.raw_decode, which reads a valid object at C speed and
+    ignores whatever follows it, and otherwise repaired in a single pass, see
+    _repair_json. Candidates that fail are skipped as a whole.
+
+    Args:
+        text: Completion text, e.g. an object wrapped in a code fence and
+            followed by commentary
+
+    Returns:
+        The first object that parses, or None
+    """
+    text = _THINK_BLOCK.sub("", text)
+    start = text.find("{")
+    for _ in range(MAX_JSON_CANDIDATES):
+        if start == -1:
+            break
+
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            repaired, end = _repair_json(text, start)
+            try:
+                value = json.loads(repaired)
+            except ValueError:
+                value = None
+
+        if isinstance(value, dict):
+            return value
+        start = text.find("{", max(end, start + 1))
+
+    return None
+
+
+def _next_significant(text: str, position: int) -> str:
+    """Get the next character that is not whitespace, or "" at the end."""
+    length = len(text)
+    while position < length and text[position].isspace():
+        position += 1
+    return text[position] if position < length else ""
+
+
+def _drop_trailing_comma(out: list[str]) -> None:
+    """Remove a comma that ends the output, ignoring whitespace after it."""
+    index = len(out) - 1
+    while index >= 0 and out[index].isspace():
+        index -= 1
+    if index >= 0 and out[index] == ",":
+        del out[index]
+
+
+def _repair_json(text: str, start: int) -> tuple[str, int]:
+    """
+    Rewrite the object starting at start as valid JSON, in one pass.
+
+    Repairs single-quoted strings, unquoted keys and words, Python literals,
+    raw control characters and unescaped quotes inside strings, invalid
+    escapes, trailing commas, mismatched closing brackets and objects cut off
+    before their end.
+
+    Returns:
+        The repaired object and the position after it in text
+    """
+    out = []
+    closers = []
+    quote = None
+    escaped = False
+    position = start
+    length = len(text)
+
+    while position < length:
+        char = text[position]
+
+        if quote is not None:
+            plain = None if escaped else _PLAIN_STRING.match(text, position)
+            if plain is not None:
+                out.append(plain.group())
+                position = plain.end()
+                continue
+            if escaped:
+                escaped = False
+                if char == "'":
+                    out[-1] = "'"
+                    position += 1
+                    continue
+                if char not in _VALID_ESCAPES:
+                    out[-1] = "\\\\"
+                out.append(char)
+            elif char == "\\":
+                escaped = True
+                out.append(char)
+            elif char == quote:
+                # A quote followed by more text is part of the string, like the
+                # apostrophe in 'It's'
+                if _next_significant(text, position + 1) in _STRING_ENDS:
+                    quote = None
+                    out.append('"')
+                else:
+                    out.append('\\"' if quote == '"' else "'")
+            elif char == '"':
+                out.append('\\"')
+            elif char in _CONTROL_ESCAPES:
+                out.append(_CONTROL_ESCAPES[char])
+            elif char < " ":
+                out.append(f"\\u{ord(char):04x}")
+            else:
+                out.append(char)
+            position += 1
+            continue
+
+        if char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            out.append(closers.pop())
+            if not closers:
+                return "".join(out), position + 1
+        elif char.isalpha() or char == "_":
+            end = position
+            while end < length and (text[end].isalnum() or text[end] in "_-"):
+                end += 1
+            word = text[position:end]
+            if _next_significant(text, end) == ":" or word not in _BARE_WORDS:
+                out.append(json.dumps(word))
+            else:
+                out.append(_BARE_WORDS[word])
+            position = end
+            continue
+        else:
+            out.append(char)
+        position += 1
+
+    # Cut off: close the open string and every open bracket
+    if quote is not None:
+        if escaped:
+            out.pop()
+        out.append('"')
+    _drop_trailing_comma(out)
+    if out and out[-1] == ":":
+        out.append("null")
+    out.extend(reversed(closers))
+    return "".join(out), length
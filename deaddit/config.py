@@ -2,9 +2,17 @@
 
 This module handles loading configuration from the database with fallback
 to environment variables. Only API_TOKEN remains as an environment variable.
+
+Database settings are read from an immutable in-process snapshot of the
+Setting table, so hot paths read a dict instead of querying. The snapshot is
+replaced whenever Config.set writes a value, and reloaded after
+SNAPSHOT_TTL seconds to pick up changes made by other processes.
 """
 
 import os
+import time
+from collections.abc import Callable, Mapping
+from types import MappingProxyType
 from typing import Optional
 
 from deaddit.models import Setting
@@ -24,6 +32,19 @@ class Config:
         "FLASK_ENV": "development",
         "FLASK_DEBUG": "True",
         "DEFAULT_DATA_LOADED": "false",
+        "CONTENT_REWRITTEN": "false",
+        "CACHE_THRESHOLD": "5000",
+        "JOB_WORKERS_DEFAULT": "1",
+        "JOB_WORKERS_HIGH_PRIORITY": "1",
+        "JOB_WORKERS_LOW_PRIORITY": "1",
+        "LLM_CONCURRENCY": "4",
+        "JOB_EXECUTION": "inline",
+        "HTTP_POOL_HOSTS": "10",
+        "HTTP_POOL_SIZE": "16",
+        "HTTP_CONNECT_TIMEOUT": "10",
+        "HTTP_READ_TIMEOUT": "120",
+        "LLM_STREAMING": "false",
+        "PROMPT_CACHE_HINTS": "none",
         "API_TOKEN": None,
     }
 
@@ -38,9 +59,73 @@ class Config:
         "FLASK_ENV": "Flask environment (development/production)",
         "FLASK_DEBUG": "Enable Flask debug mode (True/False)",
         "DEFAULT_DATA_LOADED": "Whether default subdeaddits and users have been loaded",
+        "CONTENT_REWRITTEN": "Whether reddit was replaced with deaddit in content stored before ingest did it",
+        "CACHE_THRESHOLD": "Maximum number of entries in the in-process cache",
+        "JOB_WORKERS_DEFAULT": "Jobs run at once for normal priority (applied on restart)",
+        "JOB_WORKERS_HIGH_PRIORITY": "Jobs run at once for high priority (applied on restart)",
+        "JOB_WORKERS_LOW_PRIORITY": "Jobs run at once for low priority (applied on restart)",
+        "LLM_CONCURRENCY": "Maximum concurrent requests per AI endpoint, override with LLM_CONCURRENCY_<endpoint>",
+        "JOB_EXECUTION": 'Where jobs run: "inline" in the web process, or "worker" in separate `flask worker` processes',
+        "HTTP_POOL_HOSTS": "Hosts whose keep-alive connections are pooled (applied on restart)",
+        "HTTP_POOL_SIZE": "Keep-alive connections kept per host (applied on restart)",
+        "HTTP_CONNECT_TIMEOUT": "Seconds to wait for a connection to an AI service or API",
+        "HTTP_READ_TIMEOUT": "Seconds to wait for a response from an AI service or API",
+        "LLM_STREAMING": "Stream completions and stop reading once the JSON object is complete (true/false). Closing a stream early discards its keep-alive connection and usage, so the loader's token budget runs on estimates and prompt cache hit rates stay empty",
+        "PROMPT_CACHE_HINTS": 'Prompt prefix cache hints sent with completions: "none", "anthropic", "openai" or "llamacpp"',
         "API_TOKEN": "Security token for admin access (minimum 3 characters)",
     }
 
+    # Seconds before the settings snapshot is reloaded from the database
+    SNAPSHOT_TTL = 30
+
+    _snapshot: Mapping[str, Optional[str]] = MappingProxyType({})
+    _snapshot_loaded_at: Optional[float] = None
+    _listeners: list[Callable[[str], None]] = []
+
+    @classmethod
+    def _settings(cls) -> Mapping[str, Optional[str]]:
+        """Get the settings snapshot, reloading it once it is older than the TTL."""
+        loaded_at = cls._snapshot_loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > cls.SNAPSHOT_TTL:
+            try:
+                cls.refresh()
+            except Exception:
+                # Keep serving the last snapshot if the database can't be read
+                if loaded_at is None:
+                    raise
+        return cls._snapshot
+
+    @classmethod
+    def refresh(cls) -> None:
+        """Reload the settings snapshot from the database."""
+        rows = Setting.query.with_entities(Setting.key, Setting.value).all()
+        cls._replace_snapshot(dict(rows))
+
+    @classmethod
+    def _replace_snapshot(cls, settings: dict) -> None:
+        """Swap in a new snapshot and notify listeners of the changed keys."""
+        previous = cls._snapshot
+        cls._snapshot = MappingProxyType(settings)
+        cls._snapshot_loaded_at = time.monotonic()
+
+        changed = {
+            key
+            for key in previous.keys() | settings.keys()
+            if previous.get(key) != settings.get(key)
+        }
+        for key in sorted(changed):
+            for listener in cls._listeners:
+                listener(key)
+
+    @classmethod
+    def subscribe(cls, listener: Callable[[str], None]) -> None:
+        """Call listener(key) whenever the database value of a setting changes.
+
+        Changes are noticed when this process writes a setting and when the
+        snapshot is reloaded, including the first load.
+        """
+        cls._listeners.append(listener)
+
     @classmethod
     def get(cls, key: str, default: Optional[str] = None) -> Optional[str]:
         """Get a configuration value.
@@ -55,7 +140,7 @@ class Config:
         if key == "API_TOKEN":
             try:
                 # Try to get from database first
-                db_value = Setting.get_value(key)
+                db_value = cls._settings().get(key)
                 if db_value is not None:
                     return db_value
             except Exception:
@@ -66,7 +151,7 @@ class Config:
 
         try:
             # Try to get from database first
-            db_value = Setting.get_value(key)
+            db_value = cls._settings().get(key)
             if db_value is not None:
                 return db_value
         except Exception:
@@ -90,6 +175,7 @@ class Config:
         """Set a configuration value in the database."""
         description = cls.DESCRIPTIONS.get(key)
         Setting.set_value(key, value, description)
+        cls._replace_snapshot({**cls._settings(), key: value})
 
     @classmethod
     def get_all_settings(cls) -> dict:
@@ -120,7 +206,7 @@ class Config:
         if key == "API_TOKEN":
             try:
                 # Check database first
-                db_value = Setting.get_value(key)
+                db_value = cls._settings().get(key)
                 if db_value is not None:
                     return "database"
             except Exception:
@@ -132,7 +218,7 @@ class Config:
             return "none"
 
         try:
-            db_value = Setting.get_value(key)
+            db_value = cls._settings().get(key)
             if db_value is not None:
                 return "database"
         except Exception:
@@ -162,6 +248,7 @@ class Config:
                 if Setting.get_value(key) is None:
                     description = cls.DESCRIPTIONS.get(key)
                     Setting.set_value(key, default_value, description)
+            cls.refresh()
         except Exception:
             # Database might not be ready yet
             pass
@@ -171,8 +258,7 @@ class Config:
         """Check if the application has been configured (has settings in database)."""
         try:
             # Check if we have any settings in the database
-            setting_count = Setting.query.count()
-            return setting_count > 0
+            return len(cls._settings()) > 0
         except Exception:
             # Database might not be ready yet
             return False
@@ -212,6 +298,24 @@ class Config:
         if current_endpoint == endpoint_url:
             cls.set("OPENAI_KEY", api_key)
 
+    @classmethod
+    def get_concurrency_for_endpoint(cls, endpoint_url: str) -> int:
+        """Get the maximum number of concurrent requests to an AI endpoint.
+
+        An endpoint-specific LLM_CONCURRENCY_<key> setting (e.g.
+        LLM_CONCURRENCY_GROQ) overrides the LLM_CONCURRENCY default.
+        """
+        value = None
+        if endpoint_url:
+            value = cls.get(f"LLM_CONCURRENCY_{cls._endpoint_to_key(endpoint_url)}")
+        if not value:
+            value = cls.get("LLM_CONCURRENCY")
+
+        try:
+            return max(int(value), 1)
+        except (TypeError, ValueError):
+            return int(cls.DEFAULTS["LLM_CONCURRENCY"])
+
     @classmethod
     def _endpoint_to_key(cls, endpoint_url: str) -> str:
         """Convert endpoint URL to a safe key name."""
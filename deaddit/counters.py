@@ -0,0 +1,179 @@
+"""
+Denormalized comment counters.
+
+Post.comment_count, Comment.reply_count and Comment.descendant_count are kept
+up to date in the same transaction as the writes that change them, so listings
+read a column instead of counting comments. record_new_comments() applies
+increments after an ingest, refresh_counts() recomputes the counters from the
+comment rows after deletes and when reconciling.
+"""
+
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import aliased
+
+from deaddit import db
+
+from .models import Comment, Post
+
+# Columns that refresh_counts() fills in
+COUNTER_COLUMNS = {
+    "post.comment_count",
+    "comment.reply_count",
+    "comment.descendant_count",
+}
+
+
+def _increment(column, increments: Counter) -> None:
+    """Add per-row increments to a counter column, one UPDATE per distinct step."""
+    ids_by_step = defaultdict(list)
+    for row_id, step in increments.items():
+        ids_by_step[step].append(row_id)
+
+    model = column.class_
+    for step, row_ids in ids_by_step.items():
+        db.session.execute(
+            update(model)
+            .where(model.id.in_(row_ids))
+            .values({column.key: column + step})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def record_new_comments(comments: Sequence[Any]) -> None:
+    """
+    Update counters for comments that were just added to the session.
+
+    Must be called after the comments are flushed and before the commit, so the
+    counters change in the same transaction as the inserts.
+
+    Args:
+        comments: Newly created comments, or rows with their id, post_id and
+            parent_id
+    """
+    if not comments:
+        return
+
+    _increment(Post.comment_count, Counter(comment.post_id for comment in comments))
+    _increment(
+        Comment.reply_count,
+        Counter(comment.parent_id for comment in comments if comment.parent_id),
+    )
+
+    # Walk up from every new comment to the root of its thread in one query
+    parent = aliased(Comment)
+    ancestors = (
+        select(Comment.parent_id.label("ancestor_id"))
+        .where(
+            Comment.id.in_([comment.id for comment in comments]),
+            Comment.parent_id.isnot(None),
+        )
+        .cte("ancestors", recursive=True)
+    )
+    ancestors = ancestors.union_all(
+        select(parent.parent_id)
+        .join(ancestors, parent.id == ancestors.c.ancestor_id)
+        .where(parent.parent_id.isnot(None))
+    )
+    descendant_increments = Counter(
+        dict(
+            db.session.execute(
+                select(ancestors.c.ancestor_id, func.count()).group_by(
+                    ancestors.c.ancestor_id
+                )
+            ).all()
+        )
+    )
+    _increment(Comment.descendant_count, descendant_increments)
+
+
+def refresh_counts(post_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the counters of some posts and their comments from scratch.
+
+    Pending changes are flushed first and only rows whose stored counters
+    differ are written. Does not commit.
+
+    Args:
+        post_ids: Posts to refresh, or None to refresh every post
+
+    Returns:
+        Number of rows whose counters were corrected
+    """
+    if post_ids is not None:
+        post_ids = list(set(post_ids))
+        if not post_ids:
+            return 0
+
+    db.session.flush()
+
+    # Comment ids, parents and stored counters, without loading content
+    comment_query = select(
+        Comment.id,
+        Comment.post_id,
+        Comment.parent_id,
+        Comment.reply_count,
+        Comment.descendant_count,
+    )
+    if post_ids is not None:
+        comment_query = comment_query.where(Comment.post_id.in_(post_ids))
+
+    parents = {}
+    stored = {}
+    children = defaultdict(list)
+    comments_per_post = Counter()
+    for row in db.session.execute(comment_query.execution_options(yield_per=5000)):
+        parents[row.id] = row.parent_id
+        stored[row.id] = (row.reply_count, row.descendant_count)
+        comments_per_post[row.post_id] += 1
+    for comment_id, parent_id in parents.items():
+        if parent_id in parents:
+            children[parent_id].append(comment_id)
+
+    # Iterative post-order walk, so deep threads don't hit the recursion limit
+    descendants = dict.fromkeys(parents, 0)
+    roots = [
+        comment_id
+        for comment_id, parent_id in parents.items()
+        if parent_id not in parents
+    ]
+    for root in roots:
+        stack = [(root, False)]
+        while stack:
+            comment_id, expanded = stack.pop()
+            if expanded:
+                parent_id = parents[comment_id]
+                if parent_id in descendants:
+                    descendants[parent_id] += descendants[comment_id] + 1
+                continue
+            stack.append((comment_id, True))
+            stack.extend((child, False) for child in children[comment_id])
+
+    comment_updates = [
+        {
+            "id": comment_id,
+            "reply_count": len(children[comment_id]),
+            "descendant_count": descendants[comment_id],
+        }
+        for comment_id, counts in stored.items()
+        if counts != (len(children[comment_id]), descendants[comment_id])
+    ]
+
+    post_query = select(Post.id, Post.comment_count)
+    if post_ids is not None:
+        post_query = post_query.where(Post.id.in_(post_ids))
+    post_updates = [
+        {"id": post_id, "comment_count": comments_per_post[post_id]}
+        for post_id, comment_count in db.session.execute(post_query)
+        if comment_count != comments_per_post[post_id]
+    ]
+
+    if comment_updates:
+        db.session.execute(update(Comment), comment_updates)
+    if post_updates:
+        db.session.execute(update(Post), post_updates)
+
+    return len(comment_updates) + len(post_updates)
@@ -0,0 +1,190 @@
+"""
+Streaming export of the whole corpus.
+
+Rows are read through server-side cursors in batches of EXPORT_BATCH_SIZE and
+written out as they are read, so an export runs in constant memory however
+large the database is. The "ndjson" format writes one record per line in the
+format /api/ingest/stream reads, so an export can be loaded into another
+instance. The "columnar" format writes one line per batch, with the column
+names once and the values as row arrays, which is much more compact for
+analysis.
+"""
+
+import json
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import select, union
+
+from deaddit import db
+
+from .models import Comment, Post, Subdeaddit, User
+from .utils import parse_utc_datetime
+
+# Rows fetched from the database at a time
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = ("ndjson", "columnar")
+
+# Text columns holding JSON, exported decoded
+JSON_COLUMNS = {"post_types", "interests", "personality_traits"}
+
+
+def parse_since(value: str) -> datetime:
+    """
+    Parse the start of an incremental export.
+
+    Args:
+        value: ISO 8601 date or date and time, e.g. 2024-05-01T12:00:00, in
+            UTC unless it has an offset
+
+    Returns:
+        The parsed datetime in UTC without a time zone, as creation times are
+        stored
+
+    Raises:
+        ValueError: If the value is not an ISO 8601 date
+    """
+    return parse_utc_datetime(value)
+
+
+def _export_statements(since: Optional[datetime]) -> list[tuple[str, Any]]:
+    """Build the query of each record type, parents before children."""
+    posts = select(
+        Post.id,
+        Post.subdeaddit_name.label("subdeaddit"),
+        Post.title,
+        Post.content,
+        Post.upvote_count,
+        Post.user,
+        Post.model,
+        Post.post_type,
+        Post.created_at,
+    ).order_by(Post.id)
+    comments = select(
+        Comment.id,
+        Comment.post_id,
+        Comment.parent_id,
+        Comment.content,
+        Comment.upvote_count,
+        Comment.user,
+        Comment.model,
+        Comment.created_at,
+    ).order_by(Comment.id)
+    subdeaddits = select(
+        Subdeaddit.name, Subdeaddit.description, Subdeaddit.post_types
+    ).order_by(Subdeaddit.name)
+    users = select(
+        User.username,
+        User.age,
+        User.gender,
+        User.bio,
+        User.interests,
+        User.occupation,
+        User.education,
+        User.writing_style,
+        User.personality_traits,
+        User.model,
+    ).order_by(User.username)
+
+    if since is not None:
+        # Only new content, with the users and subdeaddits it refers to
+        posts = posts.where(Post.created_at >= since)
+        comments = comments.where(Comment.created_at >= since)
+        subdeaddits = subdeaddits.where(
+            Subdeaddit.name.in_(
+                select(Post.subdeaddit_name).where(Post.created_at >= since)
+            )
+        )
+        users = users.where(
+            User.username.in_(
+                union(
+                    select(Post.user).where(Post.created_at >= since),
+                    select(Comment.user).where(Comment.created_at >= since),
+                )
+            )
+        )
+
+    return [
+        ("subdeaddit", subdeaddits),
+        ("user", users),
+        ("post", posts),
+        ("comment", comments),
+    ]
+
+
+def _export_value(column: str, value: Any) -> Any:
+    """Convert a column value to its JSON form."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if column in JSON_COLUMNS and isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def export_batches(
+    since: Optional[datetime] = None,
+) -> Iterator[tuple[str, list[str], list[list[Any]]]]:
+    """
+    Read the corpus in batches through server-side cursors.
+
+    Args:
+        since: Only export posts and comments created at or after this time,
+            plus the users and subdeaddits they refer to
+
+    Yields:
+        (record type, column names, rows) per batch, subdeaddits first, then
+        users, posts and comments in ID order, so parents precede replies
+    """
+    for record_type, statement in _export_statements(since):
+        result = db.session.execute(
+            statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        columns = list(result.keys())
+        for partition in result.partitions():
+            yield (
+                record_type,
+                columns,
+                [
+                    [
+                        _export_value(column, value)
+                        for column, value in zip(columns, row)
+                    ]
+                    for row in partition
+                ],
+            )
+
+
+def export_lines(
+    since: Optional[datetime] = None, export_format: str = "ndjson"
+) -> Iterator[str]:
+    """
+    Export the corpus as lines of JSON.
+
+    Incremental exports refer to posts and comments of earlier exports by
+    their IDs in this database. /api/ingest/stream only maps the IDs of
+    content in the same stream, so it rejects the comments of an incremental
+    export that answer older posts or comments; export without since to copy
+    whole threads.
+
+    Args:
+        since: Only export content created at or after this time
+        export_format: "ndjson" for one record per line, "columnar" for one
+            batch of rows per line
+
+    Yields:
+        Lines of JSON, without line endings
+    """
+    for record_type, columns, rows in export_batches(since):
+        if export_format == "columnar":
+            yield json.dumps({"type": record_type, "columns": columns, "rows": rows})
+            continue
+
+        for row in rows:
+            record = {"type": record_type}
+            record.update(zip(columns, row))
+            yield json.dumps(record)
@@ -0,0 +1,367 @@
+"""
+Feed engines for post listings.
+
+The front page uses a seeded random feed: instead of randomizing the whole
+post table on every request, it keeps a shuffled, model-balanced ordering of
+post IDs for a given seed. The ordering is built once from an ID-only scan and
+kept as a compact array in a small LRU of its own, apart from the shared cache
+where it would evict rendered pages and comment trees, so rendering page N
+only loads the rows that are actually shown.
+
+Subdeaddit pages use a keyset feed: every model gets its own newest-first lane
+with its own cursor, and a page costs one bounded index range scan per lane.
+"""
+
+import base64
+import binascii
+import json
+import random
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+from itertools import islice
+from typing import Any, Optional
+
+from sqlalchemy import and_, or_
+
+from deaddit import cache, db
+
+from .caching import invalidate_tags, subdeaddit_models_tag, tagged_key
+from .models import Post
+from .utils import interleave_by_model
+
+# Visitors without an explicit seed share one ordering per window, so the
+# ordering is built at most once per window rather than once per visitor
+FEED_RESHUFFLE_SECONDS = 300
+
+# Seeds carried along in links stay valid for this many reshuffle windows, so
+# "Show More Posts" keeps its ordering. Other seeds give the current ordering,
+# so visitors can't have an ordering built for any seed they choose.
+FEED_SEED_WINDOWS = 4
+
+# Orderings kept per process, one per seed and model filter in use, enough
+# for every valid seed of the unfiltered feed
+FEED_ORDERINGS_SIZE = 8
+
+# Orderings are dropped once their seed can no longer be requested
+FEED_CACHE_TIMEOUT = FEED_RESHUFFLE_SECONDS * (FEED_SEED_WINDOWS + 1)
+
+# How long the list of models used in a subdeaddit is cached
+SUBDEADDIT_MODELS_CACHE_TIMEOUT = 300
+
+
+def current_feed_seed() -> int:
+    """
+    Get the shared feed seed for the current reshuffle window.
+
+    Returns:
+        Seed that changes every FEED_RESHUFFLE_SECONDS
+    """
+    return int(time.time() // FEED_RESHUFFLE_SECONDS)
+
+
+def resolve_feed_seed(seed: Optional[int]) -> int:
+    """
+    Get the feed seed to serve for a seed carried along in a link.
+
+    Args:
+        seed: Seed from the request, if any
+
+    Returns:
+        The seed if it is one of the last FEED_SEED_WINDOWS shared seeds,
+        otherwise the current one
+    """
+    current = current_feed_seed()
+    if seed is None or not current - FEED_SEED_WINDOWS < seed <= current:
+        return current
+    return seed
+
+
+# Feed orderings by seed and models, least recently used first, with the
+# monotonic time they were built
+_feed_orderings: OrderedDict[tuple, tuple[float, array]] = OrderedDict()
+_feed_orderings_lock = threading.Lock()
+
+
+def _build_feed(seed: int, models: Optional[list[str]]) -> array:
+    """
+    Build the shuffled, model-balanced ordering of post IDs.
+
+    Each model gets its own shuffled lane and the lanes are interleaved
+    round-robin, so every model stays represented on every page.
+    """
+    query = db.session.query(Post.id, Post.model)
+    if models:
+        query = query.filter(Post.model.in_(models))
+
+    ids_by_model = defaultdict(list)
+    for post_id, model in query:
+        ids_by_model[model].append(post_id)
+
+    # Sort before shuffling so the same seed always yields the same ordering
+    rng = random.Random(seed)
+    model_order = sorted(ids_by_model, key=lambda model: model or "")
+    rng.shuffle(model_order)
+    for lane in ids_by_model.values():
+        lane.sort()
+        rng.shuffle(lane)
+
+    # 8 bytes per post instead of a list of int objects
+    return array("q", interleave_by_model(ids_by_model, model_order))
+
+
+def _get_feed_ids(
+    seed: int, models: Optional[list[str]], start: int, end: int
+) -> tuple[list[int], int]:
+    """
+    Get the post IDs between start and end in the feed ordering.
+
+    Returns:
+        Tuple of (post_ids, total_posts_in_feed)
+    """
+    key = (seed, tuple(sorted(models)) if models else ())
+    with _feed_orderings_lock:
+        built_at, ordered_ids = _feed_orderings.get(key, (None, None))
+        if built_at is not None and time.monotonic() - built_at < FEED_CACHE_TIMEOUT:
+            _feed_orderings.move_to_end(key)
+        else:
+            ordered_ids = None
+
+    if ordered_ids is None:
+        ordered_ids = _build_feed(seed, models)
+        with _feed_orderings_lock:
+            _feed_orderings[key] = (time.monotonic(), ordered_ids)
+            _feed_orderings.move_to_end(key)
+            while len(_feed_orderings) > FEED_ORDERINGS_SIZE:
+                _feed_orderings.popitem(last=False)
+
+    return ordered_ids[start:end].tolist(), len(ordered_ids)
+
+
+def get_feed_page(
+    seed: int, models: Optional[list[str]], page: int, posts_per_page: int
+) -> tuple[list[Post], bool]:
+    """
+    Get one page of the random feed for a seed.
+
+    Posts created after the ordering was built show up once the seed rotates;
+    posts deleted since then are skipped.
+
+    Args:
+        seed: Feed seed, the same seed always gives the same ordering
+        models: Optional list of models to restrict the feed to
+        page: Current page number (1-indexed)
+        posts_per_page: Number of posts per page
+
+    Returns:
+        Tuple of (posts, has_more)
+    """
+    page = max(page, 1)
+    start = (page - 1) * posts_per_page
+    end = start + posts_per_page
+
+    post_ids, total = _get_feed_ids(seed, models, start, end)
+    if not post_ids:
+        return [], False
+
+    posts_by_id = {
+        post.id: post for post in Post.query.filter(Post.id.in_(post_ids)).all()
+    }
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+    return posts, total > end
+
+
+def encode_feed_cursor(state: dict[str, Any]) -> str:
+    """Encode a keyset feed state into an opaque, URL-safe cursor."""
+    payload = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _is_model(value: Any) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def _is_post_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_feed_cursor(cursor: Optional[str]) -> Optional[dict[str, Any]]:
+    """
+    Decode a cursor produced by encode_feed_cursor.
+
+    Returns:
+        The feed state, or None when the cursor is missing or malformed. The
+        lane order holds model names or None, each lane position is a
+        (created_at, post ID) pair.
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        order = state["order"]
+        lanes = state["lanes"]
+        if not (
+            isinstance(order, list)
+            and all(_is_model(model) for model in order)
+            and isinstance(lanes, list)
+            and all(
+                isinstance(lane, list)
+                and len(lane) == 3
+                and _is_model(lane[0])
+                and isinstance(lane[1], str)
+                and _is_post_id(lane[2])
+                for lane in lanes
+            )
+        ):
+            return None
+        positions = {
+            model: (datetime.fromisoformat(created_at), post_id)
+            for model, created_at, post_id in lanes
+        }
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+
+    # Creation times are stored without a time zone
+    if any(created_at.tzinfo for created_at, _ in positions.values()):
+        return None
+
+    return {"order": order, "positions": positions}
+
+
+def get_subdeaddit_models(subdeaddit_name: str) -> list[Optional[str]]:
+    """
+    Get the models that have posted in a subdeaddit, with caching.
+
+    Args:
+        subdeaddit_name: Name of the subdeaddit
+
+    Returns:
+        List of model names
+    """
+    cache_key = tagged_key(
+        f"subdeaddit_models_{subdeaddit_name}", subdeaddit_models_tag(subdeaddit_name)
+    )
+    models = cache.get(cache_key)
+    if models is None:
+        models = [
+            model
+            for (model,) in db.session.query(Post.model)
+            .filter(Post.subdeaddit_name == subdeaddit_name)
+            .distinct()
+        ]
+        cache.set(cache_key, models, timeout=SUBDEADDIT_MODELS_CACHE_TIMEOUT)
+    return models
+
+
+def evict_stale_subdeaddit_models(
+    subdeaddit_models: Iterable[tuple[str, Optional[str]]],
+) -> None:
+    """
+    Evict cached subdeaddit model lists that miss a model that just posted.
+
+    A model is missing if the new posts are its first in the subdeaddit. This
+    is checked in the database rather than against the cached list, which
+    may only be cached in another process.
+
+    Args:
+        subdeaddit_models: (subdeaddit_name, model) pairs of the new posts,
+            one per post
+    """
+    stale = [
+        subdeaddit_name
+        for (subdeaddit_name, model), new_posts in Counter(subdeaddit_models).items()
+        if db.session.query(Post.id)
+        .filter(Post.subdeaddit_name == subdeaddit_name, Post.model == model)
+        .limit(new_posts + 1)
+        .count()
+        <= new_posts
+    ]
+    invalidate_tags(subdeaddit_models_tag(subdeaddit_name) for subdeaddit_name in stale)
+
+
+def get_keyset_page(
+    subdeaddit_name: str,
+    models: list[Optional[str]],
+    cursor: Optional[str],
+    posts_per_page: int,
+) -> tuple[list[Post], Optional[str]]:
+    """
+    Get one page of a subdeaddit feed using per-model keyset cursors.
+
+    Each model lane is read newest first, continuing strictly after the last
+    (created_at, id) shown from that lane, and the lanes are interleaved
+    round-robin. The cursor also remembers the lane rotation, so the next page
+    resumes the model cycle where this one stopped.
+
+    Args:
+        subdeaddit_name: Name of the subdeaddit
+        models: Models to cycle through, used when starting without a cursor
+        cursor: Cursor returned for the previous page, or None for page 1
+        posts_per_page: Number of posts per page
+
+    Returns:
+        Tuple of (posts, next_cursor), next_cursor is None on the last page
+    """
+    state = decode_feed_cursor(cursor)
+    order = []
+    if state is not None:
+        # Only follow lanes of known models, in the order the cursor left them
+        order = list(
+            dict.fromkeys(model for model in state["order"] if model in models)
+        )
+    if order:
+        positions = state["positions"]
+    else:
+        order = list(models)
+        random.shuffle(order)
+        positions = {}
+
+    # One bounded index range scan per lane
+    lanes = {}
+    for model in order:
+        query = Post.query.filter(
+            Post.subdeaddit_name == subdeaddit_name, Post.model == model
+        )
+        if model in positions:
+            created_at, post_id = positions[model]
+            query = query.filter(
+                or_(
+                    Post.created_at < created_at,
+                    and_(Post.created_at == created_at, Post.id < post_id),
+                )
+            )
+        lanes[model] = (
+            query.order_by(Post.created_at.desc(), Post.id.desc())
+            .limit(posts_per_page + 1)
+            .yield_per(posts_per_page)
+        )
+
+    # Draw one post past the page to know which lane comes next, if any
+    drawn = list(islice(interleave_by_model(lanes, order), posts_per_page + 1))
+    posts = drawn[:posts_per_page]
+    if len(drawn) <= posts_per_page:
+        return posts, None
+
+    for post in posts:
+        positions[post.model] = (post.created_at, post.id)
+
+    # Rotate the cycle so the lane of the first post of the next page leads
+    next_lane = order.index(drawn[-1].model)
+    next_order = order[next_lane:] + order[:next_lane]
+
+    next_cursor = encode_feed_cursor(
+        {
+            "order": next_order,
+            "lanes": [
+                [model, created_at.isoformat(), post_id]
+                for model, (created_at, post_id) in positions.items()
+            ],
+        }
+    )
+    return posts, next_cursor
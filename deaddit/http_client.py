@@ -0,0 +1,151 @@
+"""
+Pooled HTTP client for calls to AI services and the Deaddit API.
+
+Plain requests.get/post open a new connection, and for HTTPS a new TLS
+session, on every call. This module keeps connections alive in per-host pools
+shared by every thread: each thread gets its own requests.Session, since a
+session's cookies and settings are not safe to share, but all sessions mount
+the same adapters, whose urllib3 pools are thread-safe. Pool sizes and the
+default connect timeout come from the HTTP_* settings and apply on restart.
+Reuse counters are kept per process, worker processes share theirs through
+deaddit.process_stats.
+"""
+
+import threading
+from collections.abc import Iterable
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import Config
+
+POOL_COUNTERS = ("requests", "connections", "reused", "idle")
+
+_adapters: dict[str, HTTPAdapter] = {}
+_adapters_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def _int_setting(key: str) -> int:
+    """Read a positive integer setting, falling back to its default."""
+    try:
+        return max(int(Config.get(key)), 1)
+    except (TypeError, ValueError):
+        return int(Config.DEFAULTS[key])
+
+
+def _get_adapters() -> dict[str, HTTPAdapter]:
+    """Create the shared adapters on first use."""
+    with _adapters_lock:
+        if not _adapters:
+            adapter = HTTPAdapter(
+                pool_connections=_int_setting("HTTP_POOL_HOSTS"),
+                pool_maxsize=_int_setting("HTTP_POOL_SIZE"),
+            )
+            _adapters.update({"http://": adapter, "https://": adapter})
+        return _adapters
+
+
+def get_session() -> requests.Session:
+    """
+    Get the session of the current thread.
+
+    Returns:
+        A session whose connections are pooled with every other thread's
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        for prefix, adapter in _get_adapters().items():
+            session.mount(prefix, adapter)
+        _thread_local.session = session
+    return session
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """
+    Send a request over a pooled keep-alive connection.
+
+    Takes the arguments of requests.request. Without a timeout, the
+    HTTP_CONNECT_TIMEOUT and HTTP_READ_TIMEOUT settings apply.
+
+    Args:
+        method: HTTP method
+        url: URL to request
+        **kwargs: Arguments of requests.request
+
+    Returns:
+        The response
+    """
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = (
+            _int_setting("HTTP_CONNECT_TIMEOUT"),
+            _int_setting("HTTP_READ_TIMEOUT"),
+        )
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    """Send a GET request, see request."""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    """Send a POST request, see request."""
+    return request("POST", url, **kwargs)
+
+
+def get_http_counters() -> dict[str, dict[str, int]]:
+    """
+    Get the connection reuse counters of the pools of this process.
+
+    Returns:
+        Dictionary with one entry per host pool, counting requests sent,
+        connections opened and reused, and idle connections
+    """
+    hosts = {}
+    for adapter in set(_get_adapters().values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+                "idle": pool.pool.qsize() if pool.pool is not None else 0,
+            }
+    return hosts
+
+
+def get_http_stats(other_counters: Iterable[dict[str, dict[str, int]]] = ()) -> dict:
+    """
+    Get connection reuse counters of the pools, of this process and others.
+
+    Args:
+        other_counters: Counters of other processes, as returned there by
+            get_http_counters
+
+    Returns:
+        Dictionary with one entry per host, counting requests sent and
+        connections opened, plus the totals
+    """
+    hosts: dict[str, dict[str, int]] = {}
+    for counters in [get_http_counters(), *other_counters]:
+        for host, pool in counters.items():
+            totals = hosts.setdefault(host, dict.fromkeys(POOL_COUNTERS, 0))
+            for name in POOL_COUNTERS:
+                totals[name] += pool.get(name, 0)
+
+    total_requests = sum(host["requests"] for host in hosts.values())
+    total_reused = sum(host["reused"] for host in hosts.values())
+    return {
+        "hosts": hosts,
+        "requests": total_requests,
+        "connections": sum(host["connections"] for host in hosts.values()),
+        "reuse_rate": round(total_reused / total_requests, 4)
+        if total_requests
+        else None,
+    }
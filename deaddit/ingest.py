@@ -0,0 +1,673 @@
+"""
+Content ingestion shared by the ingest API and the background jobs.
+
+Validates and stores subdeaddits, posts, comments and users, and keeps the
+denormalized counters and the caches in step with the new content. The API
+endpoints wrap these functions for external clients, while jobs call them
+directly instead of posting to their own process over HTTP.
+"""
+
+import json
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import Any, Optional, Union
+
+from sqlalchemy import insert, select
+
+from deaddit import cache, db
+
+from .authors import record_activity, record_users
+from .caching import MODELS_TAG, invalidate_post_caches, invalidate_tags, tagged_key
+from .counters import record_new_comments
+from .feed import evict_stale_subdeaddit_models
+from .models import Comment, Post, Subdeaddit, User
+from .utils import parse_utc_datetime, process_content
+
+# Keys per IN query when validating references, below SQLite's variable limit
+LOOKUP_CHUNK_SIZE = 5000
+
+# Records committed together by a streamed ingest
+STREAM_CHUNK_SIZE = 1000
+
+# Record types of a streamed ingest and the ingest_content list they go to
+STREAM_RECORD_TYPES = {
+    "subdeaddit": "subdeaddits",
+    "user": "users",
+    "post": "posts",
+    "comment": "comments",
+}
+
+# Fields a user needs to be ingested
+USER_FIELDS = [
+    "username",
+    "age",
+    "gender",
+    "bio",
+    "interests",
+    "occupation",
+    "education",
+    "writing_style",
+    "personality_traits",
+]
+
+
+class IngestError(Exception):
+    """Raised when none of the ingested data is valid. Nothing is stored."""
+
+    def __init__(self, message: str, errors: Optional[list[dict[str, Any]]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def get_available_models():
+    # Cached until content from a new model is ingested, in any process
+    cache_key = tagged_key("available_models", MODELS_TAG)
+    models = cache.get(cache_key)
+    if models is not None:
+        return models
+
+    # Query unique models from both Post and Comment tables
+    post_models = db.session.query(Post.model).distinct().all()
+    comment_models = db.session.query(Comment.model).distinct().all()
+
+    # Combine and deduplicate the models
+    all_models = {model[0] for model in post_models + comment_models if model[0]}
+
+    models = list(all_models)
+    cache.set(cache_key, models, timeout=0)
+    return models
+
+
+def ingest_content(
+    data: dict[str, Any],
+    id_map: Optional[dict[str, dict[Any, int]]] = None,
+    mapped_only: bool = False,
+) -> dict[str, Any]:
+    """
+    Validate and store subdeaddits, users, posts and comments in one transaction.
+
+    References are validated with one query per kind and the valid rows are
+    inserted with batched multi-row statements. Invalid items are skipped and
+    reported under "errors" instead of failing the batch.
+
+    Posts and comments may carry their "created_at" time, and posts their
+    "post_type", which exported content keeps. Content without a creation
+    time is created now.
+
+    Args:
+        data: Dictionary with optional "subdeaddits", "users", "posts" and
+            "comments" lists, in the format accepted by /api/ingest
+        id_map: Optional {"post": {}, "comment": {}} mapping of source IDs to
+            new IDs, shared across batches. Posts and comments that carry an
+            "id" are added to it, and comment post_id and parent_id values
+            found in it are translated, so content exported elsewhere keeps
+            its threads. Defaults to a mapping for this batch only.
+        mapped_only: Reject comments whose post_id or parent_id is not in
+            id_map instead of reading it as a local ID, for input whose IDs
+            all come from another instance
+
+    Returns:
+        Summary of the stored content, including the IDs of new posts and
+        comments and the type, list index and error of each rejected item
+
+    Raises:
+        IngestError: If no item is valid, in which case nothing is stored
+    """
+    try:
+        if id_map is None:
+            id_map = {"post": {}, "comment": {}}
+        return _ingest_content(data, id_map, mapped_only)
+    except Exception:
+        # Leave the session clean for callers that keep using it, e.g. jobs
+        db.session.rollback()
+        raise
+
+
+def _select_in(columns: list, key_column, keys: Iterable) -> list:
+    """Select the rows whose key is in keys, querying in chunks."""
+    keys = list(keys)
+    rows = []
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start : start + LOOKUP_CHUNK_SIZE]
+        rows.extend(db.session.execute(select(*columns).where(key_column.in_(chunk))))
+    return rows
+
+
+def _as_id(value: Any) -> Optional[int]:
+    """Read an ID that may have been sent as a string, None if it isn't one."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    """Read a creation time sent as an ISO 8601 string, None if it isn't one."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return parse_utc_datetime(value)
+    except ValueError:
+        return None
+
+
+def _source_id(value: Any) -> Any:
+    """Read a source ID, which may be any number or string, None otherwise."""
+    if isinstance(value, (int, str)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _missing_user_field(data: dict[str, Any]) -> Optional[str]:
+    """Get the first required user field missing from data, if any."""
+    return next((field for field in USER_FIELDS if field not in data), None)
+
+
+def _user_row(data: dict[str, Any]) -> dict[str, Any]:
+    """Build the column values of a user from its ingest format."""
+    return {
+        "username": data["username"],
+        "age": data["age"],
+        "gender": data["gender"] if data["gender"] in ["Male", "Female"] else "Male",
+        "bio": data["bio"],
+        "interests": json.dumps(data["interests"]),
+        "occupation": data["occupation"],
+        "education": data["education"],
+        "writing_style": data["writing_style"],
+        "personality_traits": json.dumps(data["personality_traits"]),
+        "model": data.get("model", "unknown"),
+    }
+
+
+def _insert_returning(model, rows: list[dict[str, Any]], *columns) -> list:
+    """Insert rows in batched statements and return the columns in insert order."""
+    if not rows:
+        return []
+    # RETURNING order is unspecified, SQLAlchemy restores the order of rows
+    return db.session.execute(
+        insert(model).returning(*columns, sort_by_parameter_order=True), rows
+    ).all()
+
+
+def _ingest_content(
+    data: dict[str, Any], id_map: dict[str, dict[Any, int]], mapped_only: bool
+) -> dict[str, Any]:
+    subdeaddits = data.get("subdeaddits", [])
+    users = data.get("users", [])
+    posts = data.get("posts", [])
+    comments = data.get("comments", [])
+    errors = []
+
+    def reject(item_type: str, index: int, message: str) -> None:
+        errors.append({"type": item_type, "index": index, "error": message})
+
+    # Read before inserting, so the new content can't hide a new model
+    known_models = set(get_available_models()) if posts or comments else set()
+
+    def source_ref(kind: str, value: Any) -> Any:
+        # Translate a reference to content seen earlier with a source ID
+        if _source_id(value) in id_map[kind]:
+            return id_map[kind][value]
+        return value
+
+    # Validate every referenced user and subdeaddit with one query per set
+    # instead of one per item
+    usernames = {item.get("user") for item in posts + comments if item.get("user")} | {
+        item.get("username") for item in users if item.get("username")
+    }
+    known_users = {
+        row.username for row in _select_in([User.username], User.username, usernames)
+    }
+
+    subdeaddit_names = {item.get("name") for item in subdeaddits if item.get("name")}
+    subdeaddit_names |= {
+        item.get("subdeaddit") for item in posts if item.get("subdeaddit")
+    }
+    known_subdeaddits = {
+        subdeaddit.name: subdeaddit
+        for subdeaddit in Subdeaddit.query.filter(Subdeaddit.name.in_(subdeaddit_names))
+    }
+
+    # Create or update subdeaddits first, so posts in the same batch can use them
+    subdeaddit_added = []
+    for index, subdeaddit_data in enumerate(subdeaddits):
+        name = subdeaddit_data.get("name")
+        description = subdeaddit_data.get("description")
+        post_types = subdeaddit_data.get("post_types", [])
+
+        if not all([name, description]):
+            missing_fields = []
+            if not name:
+                missing_fields.append("name")
+            if not description:
+                missing_fields.append("description")
+            reject(
+                "subdeaddit",
+                index,
+                f"Subdeaddit missing required fields: {', '.join(missing_fields)}",
+            )
+            continue
+
+        # Check if subdeaddit already exists
+        existing_subdeaddit = known_subdeaddits.get(name)
+        if existing_subdeaddit:
+            # Update existing subdeaddit
+            existing_subdeaddit.description = description
+            existing_subdeaddit.set_post_types(post_types)
+            subdeaddit_added.append(f"Updated subdeaddit: {name}")
+        else:
+            # Create new subdeaddit
+            subdeaddit = Subdeaddit(name=name, description=description)
+            subdeaddit.set_post_types(post_types)
+            db.session.add(subdeaddit)
+            known_subdeaddits[name] = subdeaddit
+            subdeaddit_added.append(f"Created subdeaddit: {name}")
+
+    # Validate users, so posts and comments in the same batch can use them
+    user_rows = []
+    for index, user_data in enumerate(users):
+        missing_field = _missing_user_field(user_data)
+        if missing_field:
+            reject("user", index, f"Missing required field: {missing_field}")
+        elif user_data["username"] in known_users:
+            reject("user", index, f"User '{user_data['username']}' already exists")
+        else:
+            user_rows.append(_user_row(user_data))
+            known_users.add(user_data["username"])
+
+    # Validate posts
+    post_rows = []
+    post_source_ids = []
+    for index, post_data in enumerate(posts):
+        user = post_data.get("user")
+        title = post_data.get("title")
+        content = post_data.get("content")
+        upvote_count = post_data.get("upvote_count")
+        subdeaddit_name = post_data.get("subdeaddit")
+        created_at = _as_datetime(post_data.get("created_at"))
+
+        if user not in known_users:
+            reject("post", index, f"User '{user}' does not exist")
+        elif upvote_count is None or not all([title, content, user, subdeaddit_name]):
+            reject("post", index, "Invalid post data")
+        elif subdeaddit_name not in known_subdeaddits:
+            reject("post", index, f"Subdeaddit '{subdeaddit_name}' does not exist")
+        elif created_at is None and post_data.get("created_at") is not None:
+            reject("post", index, "created_at must be an ISO 8601 date")
+        else:
+            post_rows.append(
+                {
+                    "title": title,
+                    "content": process_content(content),
+                    "upvote_count": upvote_count,
+                    "user": user,
+                    "subdeaddit_name": subdeaddit_name,
+                    "model": post_data.get("model", "unknown"),
+                    "post_type": post_data.get("post_type"),
+                    "created_at": created_at or datetime.utcnow(),
+                }
+            )
+            post_source_ids.append(_source_id(post_data.get("id")))
+
+    # Insert subdeaddits, users and posts, so comments can refer to them
+    db.session.flush()
+    if user_rows:
+        db.session.execute(insert(User), user_rows)
+    created_posts = _insert_returning(
+        Post,
+        post_rows,
+        Post.id,
+        Post.title,
+        Post.subdeaddit_name,
+        Post.user,
+        Post.model,
+    )
+    for source_id, post in zip(post_source_ids, created_posts):
+        if source_id is not None:
+            id_map["post"][source_id] = post.id
+
+    # Look up the posts and parents comments refer to, one query per set
+    comment_post_ids = {
+        _as_id(source_ref("post", item.get("post_id"))) for item in comments
+    } - {None}
+    known_post_ids = {
+        row.id for row in _select_in([Post.id], Post.id, comment_post_ids)
+    }
+    parent_ids = {
+        _as_id(source_ref("comment", item.get("parent_id"))) for item in comments
+    } - {None}
+    parent_posts = dict(
+        _select_in([Comment.id, Comment.post_id], Comment.id, parent_ids)
+    )
+
+    # Source IDs of the comments in this batch, replies to them wait for them
+    batch_comment_ids = (
+        {_source_id(item.get("id")) for item in comments}
+        - set(id_map["comment"])
+        - {None}
+    )
+
+    # Validate comments
+    ready = []
+    waiting = defaultdict(list)
+    for index, comment_data in enumerate(comments):
+        user = comment_data.get("user")
+        post_ref = _source_id(comment_data.get("post_id"))
+        post_id = _as_id(source_ref("post", post_ref))
+        parent_ref = _source_id(comment_data.get("parent_id"))
+        content = comment_data.get("content")
+
+        if user and user not in known_users:
+            reject("comment", index, f"User '{user}' does not exist")
+            continue
+
+        if (
+            mapped_only
+            and post_ref not in (None, "")
+            and post_ref not in id_map["post"]
+        ):
+            reject("comment", index, f"Post {post_ref} was not ingested")
+            continue
+
+        if not all([post_id, content, user]):
+            missing_fields = []
+            if not post_id:
+                missing_fields.append("post_id")
+            if not content:
+                missing_fields.append("content")
+            if not user:
+                missing_fields.append("user")
+            reject(
+                "comment",
+                index,
+                f"Comment missing required fields: {', '.join(missing_fields)}",
+            )
+            continue
+
+        if post_id not in known_post_ids:
+            reject("comment", index, f"Post {post_id} does not exist")
+            continue
+
+        created_at = _as_datetime(comment_data.get("created_at"))
+        if created_at is None and comment_data.get("created_at") is not None:
+            reject("comment", index, "created_at must be an ISO 8601 date")
+            continue
+
+        entry = (
+            index,
+            _source_id(comment_data.get("id")),
+            {
+                "post_id": post_id,
+                "parent_id": None,
+                "content": process_content(content),
+                "upvote_count": comment_data.get("upvote_count", 0),
+                "user": user,
+                "model": comment_data.get("model", "unknown"),
+                "created_at": created_at or datetime.utcnow(),
+            },
+        )
+
+        if parent_ref in (None, ""):
+            ready.append(entry)
+        elif parent_ref in batch_comment_ids:
+            waiting[parent_ref].append(entry)
+        elif mapped_only and parent_ref not in id_map["comment"]:
+            reject("comment", index, f"Parent comment {parent_ref} was not ingested")
+        else:
+            parent_id = _as_id(source_ref("comment", parent_ref))
+            if parent_posts.get(parent_id) != post_id:
+                reject(
+                    "comment",
+                    index,
+                    f"Parent comment {parent_ref} does not exist on post {post_id}",
+                )
+                continue
+            entry[2]["parent_id"] = parent_id
+            ready.append(entry)
+
+    # Insert comments level by level, replies after the comments they answer
+    created_comments = []
+    while ready:
+        created = _insert_returning(
+            Comment,
+            [row for _, _, row in ready],
+            Comment.id,
+            Comment.post_id,
+            Comment.parent_id,
+            Comment.content,
+            Comment.user,
+            Comment.model,
+        )
+        created_comments += created
+
+        replies = []
+        for (_, source_id, row), comment in zip(ready, created):
+            if source_id is None:
+                continue
+            id_map["comment"][source_id] = comment.id
+            for reply in waiting.pop(source_id, []):
+                if reply[2]["post_id"] != row["post_id"]:
+                    reject(
+                        "comment",
+                        reply[0],
+                        f"Parent comment {source_id} does not exist on post {reply[2]['post_id']}",
+                    )
+                    continue
+                reply[2]["parent_id"] = comment.id
+                replies.append(reply)
+        ready = replies
+
+    # Replies whose parent was rejected
+    for source_id, replies in waiting.items():
+        for index, _, _ in replies:
+            reject("comment", index, f"Parent comment {source_id} was not ingested")
+
+    if errors and not (
+        subdeaddit_added or user_rows or created_posts or created_comments
+    ):
+        raise IngestError(errors[0]["error"], errors)
+
+    # Update the counters in the same transaction
+    record_new_comments(created_comments)
+
+    db.session.commit()
+
+    # Evict only the cache entries the new content changed
+    invalidate_post_caches({comment.post_id for comment in created_comments})
+    new_models = {row.model for row in created_posts + created_comments}
+    if not new_models <= known_models:
+        invalidate_tags([MODELS_TAG])
+    evict_stale_subdeaddit_models(
+        [(post.subdeaddit_name, post.model) for post in created_posts]
+    )
+
+    # Keep the author index of the generation jobs current
+    record_users(row["username"] for row in user_rows)
+    record_activity(row.user for row in created_posts + created_comments)
+
+    added = [post.title for post in created_posts]
+    added += [comment.content for comment in created_comments]
+    added += subdeaddit_added
+    added += [f"Created user: {row['username']}" for row in user_rows]
+    result = {
+        "message": "Posts and comments created successfully",
+        "added": added,
+    }
+
+    # Add post IDs if posts were created
+    if created_posts:
+        result["posts"] = [
+            {"id": post.id, "title": post.title} for post in created_posts
+        ]
+
+    # Add comment IDs if comments were created
+    if created_comments:
+        result["comments"] = [
+            {"id": comment.id, "content": comment.content[:50]}
+            for comment in created_comments
+        ]
+
+    # Add usernames if users were created
+    if user_rows:
+        result["users"] = [row["username"] for row in user_rows]
+
+    # Report the items that were skipped
+    if errors:
+        errors.sort(key=lambda error: (error["type"], error["index"]))
+        result["message"] = f"Content created, {len(errors)} items were rejected"
+        result["errors"] = errors
+
+    return result
+
+
+def ingest_user_data(data: dict[str, Any]) -> User:
+    """
+    Validate and store a user.
+
+    Args:
+        data: User profile in the format accepted by /api/ingest/user
+
+    Returns:
+        The created user
+
+    Raises:
+        IngestError: If a required field is missing
+    """
+    try:
+        missing_field = _missing_user_field(data)
+        if missing_field:
+            raise IngestError(f"Missing required field: {missing_field}")
+
+        user = User(**_user_row(data))
+        db.session.add(user)
+        db.session.commit()
+    except Exception:
+        # Leave the session clean for callers that keep using it, e.g. jobs
+        db.session.rollback()
+        raise
+
+    record_users([user.username])
+    return user
+
+
+def ingest_stream(
+    lines: Iterable[Union[bytes, str]], chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[dict[str, Any]]:
+    """
+    Ingest newline-delimited JSON records, committing every chunk_size records.
+
+    Each line is an object with a "type" (subdeaddit, user, post or comment)
+    and the fields ingest_content takes for that type. Lines are parsed as
+    they are read, so memory use depends on the chunk size and not on the
+    size of the input. Post and comment "id"s are remapped for the whole
+    stream, see ingest_content. Comments can only refer to posts and comments
+    ingested earlier in the stream, as their IDs can't be told apart from
+    local ones.
+
+    Args:
+        lines: Lines of the input, e.g. a request stream or an open file
+        chunk_size: Number of records per transaction
+
+    Yields:
+        A summary per committed chunk with its line range, the number of
+        records stored per type and the line and error of rejected records,
+        then a final summary with the totals
+    """
+    id_map = {"post": {}, "comment": {}}
+    totals = dict.fromkeys(STREAM_RECORD_TYPES.values(), 0)
+    totals["rejected"] = 0
+    chunk_number = 0
+    line_number = 0
+
+    def new_chunk():
+        return {key: [] for key in STREAM_RECORD_TYPES.values()}
+
+    data, record_lines, errors, first_line = new_chunk(), new_chunk(), [], None
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        if first_line is None:
+            first_line = line_number
+
+        try:
+            record = json.loads(line)
+            key = STREAM_RECORD_TYPES[record.pop("type")]
+        except (ValueError, AttributeError, KeyError, TypeError):
+            errors.append(
+                {
+                    "line": line_number,
+                    "error": "Invalid record, expected a JSON object with a known type",
+                }
+            )
+        else:
+            data[key].append(record)
+            record_lines[key].append(line_number)
+
+        if sum(len(records) for records in data.values()) >= chunk_size:
+            chunk_number += 1
+            summary = _ingest_chunk(data, record_lines, errors, id_map)
+            summary.update(
+                chunk=chunk_number, first_line=first_line, last_line=line_number
+            )
+            yield summary
+            if "error" in summary:
+                return
+            _add_totals(totals, summary)
+            data, record_lines, errors, first_line = new_chunk(), new_chunk(), [], None
+
+    if first_line is not None:
+        chunk_number += 1
+        summary = _ingest_chunk(data, record_lines, errors, id_map)
+        summary.update(chunk=chunk_number, first_line=first_line, last_line=line_number)
+        yield summary
+        if "error" in summary:
+            return
+        _add_totals(totals, summary)
+
+    yield {"done": True, "chunks": chunk_number, "lines": line_number, **totals}
+
+
+def _ingest_chunk(
+    data: dict[str, list],
+    record_lines: dict[str, list[int]],
+    errors: list[dict[str, Any]],
+    id_map: dict[str, dict[Any, int]],
+) -> dict[str, Any]:
+    """Ingest one chunk of a stream and summarize it by input line."""
+    summary = dict.fromkeys(STREAM_RECORD_TYPES.values(), 0)
+    rejected = []
+    if any(data.values()):
+        try:
+            result = ingest_content(data, id_map, mapped_only=True)
+        except IngestError as e:
+            rejected = e.errors
+        except Exception as e:
+            # Stop the stream, earlier chunks stay committed
+            summary["error"] = f"Chunk could not be stored: {e}"
+            return summary
+        else:
+            rejected = result.get("errors", [])
+
+    rejected_per_type = defaultdict(int)
+    for error in rejected:
+        key = STREAM_RECORD_TYPES[error["type"]]
+        rejected_per_type[key] += 1
+        errors.append(
+            {"line": record_lines[key][error["index"]], "error": error["error"]}
+        )
+    for key, records in data.items():
+        summary[key] = len(records) - rejected_per_type[key]
+
+    errors.sort(key=lambda error: error["line"])
+    summary["errors"] = errors
+    return summary
+
+
+def _add_totals(totals: dict[str, int], summary: dict[str, Any]) -> None:
+    for key in STREAM_RECORD_TYPES.values():
+        totals[key] += summary[key]
+    totals["rejected"] += len(summary["errors"])
@@ -1,75 +1,172 @@
 """
 Job management system for Deaddit admin UI.
 Handles background job processing using APScheduler (no Redis required).
+
+The Job table is the durable queue. A job runs only after it is atomically
+claimed, which leases it to one worker until lease_expires_at. The worker
+renews the lease with a heartbeat while the job runs, and jobs whose lease
+expires, because their process died, are put back in the queue and resume
+from their last reported progress. Recurring jobs are kept in the database
+by APScheduler's SQLAlchemy job store, so they survive restarts.
+
+Jobs run on threads of the web process by default. With the JOB_EXECUTION
+setting set to "worker" the web process only queues them, and separate
+processes started with `flask --app deaddit worker` claim and run them.
+Workers have no WebSocket clients, so the web process relays their progress
+from the Job table to the admin UI.
 """
 
+import concurrent.futures
+import multiprocessing
 import os
+import signal
+import socket
 import threading
 import time
 import uuid
-from datetime import datetime
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import closing
+from datetime import datetime, timedelta
 from typing import Any, Optional
 
-import requests
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from loguru import logger
+from sqlalchemy import bindparam, or_, select, update
 
 from deaddit import db
+from deaddit.completions import (
+    CompletionError,
+    chat_completion,
+    extract_json_object,
+)
 from deaddit.config import Config
+from deaddit.ingest import ingest_content, ingest_user_data
 from deaddit.models import Job, JobStatus, JobType
+from deaddit.process_stats import save_process_stats
+from deaddit.prompt_cache import apply_cache_hints, record_usage
 
-# APScheduler configuration
+# APScheduler configuration, executors are resized from the settings on start.
+# One-off runs live in memory since the Job table is the queue, recurring
+# jobs get a database job store when the scheduler starts.
 jobstores = {"default": MemoryJobStore()}
 executors = {
     "default": ThreadPoolExecutor(max_workers=1),
     "high_priority": ThreadPoolExecutor(max_workers=1),
     "low_priority": ThreadPoolExecutor(max_workers=1),
 }
+EXECUTOR_WORKER_SETTINGS = {
+    "default": "JOB_WORKERS_DEFAULT",
+    "high_priority": "JOB_WORKERS_HIGH_PRIORITY",
+    "low_priority": "JOB_WORKERS_LOW_PRIORITY",
+}
 job_defaults = {
     "coalesce": False,
     "max_instances": 1,
     "misfire_grace_time": 86400,  # 24 hours
 }
 
+# Upper bound for the per-job "concurrency" parameter of generation jobs
+MAX_JOB_CONCURRENCY = 16
+
+# Seconds a claimed job stays leased, renewed every JOB_HEARTBEAT_SECONDS
+JOB_LEASE_SECONDS = 90
+JOB_HEARTBEAT_SECONDS = 30
+
+# Claims after which a job whose lease keeps expiring is failed instead of retried
+MAX_JOB_ATTEMPTS = 3
+
+# Seconds an idle worker process waits before looking for queued jobs again
+WORKER_POLL_SECONDS = 2.0
+
+# Queued jobs a worker tries to claim per query, others may win some of them
+WORKER_CLAIM_CANDIDATES = 10
+
+# Set in worker processes, which don't run the scheduler
+WORKER_PROCESS_ENV = "DEADDIT_WORKER_PROCESS"
+
 # Global scheduler instance
 scheduler = BackgroundScheduler(
     jobstores=jobstores, executors=executors, job_defaults=job_defaults
 )
 
 
-# API configuration
-def get_api_base_url():
-    """Get API_BASE_URL dynamically from config."""
-    return Config.get("API_BASE_URL", "http://localhost:5000")
+# Thread-local storage for job progress updates
+_thread_local = threading.local()
 
 
-def get_api_headers():
-    """Get API headers with current API token."""
-    # Use Config to get API_TOKEN (database first, then environment)
-    api_token = None
-    try:
-        api_token = Config.get("API_TOKEN")
-    except Exception:
-        # Fallback to environment if Config isn't available yet
-        api_token = os.environ.get("API_TOKEN")
+class LeaseLostError(Exception):
+    """Raised in a running job whose worker no longer holds its lease."""
 
-    headers = {}
-    if api_token:
-        headers["Authorization"] = f"Bearer {api_token}"
-        headers["Content-Type"] = "application/json"
-    return headers
 
+# Job progress and WebSocket updates, flushed in batches every
+# PROGRESS_FLUSH_SECONDS or once a job advanced PROGRESS_FLUSH_ITEMS items
+PROGRESS_FLUSH_SECONDS = 1.0
+PROGRESS_FLUSH_ITEMS = 25
+_pending_progress: dict[int, int] = {}
+_flushed_progress: dict[int, int] = {}
+_pending_updates: dict[int, dict[str, Any]] = {}
+_job_payloads: dict[int, dict[str, Any]] = {}
+_job_updates_lock = threading.Lock()
+_flush_requested = threading.Event()
+_job_updates_flusher: Optional[threading.Thread] = None
 
-# Thread-local storage for job progress updates
-_thread_local = threading.local()
+# Seconds the Job table is read back behind the last relay in worker mode, so
+# jobs whose final write committed late are still relayed
+JOB_RELAY_OVERLAP_SECONDS = 30
+_relayed_payloads: dict[int, dict[str, Any]] = {}
+_relayed_since: Optional[datetime] = None
+
+# Endpoint key -> (limit, semaphore) bounding concurrent LLM requests
+_endpoint_semaphores: dict[str, tuple[int, threading.BoundedSemaphore]] = {}
+_endpoint_semaphores_lock = threading.Lock()
+
+
+def _build_executors() -> dict[str, ThreadPoolExecutor]:
+    """Create the executor pools, sized by the JOB_WORKERS_* settings."""
+    pools = {}
+    for name, setting in EXECUTOR_WORKER_SETTINGS.items():
+        try:
+            max_workers = max(int(Config.get(setting, "1")), 1)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid {setting} setting, using 1 worker")
+            max_workers = 1
+        pools[name] = ThreadPoolExecutor(max_workers=max_workers)
+    return pools
 
 
 def start_scheduler():
-    """Start the APScheduler if not already running."""
-    if not scheduler.running:
+    """
+    Start the APScheduler if not already running.
+
+    The scheduler runs queued and recurring jobs in this process, so it is
+    never started in worker processes or when jobs are left to workers, see
+    _scheduler_enabled.
+    """
+    if not scheduler.running and _scheduler_enabled():
+        from deaddit import app
+
+        # Executors and job stores can only be replaced while the scheduler is
+        # stopped
+        executors.update(_build_executors())
+        with app.app_context():
+            jobstores["recurring"] = SQLAlchemyJobStore(engine=db.engine)
+        scheduler.configure(
+            jobstores=jobstores, executors=executors, job_defaults=job_defaults
+        )
         scheduler.start()
+
+        # Put jobs of workers that died back in the queue
+        scheduler.add_job(
+            _recover_expired_leases_job,
+            "interval",
+            seconds=JOB_LEASE_SECONDS,
+            id="recover_expired_leases",
+            replace_existing=True,
+        )
         logger.info("APScheduler started successfully")
 
 
@@ -102,38 +199,355 @@ def create_job(
     db.session.add(job)
     db.session.commit()
 
+    # Schedule the job
+    _schedule_execution(job, delay_seconds)
+
+    logger.info(
+        f"Scheduled job {job.id} ({job_type.value}) with scheduler ID {job.rq_job_id}"
+    )
+    return job
+
+
+def _schedule_execution(job: Job, delay_seconds: int = 0) -> None:
+    """
+    Run a pending job on the in-process executor matching its priority.
+
+    Nothing is scheduled when jobs run in worker processes, which pick up
+    queued jobs on their own. Delays only apply to in-process execution.
+    """
+    if not _scheduler_enabled():
+        return
+
     # Start scheduler if not running
     start_scheduler()
 
     # Select executor based on priority
-    if priority >= 8:
+    if job.priority >= 8:
         executor = "high_priority"
-    elif priority <= 3:
+    elif job.priority <= 3:
         executor = "low_priority"
     else:
         executor = "default"
 
-    # Schedule the job
-    scheduled_job = scheduler.add_job(
+    scheduler.add_job(
         execute_job,
         "date",
-        run_date=datetime.now()
-        if delay_seconds == 0
-        else datetime.now().timestamp() + delay_seconds,
+        run_date=datetime.now() + timedelta(seconds=delay_seconds),
         args=[job.id],
         id=job.rq_job_id,
         executor=executor,
         replace_existing=True,
     )
 
-    logger.info(
-        f"Scheduled job {job.id} ({job_type.value}) with scheduler ID {scheduled_job.id}"
+
+def _runs_in_workers() -> bool:
+    """Check whether queued jobs are left to worker processes."""
+    return Config.get("JOB_EXECUTION") == "worker"
+
+
+def _scheduler_enabled() -> bool:
+    """
+    Check whether this process may run the scheduler.
+
+    Only one process can own the scheduler, as the recurring job store is
+    shared through the database: the web process with inline execution.
+    """
+    return not os.environ.get(WORKER_PROCESS_ENV) and not _runs_in_workers()
+
+
+def _lease_owner() -> str:
+    """Identify the current worker thread across processes and hosts."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_job(job_id: int, owner: str) -> bool:
+    """
+    Atomically move a pending job to running and lease it to a worker.
+
+    The UPDATE only matches while the job is still pending, so when several
+    workers race for the same job exactly one of them claims it.
+
+    Args:
+        job_id: ID of the job to claim
+        owner: Identity of the claiming worker
+
+    Returns:
+        True if the job was claimed, False if it is no longer pending
+    """
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.PENDING)
+        .values(
+            status=JobStatus.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+            attempts=Job.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def claim_next_job(owner: str) -> Optional[int]:
+    """
+    Claim the queued job with the highest priority, oldest first.
+
+    Args:
+        owner: Identity of the claiming worker
+
+    Returns:
+        ID of the claimed job, or None if no job is queued
+    """
+    while True:
+        candidates = db.session.scalars(
+            select(Job.id)
+            .where(Job.status == JobStatus.PENDING)
+            .order_by(Job.priority.desc(), Job.created_at, Job.id)
+            .limit(WORKER_CLAIM_CANDIDATES)
+        ).all()
+        if not candidates:
+            return None
+
+        for job_id in candidates:
+            if claim_job(job_id, owner):
+                return job_id
+
+
+def renew_lease(job_id: int, owner: str) -> bool:
+    """
+    Extend the lease of a running job.
+
+    Args:
+        job_id: ID of the running job
+        owner: Identity of the worker holding the lease
+
+    Returns:
+        False if the worker no longer holds the lease
+    """
+    now = datetime.utcnow()
+    renewed = db.session.execute(
+        update(Job)
+        .where(
+            Job.id == job_id,
+            Job.status == JobStatus.RUNNING,
+            Job.lease_owner == owner,
+        )
+        .values(
+            heartbeat_at=now,
+            lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return renewed == 1
+
+
+def _heartbeat(
+    job_id: int, owner: str, stop: threading.Event, lost: threading.Event
+) -> None:
+    """Renew the lease of a running job until stop is set, set lost if it fails."""
+    from deaddit import app
+
+    with app.app_context():
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                if not renew_lease(job_id, owner):
+                    if not stop.is_set():
+                        lost.set()
+                        logger.warning(f"Job {job_id} lost its lease")
+                    return
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not renew the lease of job {job_id}: {e}")
+
+
+def recover_expired_leases() -> list[int]:
+    """
+    Put running jobs whose lease expired back in the queue.
+
+    Jobs that were claimed MAX_JOB_ATTEMPTS times are failed instead, so a
+    job that crashes its worker can't do so forever. Running jobs without a
+    lease predate leases and are recovered as well.
+
+    Returns:
+        IDs of the jobs put back in the queue
+    """
+    now = datetime.utcnow()
+    expired = (
+        Job.status == JobStatus.RUNNING,
+        or_(Job.lease_expires_at < now, Job.lease_expires_at.is_(None)),
     )
-    return job
 
+    failed = db.session.scalars(
+        update(Job)
+        .where(*expired, Job.attempts >= MAX_JOB_ATTEMPTS)
+        .values(
+            status=JobStatus.FAILED,
+            completed_at=now,
+            error_message=f"Worker lost after {MAX_JOB_ATTEMPTS} attempts",
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    requeued = db.session.scalars(
+        update(Job)
+        .where(*expired)
+        .values(status=JobStatus.PENDING, lease_owner=None, lease_expires_at=None)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+
+    if failed:
+        logger.error(f"Failed jobs {failed} after their workers were lost repeatedly")
+    if requeued:
+        logger.warning(f"Requeued jobs {requeued} after their leases expired")
+    return requeued
 
-def execute_job(job_id: int) -> dict[str, Any]:
-    """Execute a job based on its type."""
+
+def _recover_expired_leases_job() -> None:
+    """Scheduler entry point for recover_expired_leases."""
+    from deaddit import app
+
+    with app.app_context():
+        for job_id in recover_expired_leases():
+            _schedule_execution(db.session.get(Job, job_id))
+
+
+def run_worker(
+    poll_interval: float = WORKER_POLL_SECONDS,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Claim and run queued jobs one at a time until stop is set.
+
+    The worker also puts jobs of lost workers back in the queue, since the
+    web process may not be running.
+
+    Args:
+        poll_interval: Seconds to wait when no job is queued
+        stop: Event that ends the loop once the current job finishes
+    """
+    from deaddit import app
+
+    stop = stop or threading.Event()
+    owner = _lease_owner()
+    next_recovery = 0.0
+
+    logger.info(f"Worker {owner} waiting for jobs")
+    while not stop.is_set():
+        with app.app_context():
+            if time.monotonic() >= next_recovery:
+                recover_expired_leases()
+                next_recovery = time.monotonic() + JOB_LEASE_SECONDS
+
+            job_id = claim_next_job(owner)
+
+        if job_id is None:
+            stop.wait(poll_interval)
+            continue
+
+        try:
+            execute_job(job_id, owner=owner)
+        except Exception:
+            # Already logged and recorded on the job
+            pass
+
+        # The admin pages of the web process show the counters of workers
+        with app.app_context():
+            try:
+                save_process_stats()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not store the worker counters: {e}")
+    logger.info(f"Worker {owner} stopped")
+
+
+def _worker_process(poll_interval: float) -> None:
+    """Entry point of a worker process, stops on SIGTERM after the current job."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    run_worker(poll_interval, stop)
+
+
+def run_worker_processes(
+    processes: int, poll_interval: float = WORKER_POLL_SECONDS
+) -> None:
+    """
+    Run worker processes until they are all stopped.
+
+    Processes are spawned rather than forked so none inherits the database
+    connections or scheduler threads of this process.
+
+    Args:
+        processes: Number of worker processes, each runs one job at a time
+        poll_interval: Seconds an idle worker waits before polling again
+    """
+    # Both the web process and the workers would run the queued jobs
+    if not _runs_in_workers():
+        raise RuntimeError('Set JOB_EXECUTION to "worker" to run worker processes')
+
+    # Spawned workers import the app with this set, so they never restart
+    # pending jobs or start the scheduler, see deaddit/__init__.py
+    os.environ[WORKER_PROCESS_ENV] = "1"
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=_worker_process,
+            args=(poll_interval,),
+            name=f"deaddit-worker-{index}",
+        )
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop_workers(signum=None, frame=None):
+        # Workers finish their current job on SIGTERM
+        logger.info("Waiting for workers to finish their current jobs")
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        stop_workers()
+        for worker in workers:
+            worker.join()
+
+
+def _first_item(job: Job) -> int:
+    """
+    Get the index of the first item a job should run.
+
+    A job claimed again after its worker was lost resumes at its last
+    reported progress, so items done before are not generated twice.
+    """
+    if job.attempts > 1:
+        return min(job.progress or 0, job.total_items or 0)
+    return 0
+
+
+def execute_job(job_id: int, owner: Optional[str] = None) -> dict[str, Any]:
+    """
+    Execute a job based on its type.
+
+    Args:
+        job_id: ID of the job to run
+        owner: Lease owner if the caller already claimed the job, otherwise
+            the job is claimed here
+    """
 
     from deaddit import app
 
@@ -146,14 +560,28 @@ def execute_job(job_id: int) -> dict[str, Any]:
         if not job:
             raise ValueError(f"Job {job_id} not found")
 
-        # Update job status to running
-        job.status = JobStatus.RUNNING
-        job.started_at = datetime.utcnow()
-        db.session.commit()
+        # Claim the job, another worker may have taken it or it was cancelled
+        if owner is None:
+            owner = _lease_owner()
+            if not claim_job(job_id, owner):
+                logger.info(f"Job {job_id} is no longer pending, skipping it")
+                return None
+        db.session.refresh(job)
 
         # Emit job started update
         _emit_job_update(job)
 
+        # Keep the lease alive while the job runs, progress updates abort the
+        # job once it is lost
+        stop_heartbeat = threading.Event()
+        _thread_local.lease_lost = threading.Event()
+        threading.Thread(
+            target=_heartbeat,
+            args=(job_id, owner, stop_heartbeat, _thread_local.lease_lost),
+            name=f"job-{job_id}-heartbeat",
+            daemon=True,
+        ).start()
+
         try:
             logger.info(f"Executing job {job_id} ({job.type.value})")
 
@@ -171,13 +599,17 @@ def execute_job(job_id: int) -> dict[str, Any]:
             else:
                 raise ValueError(f"Unknown job type: {job.type}")
 
-            # Update job as completed
-            job = db.session.get(Job, job_id)  # Re-fetch to avoid stale data
-            job.status = JobStatus.COMPLETED
-            job.completed_at = datetime.utcnow()
-            job.progress = job.total_items
-            job.result = result
-            db.session.commit()
+            # Update job as completed, unless another worker took it over
+            job = _finish_job(
+                job_id,
+                owner,
+                status=JobStatus.COMPLETED,
+                progress=Job.total_items,
+                result=result,
+            )
+            if job is None:
+                logger.warning(f"Job {job_id} lost its lease, dropping its result")
+                return None
 
             # Emit completion update
             _emit_job_update(job)
@@ -185,12 +617,16 @@ def execute_job(job_id: int) -> dict[str, Any]:
             logger.info(f"Job {job_id} completed successfully")
             return result
 
+        except LeaseLostError:
+            logger.warning(f"Job {job_id} lost its lease, stopped running it")
+            return None
+
         except Exception as e:
+            db.session.rollback()
+
             # Update job as failed, but try to preserve any partial results (like API requests)
             job = db.session.get(Job, job_id)  # Re-fetch to avoid stale data
-            job.status = JobStatus.FAILED
-            job.completed_at = datetime.utcnow()
-            job.error_message = str(e)
+            partial_result = None
 
             # Try to get partial results that might contain API requests
             try:
@@ -206,16 +642,23 @@ def execute_job(job_id: int) -> dict[str, Any]:
                     partial_result = None
 
                 if partial_result and partial_result.get("api_requests"):
-                    job.result = partial_result
                     logger.info(
                         f"Preserved {len(partial_result['api_requests'])} API requests for failed job {job_id}"
                     )
+                else:
+                    partial_result = None
             except Exception as partial_e:
                 logger.warning(
                     f"Could not preserve partial results for failed job {job_id}: {partial_e}"
                 )
 
-            db.session.commit()
+            failed_values = {"status": JobStatus.FAILED, "error_message": str(e)}
+            if partial_result:
+                failed_values["result"] = partial_result
+            job = _finish_job(job_id, owner, **failed_values)
+            if job is None:
+                logger.warning(f"Job {job_id} failed after losing its lease: {e}")
+                return None
 
             # Emit failure update
             _emit_job_update(job)
@@ -223,6 +666,43 @@ def execute_job(job_id: int) -> dict[str, Any]:
             logger.error(f"Job {job_id} failed: {e}")
             raise
 
+        finally:
+            stop_heartbeat.set()
+
+
+def _finish_job(job_id: int, owner: str, **values: Any) -> Optional[Job]:
+    """
+    Store the outcome of a job if its worker still holds the lease.
+
+    Args:
+        job_id: ID of the running job
+        owner: Identity of the worker that ran the job
+        **values: Columns to set, besides completed_at and the lease
+
+    Returns:
+        The finished job, or None if the job was recovered by another worker
+        or cancelled meanwhile
+    """
+    finished = db.session.execute(
+        update(Job)
+        .where(
+            Job.id == job_id,
+            Job.status == JobStatus.RUNNING,
+            Job.lease_owner == owner,
+        )
+        .values(
+            completed_at=datetime.utcnow(),
+            lease_owner=None,
+            lease_expires_at=None,
+            **values,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if finished != 1:
+        return None
+    return db.session.get(Job, job_id)
+
 
 def _get_partial_subdeaddit_result() -> dict[str, Any]:
     """Get partial results for failed subdeaddit creation job."""
@@ -253,46 +733,295 @@ def _get_partial_comment_result() -> dict[str, Any]:
     return {"comments": [], "count": 0, "api_requests": api_requests, "partial": True}
 
 
+def _stage_job_progress(progress: int) -> None:
+    """
+    Store the progress of the running job in the current transaction.
+
+    Called right before an item is ingested, so the ingest commits the item
+    and the progress past it together: a job resumed after its worker was lost
+    neither repeats nor skips the item. If the ingest fails, both roll back.
+    """
+    if not hasattr(_thread_local, "job_id"):
+        return
+
+    db.session.execute(
+        update(Job)
+        .where(
+            Job.id == _thread_local.job_id,
+            Job.status == JobStatus.RUNNING,
+            or_(Job.progress.is_(None), Job.progress < progress),
+        )
+        .values(progress=progress)
+        .execution_options(synchronize_session=False)
+    )
+
+
 def _update_job_progress(progress: int):
-    """Update job progress in database (thread-safe)."""
+    """
+    Record job progress, written and emitted in batches (thread-safe).
+
+    Progress stays in memory until the next flush, see _flush_job_updates.
+    Resumable progress is stored with each item, see _stage_job_progress.
+    """
     if not hasattr(_thread_local, "job_id"):
         return
 
-    try:
-        job = db.session.get(Job, _thread_local.job_id)
-        if job:
-            job.progress = progress
-            db.session.commit()
+    # Stop before the next item once another worker may have taken the job
+    lease_lost = getattr(_thread_local, "lease_lost", None)
+    if lease_lost is not None and lease_lost.is_set():
+        raise LeaseLostError(f"Job {_thread_local.job_id} lost its lease")
 
-            # Emit real-time progress update via WebSocket
-            _emit_job_update(job)
-    except Exception as e:
-        logger.warning(f"Could not update job progress: {e}")
+    job_id = _thread_local.job_id
+    with _job_updates_lock:
+        _pending_progress[job_id] = progress
+        payload = _job_payloads.get(job_id)
+        if payload is not None:
+            payload = {**payload, "progress": progress}
+            _job_payloads[job_id] = payload
+            _pending_updates[job_id] = payload
+
+        # Flush early once a job got far ahead of its stored progress
+        if progress - _flushed_progress.get(job_id, 0) >= PROGRESS_FLUSH_ITEMS:
+            _flush_requested.set()
+
+    _start_job_updates_flusher()
+
+
+def _job_update_payload(job: Job) -> dict[str, Any]:
+    """Get the fields of a job sent in "job_updates" frames."""
+    job_data = job.to_dict()
+    return {
+        "job_id": job.id,
+        "status": job.status.value,
+        "progress": job.progress,
+        "total_items": job.total_items,
+        "error_message": job.error_message,
+        "completed_at": job_data["completed_at"],
+        "started_at": job_data["started_at"],
+    }
 
 
 def _emit_job_update(job: Job):
-    """Emit job update via WebSocket."""
-    try:
-        from deaddit import socketio
+    """
+    Queue a job update for the WebSocket.
+
+    Updates of finished jobs are flushed right away, along with the pending
+    updates of other jobs.
+    """
+    payload = _job_update_payload(job)
+
+    finished = job.status != JobStatus.RUNNING
+    with _job_updates_lock:
+        _pending_updates[job.id] = payload
+        if finished:
+            # The final row was just committed, drop progress not written yet
+            _job_payloads.pop(job.id, None)
+            _pending_progress.pop(job.id, None)
+            _flushed_progress.pop(job.id, None)
+        else:
+            _job_payloads[job.id] = payload
 
-        job_data = job.to_dict()
-        socketio.emit(
-            "job_update",
-            {
-                "job_id": job.id,
-                "status": job.status.value,
-                "progress": job.progress,
-                "total_items": job.total_items,
-                "error_message": job.error_message,
-                "completed_at": job_data["completed_at"],
-                "started_at": job_data["started_at"],
-            },
-            namespace="/admin",
+    if finished:
+        _flush_job_updates()
+    else:
+        _start_job_updates_flusher()
+
+
+def _flush_job_updates() -> None:
+    """
+    Write pending progress with one statement and emit pending updates in
+    one "job_updates" frame.
+
+    Must run inside an app context.
+    """
+    with _job_updates_lock:
+        progress = _pending_progress.copy()
+        updates = list(_pending_updates.values())
+        _pending_progress.clear()
+        _pending_updates.clear()
+        _flushed_progress.update(progress)
+
+    if progress:
+        try:
+            # Only running jobs, a finished job already stored its final progress,
+            # and never backwards past progress stored with an item
+            db.session.execute(
+                update(Job.__table__)
+                .where(
+                    Job.__table__.c.id == bindparam("job_id"),
+                    Job.__table__.c.status == JobStatus.RUNNING,
+                    or_(
+                        Job.__table__.c.progress.is_(None),
+                        Job.__table__.c.progress < bindparam("job_progress"),
+                    ),
+                )
+                .values(progress=bindparam("job_progress")),
+                [
+                    {"job_id": job_id, "job_progress": value}
+                    for job_id, value in progress.items()
+                ],
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not update job progress: {e}")
+
+    # Worker processes have no WebSocket clients, the web process relays
+    # their progress from the Job table, see _relay_worker_job_updates
+    if updates and not os.environ.get(WORKER_PROCESS_ENV):
+        try:
+            from deaddit import socketio
+
+            socketio.emit("job_updates", {"updates": updates}, namespace="/admin")
+            logger.debug(f"Emitted {len(updates)} job updates")
+        except Exception as e:
+            logger.warning(f"Could not emit job updates: {e}")
+
+
+def _relays_worker_updates() -> bool:
+    """Check whether this is the web process while jobs run in workers."""
+    return _runs_in_workers() and not os.environ.get(WORKER_PROCESS_ENV)
+
+
+def _relay_worker_job_updates() -> None:
+    """
+    Queue updates for the jobs worker processes changed since the last relay.
+
+    Reads the running jobs, and the jobs that finished recently, from the Job
+    table, and queues the updates that differ from the ones relayed before.
+    Only called from the flusher thread. Must run inside an app context.
+    """
+    global _relayed_payloads, _relayed_since
+
+    now = datetime.utcnow()
+    # Jobs seen running may have finished, or gone back to the queue
+    running_ids = [
+        job_id
+        for job_id, payload in _relayed_payloads.items()
+        if payload["status"] == JobStatus.RUNNING.value
+    ]
+    conditions = [Job.status == JobStatus.RUNNING, Job.id.in_(running_ids)]
+    if _relayed_since is not None:
+        conditions.append(Job.completed_at >= _relayed_since)
+
+    payloads = {
+        job.id: _job_update_payload(job) for job in Job.query.filter(or_(*conditions))
+    }
+    updates = [
+        payload
+        for job_id, payload in payloads.items()
+        if _relayed_payloads.get(job_id) != payload
+    ]
+    _relayed_payloads = payloads
+    _relayed_since = now - timedelta(seconds=JOB_RELAY_OVERLAP_SECONDS)
+
+    if updates:
+        with _job_updates_lock:
+            for payload in updates:
+                _pending_updates[payload["job_id"]] = payload
+
+
+def start_job_updates_relay() -> None:
+    """
+    Start relaying the progress of worker processes to WebSocket clients.
+
+    Does nothing unless jobs run in worker processes, jobs of the web process
+    emit their own updates.
+    """
+    if _relays_worker_updates():
+        _start_job_updates_flusher()
+
+
+def _start_job_updates_flusher() -> None:
+    """Start the thread flushing job updates, once per process."""
+    global _job_updates_flusher
+
+    with _job_updates_lock:
+        if _job_updates_flusher is not None and _job_updates_flusher.is_alive():
+            return
+        _job_updates_flusher = threading.Thread(
+            target=_run_job_updates_flusher, name="job-updates-flusher", daemon=True
         )
+        _job_updates_flusher.start()
+
+
+def _run_job_updates_flusher() -> None:
+    """
+    Flush job updates every PROGRESS_FLUSH_SECONDS, or when asked to.
 
-        logger.debug(f"Emitted job update for job {job.id}")
-    except Exception as e:
-        logger.warning(f"Could not emit job update: {e}")
+    In the web process of worker mode, the updates of worker processes are
+    relayed first.
+    """
+    from deaddit import app
+
+    while True:
+        _flush_requested.wait(PROGRESS_FLUSH_SECONDS)
+        _flush_requested.clear()
+        with app.app_context():
+            if _relays_worker_updates():
+                _relay_worker_job_updates()
+            _flush_job_updates()
+
+
+def _get_job_concurrency(params: dict[str, Any]) -> int:
+    """Get the number of items a job may generate at once."""
+    try:
+        concurrency = int(params.get("concurrency", 1))
+    except (TypeError, ValueError):
+        concurrency = 1
+    return min(max(concurrency, 1), MAX_JOB_CONCURRENCY)
+
+
+def _generate_ahead(
+    generate: Callable[[], dict[str, Any]], count: int, concurrency: int
+) -> Iterator[Callable[[], dict[str, Any]]]:
+    """
+    Run generation calls ahead of the caller on a bounded worker pool.
+
+    Yields one callable per item, in order. Calling it returns the generated
+    data or raises the generation error, so the caller can ingest results in
+    order while up to `concurrency` LLM requests are in flight. With a
+    concurrency of 1 nothing runs ahead and each callable generates inline.
+
+    Args:
+        generate: Function generating the data of one item, it needs an app
+            context
+        count: Number of items to generate
+        concurrency: Maximum number of items generated at once
+
+    Yields:
+        Callables returning the generated data of each item
+    """
+    if concurrency <= 1:
+        for _ in range(count):
+            yield generate
+        return
+
+    from deaddit import app
+
+    def generate_in_context():
+        # Each worker gets its own app context and database session
+        with app.app_context():
+            return generate()
+
+    pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="job-generate"
+    )
+    try:
+        # Keep at most `concurrency` items in flight, so "wait" still spaces
+        # out requests and an abandoned job does not leave a backlog behind
+        pending = deque(
+            pool.submit(generate_in_context) for _ in range(min(concurrency, count))
+        )
+        submitted = len(pending)
+        while pending:
+            future = pending.popleft()
+            yield future.result
+            if submitted < count:
+                pending.append(pool.submit(generate_in_context))
+                submitted += 1
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 def _execute_create_subdeaddit(job: Job) -> dict[str, Any]:
@@ -310,7 +1039,7 @@ def _execute_create_subdeaddit(job: Job) -> dict[str, Any]:
 
     failed_attempts = []
 
-    for i in range(count):
+    for i in range(_first_item(job), count):
         # Update progress
         _update_job_progress(i)
 
@@ -338,25 +1067,14 @@ def _execute_create_subdeaddit(job: Job) -> dict[str, Any]:
                     k: v for k, v in subdeaddit_data.items() if not k.startswith("_")
                 }
 
-                # Ingest the subdeaddit via API (format: {"subdeaddits": [data]})
-                ingest_payload = {"subdeaddits": [clean_subdeaddit_data]}
-                response = requests.post(
-                    f"{get_api_base_url()}/api/ingest",
-                    json=ingest_payload,
-                    headers=get_api_headers(),
-                    timeout=60,
-                )
+                # Ingest the subdeaddit in-process (format: {"subdeaddits": [data]})
+                _stage_job_progress(i + 1)
+                ingest_content({"subdeaddits": [clean_subdeaddit_data]})
 
-                if response.status_code in [200, 201]:
-                    response.json()
-                    subdeaddit_name = clean_subdeaddit_data.get("name", "unknown")
-                    results.append(subdeaddit_name)
-                    logger.info(f"Created subdeaddit: {subdeaddit_name}")
-                    success = True
-                else:
-                    error_msg = f"Failed to ingest subdeaddit (HTTP {response.status_code}): {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
+                subdeaddit_name = clean_subdeaddit_data.get("name", "unknown")
+                results.append(subdeaddit_name)
+                logger.info(f"Created subdeaddit: {subdeaddit_name}")
+                success = True
 
             except Exception as e:
                 retry_count += 1
@@ -419,7 +1137,7 @@ def _execute_create_user(job: Job) -> dict[str, Any]:
 
     failed_attempts = []
 
-    for i in range(count):
+    for i in range(_first_item(job), count):
         # Update progress
         _update_job_progress(i)
 
@@ -447,23 +1165,13 @@ def _execute_create_user(job: Job) -> dict[str, Any]:
                     k: v for k, v in user_data.items() if not k.startswith("_")
                 }
 
-                # Ingest the user via API
-                response = requests.post(
-                    f"{get_api_base_url()}/api/ingest/user",
-                    json=clean_user_data,
-                    headers=get_api_headers(),
-                    timeout=60,
-                )
+                # Ingest the user in-process
+                _stage_job_progress(i + 1)
+                user = ingest_user_data(clean_user_data)
 
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    results.append(result.get("username"))
-                    logger.info(f"Created user: {result.get('username', 'unknown')}")
-                    success = True
-                else:
-                    error_msg = f"Failed to ingest user (HTTP {response.status_code}): {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
+                results.append(user.username)
+                logger.info(f"Created user: {user.username}")
+                success = True
 
             except Exception as e:
                 retry_count += 1
@@ -595,10 +1303,32 @@ def _generate_user_data(model: str = None) -> dict[str, Any]:
     return user_data or {}
 
 
+def _get_endpoint_semaphore(api_url: str) -> threading.BoundedSemaphore:
+    """Get the semaphore bounding concurrent requests to an LLM endpoint."""
+    key = Config._endpoint_to_key(api_url)
+    limit = Config.get_concurrency_for_endpoint(api_url)
+
+    with _endpoint_semaphores_lock:
+        entry = _endpoint_semaphores.get(key)
+        if entry is None or entry[0] != limit:
+            # A new limit applies to new requests, running ones finish as they are
+            entry = (limit, threading.BoundedSemaphore(limit))
+            _endpoint_semaphores[key] = entry
+    return entry[1]
+
+
 def _send_openai_request(
-    system_prompt: str, prompt: str, model: str = None
+    system_prompt: str,
+    prompt: str,
+    model: str = None,
+    prompt_prefix: Optional[str] = None,
 ) -> tuple[str, str]:
-    """Send request to OpenAI API."""
+    """
+    Send request to OpenAI API.
+
+    prompt_prefix is the start of the system prompt shared across authors,
+    see deaddit.prompt_cache. It defaults to the whole system prompt.
+    """
     import random
 
     OPENAI_API_URL = Config.get("OPENAI_API_URL", "http://localhost/v1")
@@ -644,131 +1374,82 @@ def _send_openai_request(
         "max_tokens": 2048,
         "stop": stop_values,
     }
+    payload = apply_cache_hints(payload, prompt_prefix)
 
-    response = requests.post(
-        f"{OPENAI_API_URL}/chat/completions",
-        json=payload,
-        headers=headers,
-        timeout=120,
-    )
+    # Stay within the concurrency limit of the endpoint across all jobs
+    try:
+        with _get_endpoint_semaphore(OPENAI_API_URL):
+            response_data = chat_completion(OPENAI_API_URL, payload, headers)
+    except CompletionError as e:
+        error_msg = f"OpenAI API request failed: {e}"
+        logger.error(error_msg)
+        raise Exception(error_msg) from e
 
-    if response.status_code == 200:
-        response_data = response.json()
-        logger.debug(f"API Response: {response_data}")
-
-        # Handle different response formats
-        if "choices" in response_data and len(response_data["choices"]) > 0:
-            choice = response_data["choices"][0]
-            message = choice.get("message", {})
-            content = message.get("content", "")
-
-            # Some models (like DeepSeek R1) put content in reasoning field
-            if not content and "reasoning" in message:
-                content = message["reasoning"]
-                logger.info("Using reasoning field as content (DeepSeek R1 model)")
-
-        elif "content" in response_data:
-            content = response_data["content"]
-        elif "response" in response_data:
-            content = response_data["response"]
-        else:
-            error_msg = f"Unexpected API response format: {response_data}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+    logger.debug(f"API Response: {response_data}")
+    record_usage(
+        selected_model, prompt_prefix or system_prompt, response_data.get("usage")
+    )
 
-        return content, selected_model
+    # Handle different response formats
+    if "choices" in response_data and len(response_data["choices"]) > 0:
+        choice = response_data["choices"][0]
+        message = choice.get("message", {})
+        content = message.get("content", "")
+
+        # Some models (like DeepSeek R1) put content in reasoning field
+        if not content and "reasoning" in message:
+            content = message["reasoning"]
+            logger.info("Using reasoning field as content (DeepSeek R1 model)")
+
+    elif "content" in response_data:
+        content = response_data["content"]
+    elif "response" in response_data:
+        content = response_data["response"]
     else:
-        error_msg = (
-            f"OpenAI API request failed: {response.status_code} - {response.text}"
-        )
+        error_msg = f"Unexpected API response format: {response_data}"
         logger.error(error_msg)
         raise Exception(error_msg)
 
+    return content, selected_model
+
 
 def _parse_json_response(response: str, content_type: str) -> dict[str, Any]:
     """Parse JSON response from OpenAI API."""
-    import json
     import re
 
-    # Clean up the response
-    response = response.strip()
-
-    # Remove <think> and </think> tags from AI responses (case-insensitive)
-    response = re.sub(
-        r"<think>.*?</think>", "", response, flags=re.DOTALL | re.IGNORECASE
-    )
-    response = response.strip()
-
-    # Try to extract JSON from markdown code blocks first
-    json_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response, re.DOTALL)
-    if json_match:
-        response = json_match.group(1)
-    else:
-        # Find the first complete JSON object in the response
-        start_idx = response.find("{")
-        if start_idx != -1:
-            brace_count = 0
-            end_idx = start_idx
-
-            for i in range(start_idx, len(response)):
-                if response[i] == "{":
-                    brace_count += 1
-                elif response[i] == "}":
-                    brace_count -= 1
-                    if brace_count == 0:
-                        end_idx = i + 1
-                        break
+    data = extract_json_object(response)
+    if data is not None:
+        return data
 
-            if brace_count == 0:
-                response = response[start_idx:end_idx]
-            else:
-                # If braces don't match, try to add missing closing braces
-                response = response[start_idx:]
-                missing_braces = brace_count
-                if missing_braces > 0:
-                    response += "}" * missing_braces
-                    logger.warning(
-                        f"Added {missing_braces} missing closing brace(s) to JSON"
-                    )
-
-    # Try to fix trailing commas and other issues
-    response = re.sub(r",\s*}", "}", response)  # Remove trailing commas before }
-    response = re.sub(r",\s*]", "]", response)  # Remove trailing commas before ]
+    logger.error(f"Failed to parse JSON response for {content_type}")
+    logger.debug(f"Raw response: {response}")
 
+    # Try to extract at least the name and description with regex
     try:
-        return json.loads(response)
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON response for {content_type}: {e}")
-        logger.debug(f"Raw response: {response}")
-
-        # Try to extract at least the name and description with regex
-        try:
-            name_match = re.search(r'"name":\s*"([^"]+)"', response)
-            desc_match = re.search(r'"description":\s*"([^"]+(?:\\.[^"]*)*)"', response)
-            post_types_match = re.search(r'"post_types":\s*\[([^\]]+)\]', response)
-
-            if name_match and desc_match:
-                result = {
-                    "name": name_match.group(1),
-                    "description": desc_match.group(1)
-                    .replace('\\"', '"')
-                    .replace("\\n", "\n"),
-                }
+        name_match = re.search(r'"name":\s*"([^"]+)"', response)
+        desc_match = re.search(r'"description":\s*"([^"]+(?:\\.[^"]*)*)"', response)
+        post_types_match = re.search(r'"post_types":\s*\[([^\]]+)\]', response)
+
+        if name_match and desc_match:
+            result = {
+                "name": name_match.group(1),
+                "description": desc_match.group(1)
+                .replace('\\"', '"')
+                .replace("\\n", "\n"),
+            }
 
-                if post_types_match:
-                    # Parse post types array
-                    post_types_str = post_types_match.group(1)
-                    post_types = [
-                        pt.strip().strip('"') for pt in post_types_str.split(",")
-                    ]
-                    result["post_types"] = post_types
+            if post_types_match:
+                # Parse post types array
+                post_types_str = post_types_match.group(1)
+                post_types = [pt.strip().strip('"') for pt in post_types_str.split(",")]
+                result["post_types"] = post_types
 
-                logger.info(f"Extracted {content_type} data using regex fallback")
-                return result
-        except Exception as regex_error:
-            logger.error(f"Regex fallback also failed: {regex_error}")
+            logger.info(f"Extracted {content_type} data using regex fallback")
+            return result
+    except Exception as regex_error:
+        logger.error(f"Regex fallback also failed: {regex_error}")
 
-        return {}
+    return {}
 
 
 def _generate_subdeaddit_data(model: str = None) -> dict[str, Any]:
@@ -816,52 +1497,87 @@ def _generate_subdeaddit_data(model: str = None) -> dict[str, Any]:
     return subdeaddit_data or {}
 
 
+_POST_INSTRUCTIONS = """You write posts for an online community as the person described below.
+
+The post should:
+- Be authentic to your personality and interests
+- Fit the community theme and the requested post type
+- Include a compelling title (max 200 characters)
+- Have engaging content (2-4 paragraphs)
+- Feel natural and realistic
+- Use your writing style
+- Use \\n for line breaks to separate paragraphs and create proper formatting
+- Structure your content with paragraph breaks for better readability
+
+Generate realistic upvote count (typically 5-150 for most posts, rarely higher).
+
+IMPORTANT: Do NOT include user, subdeaddit, or post_type fields in your response - these will be set automatically.
+
+Provide your response as JSON:
+```json
+{
+    "title": "Your post title",
+    "content": "Your first paragraph...\\n\\nSecond paragraph with more details...\\n\\nOptional third paragraph if needed.",
+    "upvote_count": 42
+}
+```"""
+
+_COMMENT_INSTRUCTIONS = """You write comments in an online community as the person described below.
+
+Write a comment that:
+- Reflects your personality and writing style
+- Is relevant to the post content, and to the comment you reply to if any
+- Feels natural and authentic
+- Is 1-3 sentences (keep it concise)
+- Fits the community tone
+- Use \\n for line breaks when you want to separate paragraphs or create emphasis
+- Feel free to use multiple paragraphs if it helps express your thoughts clearly
+
+Generate a realistic upvote count for your comment (typically 1-50, sometimes negative).
+
+IMPORTANT: Do NOT include user, post_id, or parent_id fields in your response - these will be set automatically.
+
+Provide your response as JSON:
+```json
+{
+    "content": "Your comment content...\\n\\nSecond paragraph if needed.",
+    "upvote_count": 12
+}
+```"""
+
+
+def _persona_prompt(author) -> str:
+    """Describe the author of generated content to the model."""
+    interests = ", ".join(
+        author.get_interests() if hasattr(author, "get_interests") else []
+    )
+    return f"""You are {author.username}, a {author.age}-year-old {author.gender.lower()} who works as a {author.occupation}.
+
+Your personality: {author.bio}
+Your writing style: {author.writing_style}
+Your interests: {interests}"""
+
+
 def _generate_post_data(
     subdeaddit_name: str = None, model: str = None
 ) -> dict[str, Any]:
     """Generate post data using OpenAI API."""
     import random
 
+    from deaddit.authors import invalidate_author_index, select_author
     from deaddit.models import Subdeaddit, User
 
-    # Get users for weighted selection
-    users = User.query.all()  # Get all users instead of limiting to 10
-    if not users:
+    # Pick the author, favoring users with fewer posts and comments. The
+    # strategy can be configured via the USER_SELECTION_STRATEGY setting, see
+    # deaddit.authors.select_author
+    username = select_author()
+    if username is None:
         raise Exception("No users available to create posts")
-
-    # Convert User objects to dictionaries for the weighted selection function
-    user_dicts = []
-    for user in users:
-        user_dicts.append({
-            "username": user.username,
-            "age": user.age,
-            "gender": user.gender,
-            "occupation": user.occupation,
-            "education": user.education,
-            "bio": user.bio,
-            "writing_style": user.writing_style,
-            "interests": user.get_interests() if hasattr(user, "get_interests") else [],
-            "personality_traits": user.get_personality_traits() if hasattr(user, "get_personality_traits") else [],
-        })
-
-    # Use weighted selection to favor users with less activity
-    # Strategy can be configured via USER_SELECTION_STRATEGY config setting:
-    # "weighted" (default) - favors users with fewer posts/comments
-    # "round_robin" - always picks user with lowest activity count
-    # "improved_random" - better randomness with history avoidance
-    from .loader import select_user_smart
-    selected_user_dict = select_user_smart(user_dicts, strategy="weighted")
-    
-    if not selected_user_dict:
-        # Fallback to random selection if weighted selection fails
-        logger.warning("Weighted user selection failed, falling back to random selection")
-        author = random.choice(users)
-    else:
-        # Find the actual User object that matches the selected username
-        author = next((u for u in users if u.username == selected_user_dict["username"]), None)
-        if not author:
-            logger.warning(f"Could not find user object for {selected_user_dict['username']}, falling back to random")
-            author = random.choice(users)
+    author = db.session.get(User, username)
+    if author is None:
+        # Deleted since the author index was loaded
+        invalidate_author_index()
+        raise Exception(f"User {username} no longer exists")
 
     # Get subdeaddit info
     if subdeaddit_name:
@@ -883,43 +1599,22 @@ def _generate_post_data(
     )
     selected_post_type = random.choice(post_types) if post_types else "discussion"
 
-    system_prompt = f"""You are {author.username}, a {author.age}-year-old {author.gender.lower()} who works as a {author.occupation}.
-
-Your personality: {author.bio}
-Your writing style: {author.writing_style}
-Your interests: {", ".join(author.get_interests() if hasattr(author, "get_interests") else [])}
+    # Static instructions come first, then the community and the persona, and
+    # the post type last, so requests share the longest possible prefix, see
+    # deaddit.prompt_cache
+    prompt_prefix = f"""{_POST_INSTRUCTIONS}
 
 You are creating a post for the /r/{subdeaddit.name} community, which is about: {subdeaddit.description}"""
+    system_prompt = f"{prompt_prefix}\n\n{_persona_prompt(author)}"
 
-    prompt = f"""Create a {selected_post_type} post for /r/{subdeaddit.name}.
-
-The post should:
-- Be authentic to your personality and interests
-- Fit the community theme and typical post type ({selected_post_type})
-- Include a compelling title (max 200 characters)
-- Have engaging content (2-4 paragraphs)
-- Feel natural and realistic
-- Use your writing style
-- Use \\n for line breaks to separate paragraphs and create proper formatting
-- Structure your content with paragraph breaks for better readability
-
-Generate realistic upvote count (typically 5-150 for most posts, rarely higher).
-
-IMPORTANT: Do NOT include user, subdeaddit, or post_type fields in your response - these will be set automatically.
-
-Provide your response as JSON:
-```json
-{{
-    "title": "Your post title",
-    "content": "Your first paragraph...\\n\\nSecond paragraph with more details...\\n\\nOptional third paragraph if needed.",
-    "upvote_count": 42
-}}
-```
+    prompt = f"""Create a {selected_post_type} post for /r/{subdeaddit.name}, typical of this post type.
 
 Create the post now."""
 
     # Make OpenAI API request
-    api_response, used_model = _send_openai_request(system_prompt, prompt, model)
+    api_response, used_model = _send_openai_request(
+        system_prompt, prompt, model, prompt_prefix
+    )
     post_data = _parse_json_response(api_response, "post")
 
     # Ensure we have a valid dictionary and required fields are always set correctly
@@ -958,46 +1653,20 @@ def _generate_comment_data(
 
     from loguru import logger
 
-    from deaddit.models import Post, Subdeaddit, User
+    from deaddit.authors import invalidate_author_index, select_author
+    from deaddit.models import Comment, Post, Subdeaddit, User
 
-    # Get users for weighted selection
-    users = User.query.all()  # Get all users instead of limiting to 10
-    if not users:
+    # Pick the author, favoring users with fewer posts and comments. The
+    # strategy can be configured via the USER_SELECTION_STRATEGY setting, see
+    # deaddit.authors.select_author
+    username = select_author()
+    if username is None:
         raise Exception("No users available to create comments")
-
-    # Convert User objects to dictionaries for the weighted selection function
-    user_dicts = []
-    for user in users:
-        user_dicts.append({
-            "username": user.username,
-            "age": user.age,
-            "gender": user.gender,
-            "occupation": user.occupation,
-            "education": user.education,
-            "bio": user.bio,
-            "writing_style": user.writing_style,
-            "interests": user.get_interests() if hasattr(user, "get_interests") else [],
-            "personality_traits": user.get_personality_traits() if hasattr(user, "get_personality_traits") else [],
-        })
-
-    # Use weighted selection to favor users with less activity
-    # Strategy can be configured via USER_SELECTION_STRATEGY config setting:
-    # "weighted" (default) - favors users with fewer posts/comments
-    # "round_robin" - always picks user with lowest activity count
-    # "improved_random" - better randomness with history avoidance
-    from .loader import select_user_smart
-    selected_user_dict = select_user_smart(user_dicts, strategy="weighted")
-    
-    if not selected_user_dict:
-        # Fallback to random selection if weighted selection fails
-        logger.warning("Weighted user selection failed, falling back to random selection")
-        author = random.choice(users)
-    else:
-        # Find the actual User object that matches the selected username
-        author = next((u for u in users if u.username == selected_user_dict["username"]), None)
-        if not author:
-            logger.warning(f"Could not find user object for {selected_user_dict['username']}, falling back to random")
-            author = random.choice(users)
+    author = db.session.get(User, username)
+    if author is None:
+        # Deleted since the author index was loaded
+        invalidate_author_index()
+        raise Exception(f"User {username} no longer exists")
 
     # Get post to comment on
     if post_id:
@@ -1019,41 +1688,16 @@ def _generate_comment_data(
         post = random.choice(posts)
 
     # Determine if this should be a reply (30% chance, same as CLI loader)
-    # Use API to get existing comments to ensure proper context
-    import requests
-
-    try:
-        response = requests.get(
-            f"{get_api_base_url()}/api/post/{post.id}",
-            headers=get_api_headers(),
-            timeout=30,
-        )
-        if response.status_code == 200:
-            post_data = response.json()
-
-            # Flatten comment tree to get all comments
-            def flatten_comments(comments):
-                all_comments = []
-                for comment in comments:
-                    all_comments.append(comment)
-                    if comment.get("replies"):
-                        all_comments.extend(flatten_comments(comment["replies"]))
-                return all_comments
-
-            existing_comments = flatten_comments(post_data.get("comments", []))
-            logger.info(
-                f"Checking for replies: Found {len(existing_comments)} existing comments for post {post.id}"
-            )
-        else:
-            logger.warning(
-                f"Failed to fetch comments for post {post.id}, creating top-level comment"
-            )
-            existing_comments = []
-    except Exception as e:
-        logger.warning(
-            f"Error fetching comments for post {post.id}: {e}, creating top-level comment"
-        )
-        existing_comments = []
+    # Read the existing comments directly to ensure proper context
+    existing_comments = [
+        {"id": comment_id, "user": user, "content": content}
+        for comment_id, user, content in db.session.query(
+            Comment.id, Comment.user, Comment.content
+        ).filter(Comment.post_id == post.id)
+    ]
+    logger.info(
+        f"Checking for replies: Found {len(existing_comments)} existing comments for post {post.id}"
+    )
 
     parent_id = None
 
@@ -1070,13 +1714,13 @@ def _generate_comment_data(
             f"Creating top-level comment (no parent selected, {len(existing_comments)} comments available)"
         )
 
-    system_prompt = f"""You are {author.username}, a {author.age}-year-old {author.gender.lower()} who works as a {author.occupation}.
-
-Your personality: {author.bio}
-Your writing style: {author.writing_style}
-Your interests: {", ".join(author.get_interests() if hasattr(author, "get_interests") else [])}
+    # Static instructions come first, then the community and the persona, and
+    # the thread last, so requests share the longest possible prefix, see
+    # deaddit.prompt_cache
+    prompt_prefix = f"""{_COMMENT_INSTRUCTIONS}
 
 You are commenting on a post in /r/{post.subdeaddit.name}."""
+    system_prompt = f"{prompt_prefix}\n\n{_persona_prompt(author)}"
 
     # Prepare the prompt based on whether this is a reply or top-level comment
     if parent_id:
@@ -1099,61 +1743,19 @@ You are commenting on a post in /r/{post.subdeaddit.name}."""
 You're replying to this comment by {parent_comment_data.get("user", "unknown")}:
 "{parent_comment_data.get("content", "")}"
 
-Write a reply that:
-- Reflects your personality and writing style
-- Responds to the specific comment above
-- Feels natural and authentic
-- Is 1-3 sentences (keep it concise)
-- Fits the community tone
-- Use \\n for line breaks when you want to separate paragraphs or create emphasis
-- Feel free to use multiple paragraphs if it helps express your thoughts clearly
-
-Generate a realistic upvote count for your reply (typically 1-50, sometimes negative).
-
-Provide your response as JSON:
-```json
-{{
-    "content": "Your reply content...\\n\\nSecond paragraph if needed.",
-    "upvote_count": 12,
-    "user": "{author.username}",
-    "post_id": {post.id},
-    "parent_id": {parent_id}
-}}
-```
-
-Write your reply now."""
+Respond to the specific comment above. Write your reply now."""
     else:
         # Create top-level comment prompt
         prompt = f"""You're reading this post titled "{post.title}" in /r/{post.subdeaddit.name}:
 
 {post.content}
 
-Write a comment response that:
-- Reflects your personality and writing style
-- Is relevant to the post content
-- Feels natural and authentic
-- Is 1-3 sentences (keep it concise)
-- Fits the community tone
-- Use \\n for line breaks when you want to separate paragraphs or create emphasis
-- Feel free to use multiple paragraphs if it helps express your thoughts clearly
-
-Generate a realistic upvote count for your comment (typically 1-50, sometimes negative).
-
-Provide your response as JSON:
-```json
-{{
-    "content": "Your comment content...\\n\\nSecond paragraph if needed.",
-    "upvote_count": 12,
-    "user": "{author.username}",
-    "post_id": {post.id},
-    "parent_id": null
-}}
-```
-
 Write your comment now."""
 
     # Make OpenAI API request
-    api_response, used_model = _send_openai_request(system_prompt, prompt, model)
+    api_response, used_model = _send_openai_request(
+        system_prompt, prompt, model, prompt_prefix
+    )
     comment_data = _parse_json_response(api_response, "comment")
 
     if comment_data:
@@ -1184,6 +1786,7 @@ def _queue_comment_jobs_for_post(
     model: str = None,
     priority: int = 5,
     wait: int = 0,
+    concurrency: int = 1,
 ):
     """Queue comment generation jobs for a newly created post."""
     import random
@@ -1227,6 +1830,7 @@ def _queue_comment_jobs_for_post(
                     "post_id": post_id,
                     "model": model,
                     "wait": wait,
+                    "concurrency": concurrency,
                 },
                 priority=priority,
                 total_items=num_comments,
@@ -1248,6 +1852,7 @@ def _execute_create_post(job: Job) -> dict[str, Any]:
     replies = params.get("replies", "5-10")
     model = params.get("model")
     wait = params.get("wait", 0)
+    concurrency = _get_job_concurrency(params)
 
     results = []
     failed_attempts = []
@@ -1256,89 +1861,86 @@ def _execute_create_post(job: Job) -> dict[str, Any]:
     # Store API requests in thread-local storage for failure recovery
     _thread_local.api_requests = api_requests
 
-    for i in range(count):
-        # Update progress
-        _update_job_progress(i)
-
-        retry_count = 0
-        max_retries = 3
-        success = False
+    # Generate ahead on a worker pool, ingest in order on this thread
+    start = _first_item(job)
+    # Closing the generator shuts down its pool, also when the loop raises
+    with closing(
+        _generate_ahead(
+            lambda: _generate_post_data(subdeaddit, model), count - start, concurrency
+        )
+    ) as generated:
+        for i, first_attempt in enumerate(generated, start=start):
+            # Update progress
+            _update_job_progress(i)
+
+            retry_count = 0
+            max_retries = 3
+            success = False
+
+            while retry_count < max_retries and not success:
+                try:
+                    # Generate post data using OpenAI API, retries generate inline
+                    if retry_count == 0:
+                        post_data = first_attempt()
+                    else:
+                        post_data = _generate_post_data(subdeaddit, model)
 
-        while retry_count < max_retries and not success:
-            try:
-                # Generate post data using OpenAI API
-                post_data = _generate_post_data(subdeaddit, model)
+                    # Store the API request/response for debugging
+                    api_requests.append(
+                        {
+                            "request": post_data.get("_api_request"),
+                            "response": post_data.get("_api_response"),
+                            "model_used": post_data.get("model"),
+                            "retry_attempt": retry_count,
+                        }
+                    )
 
-                # Store the API request/response for debugging
-                api_requests.append(
-                    {
-                        "request": post_data.get("_api_request"),
-                        "response": post_data.get("_api_response"),
-                        "model_used": post_data.get("model"),
-                        "retry_attempt": retry_count,
+                    # Remove internal fields before ingesting
+                    clean_post_data = {
+                        k: v for k, v in post_data.items() if not k.startswith("_")
                     }
-                )
-
-                # Remove internal fields before ingesting
-                clean_post_data = {
-                    k: v for k, v in post_data.items() if not k.startswith("_")
-                }
 
-                # Ingest the post via API (format: {"posts": [data]})
-                ingest_payload = {"posts": [clean_post_data]}
-                response = requests.post(
-                    f"{get_api_base_url()}/api/ingest",
-                    json=ingest_payload,
-                    headers=get_api_headers(),
-                    timeout=60,
-                )
+                    # Ingest the post in-process (format: {"posts": [data]})
+                    _stage_job_progress(i + 1)
+                    result = ingest_content({"posts": [clean_post_data]})
 
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    # Extract post ID from API response
-                    if "posts" in result and result["posts"]:
-                        post_id = result["posts"][0]["id"]
-                        results.append(post_id)
-                        post_title = clean_post_data.get("title", "unknown")
-                        logger.info(f"Created post {post_id}: {post_title}")
-                    else:
-                        # Fallback - store title if no ID available
-                        post_title = clean_post_data.get("title", "unknown")
-                        results.append(post_title)
-                        logger.info(f"Created post: {post_title}")
+                    post_id = result["posts"][0]["id"]
+                    results.append(post_id)
+                    post_title = clean_post_data.get("title", "unknown")
+                    logger.info(f"Created post {post_id}: {post_title}")
 
                     # Queue comment generation jobs if replies are specified
                     if replies and replies.strip():
                         _queue_comment_jobs_for_post(
-                            result, replies, model, job.priority, wait
+                            result, replies, model, job.priority, wait, concurrency
                         )
 
                     success = True
-                else:
-                    error_msg = f"Failed to ingest post (HTTP {response.status_code}): {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
-
-            except Exception as e:
-                retry_count += 1
-                error_msg = f"Failed to create post {i + 1} (attempt {retry_count}/{max_retries}): {str(e)}"
-                logger.warning(error_msg)
 
-                if retry_count >= max_retries:
-                    failed_attempts.append(
-                        {"post_index": i + 1, "error": str(e), "attempts": retry_count}
-                    )
-                    logger.error(
-                        f"Post {i + 1} failed after {max_retries} attempts: {str(e)}"
-                    )
-                    break
-                else:
-                    # Wait a bit before retrying
-                    time.sleep(2)
+                except Exception as e:
+                    retry_count += 1
+                    error_msg = f"Failed to create post {i + 1} (attempt {retry_count}/{max_retries}): {str(e)}"
+                    logger.warning(error_msg)
+
+                    if retry_count >= max_retries:
+                        failed_attempts.append(
+                            {
+                                "post_index": i + 1,
+                                "error": str(e),
+                                "attempts": retry_count,
+                            }
+                        )
+                        logger.error(
+                            f"Post {i + 1} failed after {max_retries} attempts: {str(e)}"
+                        )
+                        break
+                    else:
+                        # Wait a bit before retrying
+                        time.sleep(2)
 
-        # Wait between creations if specified
-        if wait > 0 and i < count - 1:
-            time.sleep(wait)
+            # Wait between creations if specified
+            if wait > 0 and i < count - 1:
+                time.sleep(wait)
 
     # If we have some successes but also some failures, log the failures but don't fail the entire job
     if results and failed_attempts:
@@ -1366,6 +1968,7 @@ def _execute_create_comment(job: Job) -> dict[str, Any]:
     subdeaddit = params.get("subdeaddit")
     model = params.get("model")
     wait = params.get("wait", 0)
+    concurrency = _get_job_concurrency(params)
 
     results = []
     failed_attempts = []
@@ -1374,94 +1977,85 @@ def _execute_create_comment(job: Job) -> dict[str, Any]:
     # Store API requests in thread-local storage for failure recovery
     _thread_local.api_requests = api_requests
 
-    for i in range(count):
-        # Update progress
-        _update_job_progress(i)
-
-        retry_count = 0
-        max_retries = 3
-        success = False
+    # Generate ahead on a worker pool, ingest in order on this thread
+    start = _first_item(job)
+    # Closing the generator shuts down its pool, also when the loop raises
+    with closing(
+        _generate_ahead(
+            lambda: _generate_comment_data(post_id, subdeaddit, model),
+            count - start,
+            concurrency,
+        )
+    ) as generated:
+        for i, first_attempt in enumerate(generated, start=start):
+            # Update progress
+            _update_job_progress(i)
+
+            retry_count = 0
+            max_retries = 3
+            success = False
+
+            while retry_count < max_retries and not success:
+                try:
+                    # Generate comment data using OpenAI API, retries generate inline
+                    if retry_count == 0:
+                        comment_data = first_attempt()
+                    else:
+                        comment_data = _generate_comment_data(
+                            post_id, subdeaddit, model
+                        )
 
-        while retry_count < max_retries and not success:
-            try:
-                # Generate comment data using OpenAI API
-                comment_data = _generate_comment_data(post_id, subdeaddit, model)
+                    # Store the API request/response for debugging
+                    api_requests.append(
+                        {
+                            "request": comment_data.get("_api_request"),
+                            "response": comment_data.get("_api_response"),
+                            "model_used": comment_data.get("model"),
+                            "retry_attempt": retry_count,
+                        }
+                    )
 
-                # Store the API request/response for debugging
-                api_requests.append(
-                    {
-                        "request": comment_data.get("_api_request"),
-                        "response": comment_data.get("_api_response"),
-                        "model_used": comment_data.get("model"),
-                        "retry_attempt": retry_count,
+                    # Remove internal fields before ingesting
+                    clean_comment_data = {
+                        k: v for k, v in comment_data.items() if not k.startswith("_")
                     }
-                )
 
-                # Remove internal fields before ingesting
-                clean_comment_data = {
-                    k: v for k, v in comment_data.items() if not k.startswith("_")
-                }
+                    # Ingest the comment in-process (format: {"comments": [data]})
+                    _stage_job_progress(i + 1)
+                    result = ingest_content({"comments": [clean_comment_data]})
 
-                # Ingest the comment via API (format: {"comments": [data]})
-                ingest_payload = {"comments": [clean_comment_data]}
-                response = requests.post(
-                    f"{get_api_base_url()}/api/ingest",
-                    json=ingest_payload,
-                    headers=get_api_headers(),
-                    timeout=60,
-                )
+                    comment_id = result["comments"][0]["id"]
+                    results.append(comment_id)
+                    comment_content = clean_comment_data.get("content", "unknown")[:50]
+                    logger.info(
+                        f"Created comment {comment_id} for post {post_id}: {comment_content}"
+                    )
+                    success = True
 
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    # Extract comment ID from API response
-                    if "comments" in result and result["comments"]:
-                        comment_id = result["comments"][0]["id"]
-                        results.append(comment_id)
-                        comment_content = clean_comment_data.get("content", "unknown")[
-                            :50
-                        ]
-                        logger.info(
-                            f"Created comment {comment_id} for post {post_id}: {comment_content}"
+                except Exception as e:
+                    retry_count += 1
+                    error_msg = f"Failed to create comment {i + 1} (attempt {retry_count}/{max_retries}): {str(e)}"
+                    logger.warning(error_msg)
+
+                    if retry_count >= max_retries:
+                        failed_attempts.append(
+                            {
+                                "comment_index": i + 1,
+                                "error": str(e),
+                                "attempts": retry_count,
+                            }
                         )
-                    else:
-                        # Fallback - store content snippet if no ID available
-                        comment_content = clean_comment_data.get("content", "unknown")[
-                            :50
-                        ]
-                        results.append(comment_content)
-                        logger.info(
-                            f"Created comment for post {post_id}: {comment_content}"
+                        logger.error(
+                            f"Comment {i + 1} failed after {max_retries} attempts: {str(e)}"
                         )
-                    success = True
-                else:
-                    error_msg = f"Failed to ingest comment (HTTP {response.status_code}): {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
-
-            except Exception as e:
-                retry_count += 1
-                error_msg = f"Failed to create comment {i + 1} (attempt {retry_count}/{max_retries}): {str(e)}"
-                logger.warning(error_msg)
-
-                if retry_count >= max_retries:
-                    failed_attempts.append(
-                        {
-                            "comment_index": i + 1,
-                            "error": str(e),
-                            "attempts": retry_count,
-                        }
-                    )
-                    logger.error(
-                        f"Comment {i + 1} failed after {max_retries} attempts: {str(e)}"
-                    )
-                    break
-                else:
-                    # Wait a bit before retrying
-                    time.sleep(2)
+                        break
+                    else:
+                        # Wait a bit before retrying
+                        time.sleep(2)
 
-        # Wait between creations if specified
-        if wait > 0 and i < count - 1:
-            time.sleep(wait)
+            # Wait between creations if specified
+            if wait > 0 and i < count - 1:
+                time.sleep(wait)
 
     # If we have some successes but also some failures, log the failures but don't fail the entire job
     if results and failed_attempts:
@@ -1488,11 +2082,13 @@ def _execute_batch_operation(job: Job) -> dict[str, Any]:
 
     results = []
 
-    for i, operation in enumerate(operations):
+    start = _first_item(job)
+    for i, operation in enumerate(operations[start:], start=start):
         # Update progress
         _update_job_progress(i)
 
-        # Create sub-job for each operation
+        # Create sub-job for each operation, committed with the progress
+        _stage_job_progress(i + 1)
         sub_job = create_job(
             job_type=JobType(operation["type"]),
             parameters=operation["parameters"],
@@ -1569,7 +2165,17 @@ def schedule_recurring_job(
     cron_expression: str,
     job_id: str = None,
 ) -> str:
-    """Schedule a recurring job using cron expression."""
+    """
+    Schedule a recurring job using cron expression.
+
+    Recurring jobs are run by the scheduler of the web process, so they need
+    inline job execution.
+
+    Raises:
+        RuntimeError: If jobs are left to worker processes
+    """
+    if not _scheduler_enabled():
+        raise RuntimeError('Recurring jobs need JOB_EXECUTION set to "inline"')
 
     if not job_id:
         job_id = f"recurring_{job_type.value}_{uuid.uuid4().hex[:8]}"
@@ -1579,10 +2185,14 @@ def schedule_recurring_job(
 
     start_scheduler()
 
+    # Stored in the database, so the arguments must be picklable
     scheduler.add_job(
-        lambda: create_job(job_type, parameters),
+        _create_recurring_job,
         "cron",
+        args=[job_type.value, parameters],
         id=job_id,
+        jobstore="recurring",
+        coalesce=True,
         **_parse_cron_kwargs(cron_expression),
         replace_existing=True,
     )
@@ -1591,6 +2201,14 @@ def schedule_recurring_job(
     return job_id
 
 
+def _create_recurring_job(job_type: str, parameters: dict[str, Any]) -> None:
+    """Scheduler entry point creating one run of a recurring job."""
+    from deaddit import app
+
+    with app.app_context():
+        create_job(JobType(job_type), parameters)
+
+
 def _parse_cron_kwargs(cron_expression: str) -> dict[str, Any]:
     """Parse basic cron expression into APScheduler kwargs."""
     # This is a simplified parser - in production you'd want more robust parsing
@@ -1618,44 +2236,37 @@ def _parse_cron_kwargs(cron_expression: str) -> dict[str, Any]:
 
 
 def restart_pending_jobs():
-    """Restart any jobs that were pending when the app was shut down."""
-    from deaddit.models import Job, JobStatus
-    
+    """
+    Restart the jobs that were queued or running when the app was shut down.
+
+    Running jobs of workers that are gone are put back in the queue once
+    their lease expires, see recover_expired_leases.
+    """
+    recover_expired_leases()
+
+    # Worker processes pick up the queued jobs themselves
+    if not _scheduler_enabled():
+        return
+
+    # Start scheduler if not running, this also loads the recurring jobs
+    start_scheduler()
+
     # Find all pending jobs in the database
     pending_jobs = Job.query.filter_by(status=JobStatus.PENDING).all()
-    
+
     if not pending_jobs:
         logger.info("No pending jobs to restart")
         return
-    
+
     logger.info(f"Restarting {len(pending_jobs)} pending jobs")
-    
-    # Start scheduler if not running
-    start_scheduler()
-    
+
     for job in pending_jobs:
         try:
-            # Select executor based on priority
-            if job.priority >= 8:
-                executor = "high_priority"
-            elif job.priority <= 3:
-                executor = "low_priority"
-            else:
-                executor = "default"
-            
             # Re-schedule the job to run immediately
-            scheduler.add_job(
-                execute_job,
-                "date",
-                run_date=datetime.now(),
-                args=[job.id],
-                id=job.rq_job_id,
-                executor=executor,
-                replace_existing=True,
-            )
-            
+            _schedule_execution(job)
+
             logger.info(f"Restarted job {job.id} ({job.type.value})")
-            
+
         except Exception as e:
             logger.error(f"Failed to restart job {job.id}: {e}")
 
@@ -1,30 +1,88 @@
+import asyncio
 import json
 import os
 import random
-import re
+import signal
+import threading
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 
 import click
 import requests
 from loguru import logger
 
+from . import http_client
+from .completions import CompletionError, chat_completion, extract_json_object
 from .config import Config
+from .prompt_cache import apply_cache_hints, record_usage
 
 # Get models from config or use defaults
 MODELS = Config.get("MODELS", "").split(",") if Config.get("MODELS") else [""]
 # Remove empty strings and strip whitespace
 MODELS = [model.strip() for model in MODELS if model.strip()]
 
-# Global cache for post counts per subdeaddit to improve distribution
-_subdeaddit_post_counts = defaultdict(int)
+# Recent selections, kept to avoid picking the same subdeaddit or user twice in
+# a row. Pipelined loop iterations select from several threads, so histories
+# are only read and updated under the lock.
+_selection_lock = threading.Lock()
 _subdeaddit_selection_history = []
-
-# Global cache for user activity to improve distribution
-_user_activity_cache = {}
 _user_selection_history = []
 
+# Tokens per minute budget shared by all requests, set by `loop --tpm` before
+# any iteration starts. TokenBudget does its own locking.
+_token_budget = None
+
+
+class TokenBudget:
+    """
+    Token bucket limiting the tokens sent to the AI service per minute.
+
+    Requests reserve an estimate before they are sent and settle it with the
+    usage reported in the response, so the budget tracks real usage. Safe to
+    share between threads.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self, tokens: int) -> int:
+        """
+        Block until tokens fit in the budget, then reserve them.
+
+        Returns:
+            The tokens reserved, to be passed to settle. A request larger than
+            the whole budget reserves a full bucket.
+        """
+        tokens = min(tokens, self.capacity)
+        with self.condition:
+            while True:
+                self._refill()
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return tokens
+                # Settled requests may return tokens before the refill does
+                self.condition.wait((tokens - self.available) / self.rate)
+
+    def settle(self, reserved: int, used: int):
+        """Replace a reservation with the tokens the request actually used."""
+        with self.condition:
+            self._refill()
+            self.available = min(self.capacity, self.available + reserved - used)
+            self.condition.notify_all()
+
 
 def get_subdeaddit_post_counts():
     """
@@ -34,8 +92,8 @@ def get_subdeaddit_post_counts():
         dict: Mapping of subdeaddit names to their post counts
     """
     try:
-        response = requests.get(
-            f"{get_api_base_url()}/api/posts?limit=10000", 
+        response = http_client.get(
+            f"{get_api_base_url()}/api/posts?limit=10000&fields=subdeaddit", 
             headers=get_api_headers(),
             timeout=30
         )
@@ -84,20 +142,21 @@ def select_subdeaddit_weighted(subdeaddits):
         weight = (max_posts + 1) - current_posts
         weights.append(max(weight, 1))  # Ensure minimum weight of 1
     
-    # Prevent consecutive selections of the same subdeaddit if there are alternatives
-    if len(_subdeaddit_selection_history) > 0:
-        last_selected = _subdeaddit_selection_history[-1]
-        for i, sub in enumerate(subdeaddits):
-            if sub["name"] == last_selected and len(subdeaddits) > 1:
-                weights[i] = max(1, weights[i] // 3)  # Reduce weight significantly but don't eliminate
+    with _selection_lock:
+        # Prevent consecutive selections of the same subdeaddit if there are alternatives
+        if len(_subdeaddit_selection_history) > 0:
+            last_selected = _subdeaddit_selection_history[-1]
+            for i, sub in enumerate(subdeaddits):
+                if sub["name"] == last_selected and len(subdeaddits) > 1:
+                    weights[i] = max(1, weights[i] // 3)  # Reduce weight significantly but don't eliminate
     
-    # Use weighted random selection
-    selected_subdeaddit = random.choices(subdeaddits, weights=weights, k=1)[0]
+        # Use weighted random selection
+        selected_subdeaddit = random.choices(subdeaddits, weights=weights, k=1)[0]
     
-    # Update selection history (keep last 5 selections)
-    _subdeaddit_selection_history.append(selected_subdeaddit["name"])
-    if len(_subdeaddit_selection_history) > 5:
-        _subdeaddit_selection_history.pop(0)
+        # Update selection history (keep last 5 selections)
+        _subdeaddit_selection_history.append(selected_subdeaddit["name"])
+        if len(_subdeaddit_selection_history) > 5:
+            _subdeaddit_selection_history.pop(0)
     
     logger.info(f"Weighted selection: {selected_subdeaddit['name']} (current posts: {post_counts.get(selected_subdeaddit['name'], 0)}, weight: {weights[subdeaddits.index(selected_subdeaddit)]})")
     
@@ -127,23 +186,24 @@ def select_subdeaddit_round_robin(subdeaddits):
     min_posts = min([post_counts.get(sub["name"], 0) for sub in subdeaddits])
     candidates = [sub for sub in subdeaddits if post_counts.get(sub["name"], 0) == min_posts]
     
-    # If multiple candidates have the same minimum count, use weighted random among them
-    if len(candidates) > 1:
-        # Avoid consecutive selections from history
-        if len(_subdeaddit_selection_history) > 0:
-            last_selected = _subdeaddit_selection_history[-1]
-            non_recent = [sub for sub in candidates if sub["name"] != last_selected]
-            if non_recent:
-                candidates = non_recent
+    with _selection_lock:
+        # If multiple candidates have the same minimum count, use weighted random among them
+        if len(candidates) > 1:
+            # Avoid consecutive selections from history
+            if len(_subdeaddit_selection_history) > 0:
+                last_selected = _subdeaddit_selection_history[-1]
+                non_recent = [sub for sub in candidates if sub["name"] != last_selected]
+                if non_recent:
+                    candidates = non_recent
         
-        selected = random.choice(candidates)
-    else:
-        selected = candidates[0]
+            selected = random.choice(candidates)
+        else:
+            selected = candidates[0]
     
-    # Update selection history
-    _subdeaddit_selection_history.append(selected["name"])
-    if len(_subdeaddit_selection_history) > 5:
-        _subdeaddit_selection_history.pop(0)
+        # Update selection history
+        _subdeaddit_selection_history.append(selected["name"])
+        if len(_subdeaddit_selection_history) > 5:
+            _subdeaddit_selection_history.pop(0)
     
     logger.info(f"Round-robin selection: {selected['name']} (current posts: {post_counts.get(selected['name'], 0)})")
     
@@ -169,21 +229,22 @@ def select_subdeaddit_improved_random(subdeaddits):
     # Use better entropy for random selection
     import secrets
     
-    # Avoid consecutive selections if possible
-    available_subs = subdeaddits.copy()
-    if len(_subdeaddit_selection_history) > 0 and len(subdeaddits) > 1:
-        last_selected = _subdeaddit_selection_history[-1]
-        available_subs = [sub for sub in subdeaddits if sub["name"] != last_selected]
-        if not available_subs:  # Fallback if all are filtered out
-            available_subs = subdeaddits
+    with _selection_lock:
+        # Avoid consecutive selections if possible
+        available_subs = subdeaddits.copy()
+        if len(_subdeaddit_selection_history) > 0 and len(subdeaddits) > 1:
+            last_selected = _subdeaddit_selection_history[-1]
+            available_subs = [sub for sub in subdeaddits if sub["name"] != last_selected]
+            if not available_subs:  # Fallback if all are filtered out
+                available_subs = subdeaddits
     
-    # Use secrets module for cryptographically secure randomness
-    selected = secrets.choice(available_subs)
+        # Use secrets module for cryptographically secure randomness
+        selected = secrets.choice(available_subs)
     
-    # Update selection history
-    _subdeaddit_selection_history.append(selected["name"])
-    if len(_subdeaddit_selection_history) > 5:
-        _subdeaddit_selection_history.pop(0)
+        # Update selection history
+        _subdeaddit_selection_history.append(selected["name"])
+        if len(_subdeaddit_selection_history) > 5:
+            _subdeaddit_selection_history.pop(0)
     
     logger.info(f"Improved random selection: {selected['name']}")
     
@@ -217,22 +278,16 @@ def select_subdeaddit_smart(subdeaddits, strategy="weighted"):
 
 def get_user_activity_counts():
     """
-    Get current post and comment counts for all users from the API.
+    Get current post counts for all users from the API.
+    
+    The API doesn't list comments, so only posts count towards activity.
     
     Returns:
-        dict: Mapping of usernames to their total activity counts (posts + comments)
+        dict: Mapping of usernames to their post counts
     """
     try:
-        # Get posts
-        posts_response = requests.get(
-            f"{get_api_base_url()}/api/posts?limit=10000", 
-            headers=get_api_headers(),
-            timeout=30
-        )
-        
-        # Get comments
-        comments_response = requests.get(
-            f"{get_api_base_url()}/api/comments?limit=10000", 
+        posts_response = http_client.get(
+            f"{get_api_base_url()}/api/posts?limit=10000&fields=user", 
             headers=get_api_headers(),
             timeout=30
         )
@@ -244,12 +299,6 @@ def get_user_activity_counts():
             posts = posts_response.json().get("posts", [])
             for post in posts:
                 activity_counts[post.get("user", "")] += 1
-        
-        # Count comments per user
-        if comments_response.status_code == 200:
-            comments = comments_response.json().get("comments", [])
-            for comment in comments:
-                activity_counts[comment.get("user", "")] += 1
                 
         return dict(activity_counts)
         
@@ -261,7 +310,7 @@ def get_user_activity_counts():
 
 def select_user_weighted(users):
     """
-    Select a user using weighted distribution that favors users with fewer posts/comments.
+    Select a user using weighted distribution that favors users with fewer posts.
     
     Args:
         users (list): List of user dictionaries
@@ -287,25 +336,26 @@ def select_user_weighted(users):
     
     for username in usernames:
         current_activity = activity_counts.get(username, 0)
-        # Weight formula: give higher weight to users with fewer posts/comments
+        # Weight formula: give higher weight to users with fewer posts
         # Add 1 to max_activity to ensure weights are never 0
         weight = (max_activity + 1) - current_activity
         weights.append(max(weight, 1))  # Ensure minimum weight of 1
     
-    # Prevent consecutive selections of the same user if there are alternatives
-    if len(_user_selection_history) > 0:
-        last_selected = _user_selection_history[-1]
-        for i, user in enumerate(users):
-            if user["username"] == last_selected and len(users) > 1:
-                weights[i] = max(1, weights[i] // 3)  # Reduce weight significantly but don't eliminate
+    with _selection_lock:
+        # Prevent consecutive selections of the same user if there are alternatives
+        if len(_user_selection_history) > 0:
+            last_selected = _user_selection_history[-1]
+            for i, user in enumerate(users):
+                if user["username"] == last_selected and len(users) > 1:
+                    weights[i] = max(1, weights[i] // 3)  # Reduce weight significantly but don't eliminate
     
-    # Use weighted random selection
-    selected_user = random.choices(users, weights=weights, k=1)[0]
+        # Use weighted random selection
+        selected_user = random.choices(users, weights=weights, k=1)[0]
     
-    # Update selection history (keep last 5 selections)
-    _user_selection_history.append(selected_user["username"])
-    if len(_user_selection_history) > 5:
-        _user_selection_history.pop(0)
+        # Update selection history (keep last 5 selections)
+        _user_selection_history.append(selected_user["username"])
+        if len(_user_selection_history) > 5:
+            _user_selection_history.pop(0)
     
     logger.info(f"Weighted user selection: {selected_user['username']} (current activity: {activity_counts.get(selected_user['username'], 0)}, weight: {weights[users.index(selected_user)]})")
     
@@ -335,23 +385,24 @@ def select_user_round_robin(users):
     min_activity = min([activity_counts.get(user["username"], 0) for user in users])
     candidates = [user for user in users if activity_counts.get(user["username"], 0) == min_activity]
     
-    # If multiple candidates have the same minimum count, use weighted random among them
-    if len(candidates) > 1:
-        # Avoid consecutive selections from history
-        if len(_user_selection_history) > 0:
-            last_selected = _user_selection_history[-1]
-            non_recent = [user for user in candidates if user["username"] != last_selected]
-            if non_recent:
-                candidates = non_recent
+    with _selection_lock:
+        # If multiple candidates have the same minimum count, use weighted random among them
+        if len(candidates) > 1:
+            # Avoid consecutive selections from history
+            if len(_user_selection_history) > 0:
+                last_selected = _user_selection_history[-1]
+                non_recent = [user for user in candidates if user["username"] != last_selected]
+                if non_recent:
+                    candidates = non_recent
         
-        selected = random.choice(candidates)
-    else:
-        selected = candidates[0]
+            selected = random.choice(candidates)
+        else:
+            selected = candidates[0]
     
-    # Update selection history
-    _user_selection_history.append(selected["username"])
-    if len(_user_selection_history) > 5:
-        _user_selection_history.pop(0)
+        # Update selection history
+        _user_selection_history.append(selected["username"])
+        if len(_user_selection_history) > 5:
+            _user_selection_history.pop(0)
     
     logger.info(f"Round-robin user selection: {selected['username']} (current activity: {activity_counts.get(selected['username'], 0)})")
     
@@ -377,21 +428,22 @@ def select_user_improved_random(users):
     # Use better entropy for random selection
     import secrets
     
-    # Avoid consecutive selections if possible
-    available_users = users.copy()
-    if len(_user_selection_history) > 0 and len(users) > 1:
-        last_selected = _user_selection_history[-1]
-        available_users = [user for user in users if user["username"] != last_selected]
-        if not available_users:  # Fallback if all are filtered out
-            available_users = users
+    with _selection_lock:
+        # Avoid consecutive selections if possible
+        available_users = users.copy()
+        if len(_user_selection_history) > 0 and len(users) > 1:
+            last_selected = _user_selection_history[-1]
+            available_users = [user for user in users if user["username"] != last_selected]
+            if not available_users:  # Fallback if all are filtered out
+                available_users = users
     
-    # Use secrets module for cryptographically secure randomness
-    selected = secrets.choice(available_users)
+        # Use secrets module for cryptographically secure randomness
+        selected = secrets.choice(available_users)
     
-    # Update selection history
-    _user_selection_history.append(selected["username"])
-    if len(_user_selection_history) > 5:
-        _user_selection_history.pop(0)
+        # Update selection history
+        _user_selection_history.append(selected["username"])
+        if len(_user_selection_history) > 5:
+            _user_selection_history.pop(0)
     
     logger.info(f"Improved random user selection: {selected['username']}")
     
@@ -438,7 +490,7 @@ def test_subdeaddit_distribution(num_tests=100, strategy="weighted"):
     
     # Get subdeaddits from API
     try:
-        response = requests.get(
+        response = http_client.get(
             f"{get_api_base_url()}/api/subdeaddits", headers=get_api_headers()
         )
         if response.status_code != 200:
@@ -453,8 +505,8 @@ def test_subdeaddit_distribution(num_tests=100, strategy="weighted"):
         logger.info(f"Testing with {len(subs)} subdeaddits")
         
         # Reset selection history for clean test
-        global _subdeaddit_selection_history
-        _subdeaddit_selection_history.clear()
+        with _selection_lock:
+            _subdeaddit_selection_history.clear()
         
         # Run selections
         selection_counts = defaultdict(int)
@@ -534,7 +586,7 @@ def test_user_distribution(num_tests=100, strategy="weighted"):
     
     # Get users from API
     try:
-        response = requests.get(
+        response = http_client.get(
             f"{get_api_base_url()}/api/users", headers=get_api_headers()
         )
         if response.status_code != 200:
@@ -549,8 +601,8 @@ def test_user_distribution(num_tests=100, strategy="weighted"):
         logger.info(f"Testing with {len(users)} users")
         
         # Reset selection history for clean test
-        global _user_selection_history
-        _user_selection_history.clear()
+        with _selection_lock:
+            _user_selection_history.clear()
         
         # Run selections
         selection_counts = defaultdict(int)
@@ -745,7 +797,11 @@ def get_dynamic_temperature(user_personality_traits, content_type="post"):
 
 
 def send_request(
-    system_prompt: str, prompt: str, user_personality_traits=None, content_type="post"
+    system_prompt: str,
+    prompt: str,
+    user_personality_traits=None,
+    content_type="post",
+    prompt_prefix=None,
 ) -> dict:
     """
     Send a request to the AI API with enhanced error handling and fallback mechanisms.
@@ -755,6 +811,9 @@ def send_request(
         prompt (str): The user prompt for the AI server.
         user_personality_traits (list): User personality traits
         content_type (str): Type of content being generated
+        prompt_prefix (str, optional): Start of the system prompt shared by
+            all authors, see get_prompt_prefix. Defaults to the whole system
+            prompt.
 
     Returns:
         tuple: (response_object, model_name)
@@ -845,50 +904,59 @@ def send_request(
 
     if "openrouter" in OPENAI_API_URL:
         payload["provider"] = {"allow_fallbacks": False}
+    payload = apply_cache_hints(payload, prompt_prefix)
+
+    # Counted against the tokens per minute budget until the response reports
+    # the real usage, at roughly 4 characters per token
+    prompt_tokens = (len(system_prompt) + len(prompt)) // 4
+    estimated_tokens = prompt_tokens + max_tokens
 
     # Enhanced error handling with retries and fallback
     max_retries = 3
     for attempt in range(max_retries):
+        used_tokens = 0
+        if _token_budget is not None:
+            reserved_tokens = _token_budget.acquire(estimated_tokens)
         try:
-            response = requests.post(
-                f"{OPENAI_API_URL}/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=120,
+            data = chat_completion(OPENAI_API_URL, payload, headers, timeout=120)
+
+            # Streams closed early carry no usage, estimate it from the output
+            usage = data.get("usage") or {}
+            record_usage(selected_model, prompt_prefix or system_prompt, usage)
+            used_tokens = usage.get("total_tokens") or prompt_tokens + sum(
+                len(choice.get("message", {}).get("content") or "") // 4
+                for choice in data.get("choices", [])
             )
 
-            if response.status_code == 200:
-                data = response.json()
-
-                # Reconstruct the response to match OpenAI library's structure
-                reconstructed_response = SimpleNamespace(
-                    id=data.get("id"),
-                    object=data.get("object"),
-                    created=data.get("created"),
-                    model=data.get("model"),
-                    choices=[
-                        SimpleNamespace(
-                            index=choice.get("index"),
-                            message=SimpleNamespace(
-                                role=choice.get("message", {}).get("role"),
-                                content=choice.get("message", {}).get("content"),
-                            ),
-                            finish_reason=choice.get("finish_reason"),
-                        )
-                        for choice in data.get("choices", [])
-                    ],
-                    usage=SimpleNamespace(**data.get("usage", {})),
-                )
+            # Reconstruct the response to match OpenAI library's structure
+            reconstructed_response = SimpleNamespace(
+                id=data.get("id"),
+                object=data.get("object"),
+                created=data.get("created"),
+                model=data.get("model"),
+                choices=[
+                    SimpleNamespace(
+                        index=choice.get("index"),
+                        message=SimpleNamespace(
+                            role=choice.get("message", {}).get("role"),
+                            content=choice.get("message", {}).get("content"),
+                        ),
+                        finish_reason=choice.get("finish_reason"),
+                    )
+                    for choice in data.get("choices", [])
+                ],
+                usage=SimpleNamespace(**usage),
+            )
 
-                logger.info(f"Response received using model {selected_model}.")
-                return reconstructed_response, selected_model
-            else:
-                logger.warning(
-                    f"API call failed (attempt {attempt + 1}/{max_retries}): HTTP {response.status_code}"
-                )
-                if attempt < max_retries - 1:
-                    time.sleep(2**attempt)  # Exponential backoff
+            logger.info(f"Response received using model {selected_model}.")
+            return reconstructed_response, selected_model
 
+        except CompletionError as e:
+            logger.warning(
+                f"API call failed (attempt {attempt + 1}/{max_retries}): HTTP {e.status_code}"
+            )
+            if attempt < max_retries - 1:
+                time.sleep(2**attempt)  # Exponential backoff
         except requests.RequestException as e:
             logger.warning(
                 f"Request error (attempt {attempt + 1}/{max_retries}): {str(e)}"
@@ -901,6 +969,9 @@ def send_request(
             )
             if attempt < max_retries - 1:
                 time.sleep(2**attempt)
+        finally:
+            if _token_budget is not None:
+                _token_budget.settle(reserved_tokens, used_tokens)
 
 
 def parse_data(api_response: dict, type: str, subdeaddit_name: str = "") -> dict:
@@ -914,75 +985,14 @@ def parse_data(api_response: dict, type: str, subdeaddit_name: str = "") -> dict
         logger.error(f"Error accessing API response content: {str(e)}")
         return {}
 
-    # Remove <think> and </think> tags from AI responses (case-insensitive)
-    generated_text = re.sub(
-        r"<think>.*?</think>", "", generated_text, flags=re.DOTALL | re.IGNORECASE
-    )
-    generated_text = generated_text.strip()
-
     logger.info(f"Received text: {generated_text}")
 
-    # Try to extract JSON from the text
-    json_str = ""
-    brace_count = 0
-    in_json = False
-    for line in generated_text.split("\n"):
-        if "{" in line and not in_json:
-            in_json = True
-        if in_json:
-            json_str += line + "\n"
-            brace_count += line.count("{") - line.count("}")
-        if brace_count == 0 and in_json:
-            break
-
-    # Ensure JSON is properly closed
-    if brace_count > 0:
-        json_str += "}" * brace_count
-        logger.info(f"Added {brace_count} closing braces to complete JSON structure")
-
-    if not json_str:
+    # Find the JSON object, repairing common mistakes
+    json_data = extract_json_object(generated_text)
+    if json_data is None:
         logger.error("No JSON object found in the response")
         return {}
 
-    # Function to fix common JSON issues
-    def fix_json(json_str):
-        # Replace single quotes with double quotes
-        json_str = json_str.replace("'", '"')
-        # Remove trailing commas
-        json_str = re.sub(r",\s*}", "}", json_str)
-        json_str = re.sub(r",\s*]", "]", json_str)
-        # Add missing commas between key-value pairs
-        json_str = re.sub(r'"\s*}\s*"', '",\n"', json_str)
-        # Ensure all keys are in double quotes
-        json_str = re.sub(r"(\w+)(?=\s*:)", r'"\1"', json_str)
-        # Remove any non-JSON content before the first '{' and after the last '}'
-        json_str = re.sub(r"^[^{]*", "", json_str)
-        json_str = re.sub(r"[^}]*$", "", json_str)
-
-        # Replace <p> with <br> for line breaks
-        json_str = json_str.replace("<p>", "<br>")
-        # Remove </p>
-        json_str = json_str.replace("</p>", "")
-
-        # Replace \n with <br> for line breaks
-        json_str = json_str.replace("\\n", "<br>")
-        return json_str.strip()
-
-    # Try to parse the JSON
-    try:
-        json_data = json.loads(json_str)
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON: {e}")
-        # Attempt to fix common JSON issues
-        fixed_json_str = fix_json(json_str)
-        try:
-            json_data = json.loads(fixed_json_str)
-            logger.info("Successfully parsed JSON after fixes")
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON even after attempted fixes: {e}")
-            logger.error(f"Problematic JSON string: {fixed_json_str}")
-            return {}
-
     # Function to convert keys to lowercase recursively
     def lowercase_keys(obj):
         if isinstance(obj, dict):
@@ -1051,7 +1061,7 @@ def ingest(data: dict, type: str) -> requests.Response:
     logger.info(f"Data to be POSTed: {data}")
 
     try:
-        response = requests.post(
+        response = http_client.post(
             ingest_url, json=to_post, headers=get_api_headers(), timeout=30
         )
         logger.info(f"Response received from {ingest_url}")
@@ -1078,7 +1088,7 @@ def get_random_user(strategy="weighted"):
         dict: Selected user or None if error
     """
     try:
-        response = requests.get(
+        response = http_client.get(
             f"{get_api_base_url()}/api/users", headers=get_api_headers(), timeout=30
         )
         if response.status_code == 401:
@@ -1160,7 +1170,7 @@ def get_post_type_description(post_type: str) -> str:
 
 
 def get_post_by_title(title):
-    response = requests.get(
+    response = http_client.get(
         f"{get_api_base_url()}/api/posts?limit=1&title={title}",
         headers=get_api_headers(),
     )
@@ -1223,6 +1233,52 @@ def get_personality_archetype(personality_traits):
         return "balanced"
 
 
+def get_prompt_prefix(content_type="post", subdeaddit_context=None) -> str:
+    """
+    Get the start of the system prompt shared by all authors.
+
+    Static instructions come first, then the community, see
+    deaddit.prompt_cache. get_system_prompt adds the persona.
+
+    Args:
+        content_type (str): Type of content being generated
+        subdeaddit_context (dict, optional): Subdeaddit information for context
+
+    Returns:
+        str: Prompt prefix
+    """
+    base_identity = """You are an AI generating authentic content for Deaddit as the person described below."""
+
+    # Authenticity reminders
+    authenticity_rules = """Authenticity Guidelines:
+- Write as this specific person would, with their unique perspective and voice
+- Include natural imperfections, personal biases, and individual quirks
+- React genuinely to content based on your interests and personality
+- Use vocabulary and references appropriate to your age, background, and interests
+- Avoid generic responses that could come from anyone
+- Don't explicitly state your background unless naturally relevant
+- No greetings like "Hey everyone" or "Fellow redditors" - jump into your point
+- Let your personality show through your choice of examples, analogies, and focus areas"""
+
+    # Content type specific instructions
+    content_instructions = {
+        "post": "You're creating an original post that should spark discussion and engagement within the community.",
+        "comment": "You're responding to a post with your genuine reaction, opinion, or additional perspective.",
+        "reply": "You're directly engaging with another user's comment, creating a natural conversation flow.",
+    }
+
+    # Subdeaddit context if provided
+    community_context = ""
+    if subdeaddit_context:
+        community_context = f" You're familiar with r/{subdeaddit_context['name']} and understand its community culture and typical discussion patterns."
+
+    return f"""{base_identity}
+
+{authenticity_rules}
+
+{content_instructions[content_type]}{community_context}"""
+
+
 def get_system_prompt(user: dict, content_type="post", subdeaddit_context=None) -> str:
     """
     Generate a dynamic system prompt based on user personality and context.
@@ -1237,8 +1293,9 @@ def get_system_prompt(user: dict, content_type="post", subdeaddit_context=None)
     """
     personality_archetype = get_personality_archetype(user["personality_traits"])
 
-    # Base prompt components
-    base_identity = f"""You are an AI generating authentic content for Deaddit as {user["username"]}, a {user["age"]}-year-old {user["gender"].lower()} {user["occupation"].lower()}."""
+    # The persona follows the prefix shared by all authors, so requests share
+    # the longest possible prefix, see deaddit.prompt_cache
+    persona_identity = f"""You are {user["username"]}, a {user["age"]}-year-old {user["gender"].lower()} {user["occupation"].lower()}."""
 
     # Personality-specific behavioral guidelines
     personality_guidelines = {
@@ -1262,37 +1319,12 @@ def get_system_prompt(user: dict, content_type="post", subdeaddit_context=None)
     # Writing style integration
     style_guidance = f" Your natural writing style is {user['writing_style'].lower()}, which influences your tone, vocabulary choice, and sentence structure."
 
-    # Content type specific instructions
-    content_instructions = {
-        "post": "You're creating an original post that should spark discussion and engagement within the community.",
-        "comment": "You're responding to a post with your genuine reaction, opinion, or additional perspective.",
-        "reply": "You're directly engaging with another user's comment, creating a natural conversation flow.",
-    }
+    return f"""{get_prompt_prefix(content_type, subdeaddit_context)}
 
-    # Subdeaddit context if provided
-    community_context = ""
-    if subdeaddit_context:
-        community_context = f" You're familiar with r/{subdeaddit_context['name']} and understand its community culture and typical discussion patterns."
-
-    # Authenticity reminders
-    authenticity_rules = """\n\nAuthenticity Guidelines:
-- Write as this specific person would, with their unique perspective and voice
-- Include natural imperfections, personal biases, and individual quirks
-- React genuinely to content based on your interests and personality
-- Use vocabulary and references appropriate to your age, background, and interests
-- Avoid generic responses that could come from anyone
-- Don't explicitly state your background unless naturally relevant
-- No greetings like "Hey everyone" or "Fellow redditors" - jump into your point
-- Let your personality show through your choice of examples, analogies, and focus areas"""
-
-    return f"""{base_identity}
-
-{personality_guidelines[personality_archetype]}{expertise_context}{style_guidance}
-
-{content_instructions[content_type]}{community_context}
+{persona_identity} {personality_guidelines[personality_archetype]}{expertise_context}{style_guidance}
 
 Interests: {", ".join(user["interests"])}
-Personality: {", ".join(user["personality_traits"])}{authenticity_rules}"""
+Personality: {", ".join(user["personality_traits"])}"""
 
 
 def analyze_community_culture(subdeaddit_info, recent_posts):
@@ -1363,7 +1395,7 @@ def get_post_prompt(
 ) -> str:
     # Get recent posts for community culture analysis
     try:
-        recent_posts_response = requests.get(
+        recent_posts_response = http_client.get(
             f"{get_api_base_url()}/api/posts?subdeaddit={subdeaddit['name']}&limit=20",
             headers=get_api_headers(),
             timeout=10,
@@ -1450,7 +1482,7 @@ def create_post(subdeaddit_name: str = "") -> dict:
         return None
 
     # Get the subreddits from API
-    response = requests.get(
+    response = http_client.get(
         f"{get_api_base_url()}/api/subdeaddits", headers=get_api_headers()
     )
     if response.status_code != 200:
@@ -1479,7 +1511,7 @@ def create_post(subdeaddit_name: str = "") -> dict:
     logger.info(f"Selected post type: {selected_post_type}")
 
     # First, get posts with the same post type
-    same_type_posts = requests.get(
+    same_type_posts = http_client.get(
         f"{get_api_base_url()}/api/posts?subdeaddit={subdeaddit['name']}&post_type={selected_post_type}&limit=10",
         headers=get_api_headers(),
     ).json()["posts"]
@@ -1489,7 +1521,7 @@ def create_post(subdeaddit_name: str = "") -> dict:
     # If we don't have 10 posts, fetch additional posts without the post type filter
     if len(existing_titles) < 10:
         additional_posts_needed = 10 - len(existing_titles)
-        additional_posts = requests.get(
+        additional_posts = http_client.get(
             f"{get_api_base_url()}/api/posts?subdeaddit={subdeaddit['name']}&limit={additional_posts_needed}",
             headers=get_api_headers(),
         ).json()["posts"]
@@ -1504,13 +1536,14 @@ def create_post(subdeaddit_name: str = "") -> dict:
     logger.info(f"Found {len(existing_titles)} existing titles for reference")
 
     system_prompt = get_system_prompt(user, "post", subdeaddit)
+    prompt_prefix = get_prompt_prefix("post", subdeaddit)
 
     prompt = get_post_prompt(subdeaddit, user, selected_post_type, existing_titles)
 
     got_successful_response = False
     while not got_successful_response:
         api_response, model = send_request(
-            system_prompt, prompt, user["personality_traits"], "post"
+            system_prompt, prompt, user["personality_traits"], "post", prompt_prefix
         )
         post_data = parse_data(api_response, "post", subdeaddit["name"])
         if post_data is not None:
@@ -2693,8 +2726,9 @@ def create_comment(post_id: str = "") -> dict:
 
     if post_id == "":
         # Query the API to get a random post ID
-        response = requests.get(
-            f"{get_api_base_url()}/api/posts?limit=50", headers=get_api_headers()
+        response = http_client.get(
+            f"{get_api_base_url()}/api/posts?limit=50&fields=id,subdeaddit,title",
+            headers=get_api_headers(),
         )
         if response.status_code != 200:
             logger.error("Failed to retrieve posts.")
@@ -2706,8 +2740,9 @@ def create_comment(post_id: str = "") -> dict:
         if len(posts) == 0:
             logger.warning("No posts found. Creating a new post.")
             create_post()
-            response = requests.get(
-                f"{get_api_base_url()}/api/posts?limit=50", headers=get_api_headers()
+            response = http_client.get(
+                f"{get_api_base_url()}/api/posts?limit=50&fields=id,subdeaddit,title",
+                headers=get_api_headers(),
             )
             posts = response.json()["posts"]
 
@@ -2718,7 +2753,7 @@ def create_comment(post_id: str = "") -> dict:
         )
 
     # Query localhost:5000/api/post with the post ID to get the post information
-    response = requests.get(
+    response = http_client.get(
         f"{get_api_base_url()}/api/post/{post_id}", headers=get_api_headers()
     )
 
@@ -2729,7 +2764,7 @@ def create_comment(post_id: str = "") -> dict:
     post_data = response.json()
 
     # Fetch the subdeaddit information
-    subdeaddit_response = requests.get(
+    subdeaddit_response = http_client.get(
         f"{get_api_base_url()}/api/subdeaddits", headers=get_api_headers()
     )
     if subdeaddit_response.status_code != 200:
@@ -2789,6 +2824,7 @@ def create_comment(post_id: str = "") -> dict:
 
     # Craft the enhanced prompt with conversation context
     system_prompt = get_system_prompt(user, response_type, subdeaddit_info)
+    prompt_prefix = get_prompt_prefix(response_type, subdeaddit_info)
     prompt = get_enhanced_comment_prompt(
         post_data,
         user,
@@ -2801,7 +2837,11 @@ def create_comment(post_id: str = "") -> dict:
 
     # Send the request to the LLM
     api_response, model = send_request(
-        system_prompt, prompt, user["personality_traits"], response_type
+        system_prompt,
+        prompt,
+        user["personality_traits"],
+        response_type,
+        prompt_prefix,
     )
     comment_data = parse_data(api_response, "comment")
     comment_data["post_id"] = post_id
@@ -2843,7 +2883,7 @@ def get_existing_users(limit=10):
     Returns:
         list: List of dictionaries containing user information.
     """
-    response = requests.get(
+    response = http_client.get(
         f"{get_api_base_url()}/api/users", headers=get_api_headers()
     )
     if response.status_code != 200:
@@ -2969,7 +3009,7 @@ def get_random_post_from_subdeaddit(subdeaddit_name: str) -> str:
         str: A random post ID from the specified subdeaddit, or None if no posts are found.
     """
     # Query the API to get posts from the specified subdeaddit
-    response = requests.get(
+    response = http_client.get(
         f"{get_api_base_url()}/api/posts?subdeaddit={subdeaddit_name}&limit=50",
         headers=get_api_headers(),
     )
@@ -2998,7 +3038,7 @@ def ingest_user(user_data: dict):
         user_data (dict): The user data to ingest.
     """
     ingest_url = f"{get_api_base_url()}/api/ingest/user"
-    response = requests.post(ingest_url, json=user_data, headers=get_api_headers())
+    response = http_client.post(ingest_url, json=user_data, headers=get_api_headers())
 
     if response.status_code == 201:
         logger.info(f"User {user_data['username']} ingested successfully")
@@ -3125,6 +3165,105 @@ def comment(ctx, post, subdeaddit):
         create_comment()
 
 
+def loop_action():
+    """Create a post 10% of the time, otherwise a comment."""
+    if random.random() < 0.10:
+        return create_post()
+    return create_comment()
+
+
+async def run_pipelined(count: int, concurrency: int, wait: float = 0) -> int:
+    """
+    Run loop iterations with up to `concurrency` of them in flight.
+
+    Generation and ingestion are blocking calls, so each iteration runs on a
+    worker thread sharing the pooled HTTP connections. A new iteration starts
+    only when one finishes, so no work queues up ahead of the AI service. The
+    first Ctrl+C stops starting iterations and waits for the ones in flight,
+    the second one exits right away, abandoning them.
+
+    Args:
+        count: Number of iterations
+        concurrency: Maximum number of iterations in flight
+        wait: Minimum seconds between the starts of two iterations
+
+    Returns:
+        Number of iterations that created content
+    """
+    event_loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+
+    def stop():
+        if not stopping.is_set():
+            logger.warning(
+                "Stopping, waiting for the iterations in flight (Ctrl+C again to abort)"
+            )
+            stopping.set()
+        else:
+            # Worker threads can't be interrupted and would keep the
+            # interpreter alive until their requests end
+            logger.warning("Aborting the iterations in flight")
+            os._exit(130)
+
+    try:
+        event_loop.add_signal_handler(signal.SIGINT, stop)
+        event_loop.add_signal_handler(signal.SIGTERM, stop)
+    except NotImplementedError:
+        # Signal handlers are not available on Windows event loops
+        pass
+
+    executor = ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="loader-loop"
+    )
+    in_flight = set()
+    started = 0
+    succeeded = 0
+    last_start = None
+    try:
+        while in_flight or (started < count and not stopping.is_set()):
+            while (
+                started < count
+                and len(in_flight) < concurrency
+                and not stopping.is_set()
+            ):
+                if last_start is not None:
+                    delay = wait - (event_loop.time() - last_start)
+                    if delay > 0:
+                        # Sleep until the next start is due, or until stopped
+                        try:
+                            await asyncio.wait_for(stopping.wait(), delay)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+                in_flight.add(event_loop.run_in_executor(executor, loop_action))
+                started += 1
+                last_start = event_loop.time()
+                logger.info(f"Iteration {started}/{count} started")
+
+            if not in_flight:
+                continue
+            done, in_flight = await asyncio.wait(
+                in_flight, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    if future.result():
+                        succeeded += 1
+                except Exception as e:
+                    logger.error(f"Iteration failed: {e}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            event_loop.remove_signal_handler(signal.SIGINT)
+            event_loop.remove_signal_handler(signal.SIGTERM)
+        except NotImplementedError:
+            pass
+
+    logger.info(f"{succeeded}/{started} iterations created content")
+    return succeeded
+
+
 @cli.command()
 @click.option(
     "--count", type=int, default=1, help="Number of times to repeat the action"
@@ -3132,18 +3271,39 @@ def comment(ctx, post, subdeaddit):
 @click.option(
     "--wait", type=int, default=0, help="Wait time in seconds between iterations"
 )
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of iterations in flight at once",
+)
+@click.option(
+    "--tpm",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Tokens per minute budget for the AI service, 0 for no limit",
+)
 @click.pass_context
-def loop(ctx, count, wait):
+def loop(ctx, count, wait, concurrency, tpm):
     """Perform actions in a loop"""
+    global _token_budget
+
+    if tpm:
+        _token_budget = TokenBudget(tpm)
+
+    if concurrency > 1:
+        logger.info(
+            f"Loop enabled. Running {count} iterations, {concurrency} at a time."
+        )
+        asyncio.run(run_pipelined(count, concurrency, wait))
+        return
+
     logger.info(
         f"Loop enabled. Running {count} iterations with {wait} seconds wait time."
     )
     for i in range(count):
         logger.info(f"Iteration {i + 1}/{count}")
-        if random.random() < 0.10:
-            create_post()
-        else:
-            create_comment()
+        loop_action()
         if i < count - 1 and wait > 0:
             logger.info(f"Waiting for {wait} seconds before the next iteration...")
             time.sleep(wait)
@@ -31,6 +31,8 @@ class Post(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     model = db.Column(db.String(100), index=True)
     post_type = db.Column(db.String(50), index=True)
+    # Denormalized, maintained by deaddit.counters
+    comment_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     subdeaddit = db.relationship("Subdeaddit", backref=db.backref("posts", lazy=True))
     comments = db.relationship("Comment", back_populates="post", lazy="dynamic")
@@ -51,6 +53,11 @@ class Comment(db.Model):
     )
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     model = db.Column(db.String(100), index=True)
+    # Denormalized, maintained by deaddit.counters
+    reply_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    descendant_count = db.Column(
+        db.Integer, default=0, server_default="0", nullable=False
+    )
 
     post = db.relationship("Post", back_populates="comments")
 
@@ -110,6 +117,12 @@ class Job(db.Model):
     completed_at = db.Column(db.DateTime)
     estimated_completion = db.Column(db.DateTime)
     rq_job_id = db.Column(db.String(36), unique=True, index=True)
+    # Lease of the worker running the job, renewed by its heartbeat, see
+    # deaddit.jobs.claim_job
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    heartbeat_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     def to_dict(self):
         return {
@@ -131,6 +144,11 @@ class Job(db.Model):
             if self.estimated_completion
             else None,
             "rq_job_id": self.rq_job_id,
+            "lease_owner": self.lease_owner,
+            "heartbeat_at": self.heartbeat_at.isoformat()
+            if self.heartbeat_at
+            else None,
+            "attempts": self.attempts,
         }
 
 
@@ -250,6 +268,24 @@ class ApiEndpointConfig(db.Model):
         }
 
 
+class CacheInvalidation(db.Model):
+    """A cache tag invalidated by one process, for the others to apply."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    tag = db.Column(db.String(200), nullable=False)
+    source = db.Column(db.String(32), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class ProcessStats(db.Model):
+    """Counters of one worker process, for the admin pages of the web process."""
+
+    process = db.Column(db.String(100), primary_key=True)
+    http = db.Column(db.JSON)
+    prompt_cache = db.Column(db.JSON)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
 class Setting(db.Model):
     key = db.Column(db.String(100), primary_key=True)
     value = db.Column(db.Text)
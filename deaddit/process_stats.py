@@ -0,0 +1,76 @@
+"""
+Counters of worker processes, for the admin pages of the web process.
+
+HTTP connection reuse and prompt cache counters are kept in the process that
+sends the requests. While jobs run in worker processes, the web process sends
+none, so each worker stores its counters in the ProcessStats table after every
+job, and the admin endpoints add those of the workers that ran a job in the
+last WORKER_STATS_MAX_AGE seconds.
+"""
+
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from deaddit import db
+
+from .config import Config
+from .http_client import get_http_counters
+from .models import ProcessStats
+from .prompt_cache import get_prompt_cache_counters
+
+# Seconds after their last job that the counters of a worker still count
+WORKER_STATS_MAX_AGE = 24 * 60 * 60
+
+
+def _process_name() -> str:
+    """Identify this process among the workers of every host."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def save_process_stats() -> None:
+    """
+    Store the counters of this process for the web process, and drop those of
+    workers gone for longer than WORKER_STATS_MAX_AGE.
+
+    Must run inside an app context, commits the session.
+    """
+    now = datetime.utcnow()
+    db.session.merge(
+        ProcessStats(
+            process=_process_name(),
+            http=get_http_counters(),
+            prompt_cache=get_prompt_cache_counters(),
+            updated_at=now,
+        )
+    )
+    db.session.execute(
+        delete(ProcessStats).where(
+            ProcessStats.updated_at < now - timedelta(seconds=WORKER_STATS_MAX_AGE)
+        )
+    )
+    db.session.commit()
+
+
+def get_worker_stats() -> list[ProcessStats]:
+    """
+    Get the counters stored by worker processes.
+
+    Returns:
+        The counters of workers that ran a job in the last
+        WORKER_STATS_MAX_AGE seconds, none unless jobs run in workers
+    """
+    if Config.get("JOB_EXECUTION") != "worker":
+        return []
+
+    since = datetime.utcnow() - timedelta(seconds=WORKER_STATS_MAX_AGE)
+    return list(
+        db.session.scalars(
+            select(ProcessStats).where(
+                ProcessStats.updated_at >= since,
+                ProcessStats.process != _process_name(),
+            )
+        )
+    )
@@ -0,0 +1,175 @@
+"""
+Prefix cache hints and hit rates for generation prompts.
+
+Inference servers and providers cache the attention state of prompt prefixes:
+vLLM and llama.cpp reuse it for requests starting with the same tokens, and
+OpenAI and Anthropic bill cached prefixes at a discount. Generation prompts
+are therefore laid out as a stable prefix in the system message, static
+instructions first, then the community and the persona, and a volatile suffix
+in the user message with the post or thread and the task. The prefix shared
+across authors, the instructions and the community, is passed along
+separately to key the cache and the statistics.
+
+apply_cache_hints adds the request fields selected by the PROMPT_CACHE_HINTS
+setting. record_usage counts, per model, how often a prefix repeats one sent
+before and how many prompt tokens the service reports as cached, see
+get_prompt_cache_stats. The counters are kept per process, worker processes
+share theirs through deaddit.process_stats.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from .config import Config
+
+CACHE_HINTS = ("none", "anthropic", "openai", "llamacpp")
+
+# Prefixes remembered per model to count repeats
+PREFIX_HISTORY_SIZE = 256
+
+_lock = threading.Lock()
+_recent_prefixes: dict[str, OrderedDict[str, None]] = defaultdict(OrderedDict)
+COUNTERS = ("requests", "prefix_repeats", "reported", "prompt_tokens", "cached_tokens")
+_stats: dict[str, dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+
+def prefix_key(prefix: str) -> str:
+    """Get a short stable hash identifying a prompt prefix."""
+    return hashlib.sha256(prefix.encode()).hexdigest()[:16]
+
+
+def apply_cache_hints(
+    payload: dict[str, Any], prefix: Optional[str] = None
+) -> dict[str, Any]:
+    """
+    Add the prefix cache hints of the PROMPT_CACHE_HINTS setting to a request.
+
+    "anthropic" marks the end of the shared prefix, and of the system message,
+    as cache breakpoints, for Anthropic models, also through OpenRouter.
+    "openai" sets prompt_cache_key, which routes requests with the same
+    prefix to the same cache. "llamacpp" asks the llama.cpp server to keep the
+    prompt in its slot cache. Prefixes shorter than a provider's minimum are
+    not cached, the hints are harmless.
+
+    Args:
+        payload: Request body of /chat/completions whose first message is the
+            system message holding the stable prefix
+        prefix: Start of the system message shared by requests for other
+            authors, defaults to the whole system message
+
+    Returns:
+        The request body with the hints, the given one is not modified
+    """
+    hints = Config.get("PROMPT_CACHE_HINTS", "none")
+    messages = payload.get("messages") or []
+    if hints not in CACHE_HINTS[1:] or not messages:
+        return payload
+
+    system = messages[0]
+    content = system["content"]
+    if prefix is None or not content.startswith(prefix):
+        prefix = content
+    if hints == "anthropic":
+        parts = (
+            [prefix, content[len(prefix) :]]
+            if len(prefix) < len(content)
+            else [content]
+        )
+        cached_system = {
+            **system,
+            "content": [
+                {"type": "text", "text": part, "cache_control": {"type": "ephemeral"}}
+                for part in parts
+            ],
+        }
+        return {**payload, "messages": [cached_system, *messages[1:]]}
+    if hints == "openai":
+        return {**payload, "prompt_cache_key": prefix_key(prefix)}
+    return {**payload, "cache_prompt": True}
+
+
+def _cached_tokens(usage: dict[str, Any]) -> Optional[int]:
+    """Read the cached prompt tokens from usage in the formats services use."""
+    details = usage.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens") is not None:
+        return details["cached_tokens"]
+    if usage.get("cache_read_input_tokens") is not None:
+        return usage["cache_read_input_tokens"]
+    return None
+
+
+def record_usage(model: str, prefix: str, usage: Optional[dict[str, Any]]) -> None:
+    """
+    Count a completion request towards the prefix cache statistics.
+
+    Args:
+        model: Model the request was sent to
+        prefix: Start of the system message shared by requests for other
+            authors, see apply_cache_hints
+        usage: Usage reported with the completion, if any. Streams closed
+            early carry none.
+    """
+    key = prefix_key(prefix)
+    usage = usage or {}
+    cached = _cached_tokens(usage)
+
+    with _lock:
+        stats = _stats[model]
+        stats["requests"] += 1
+
+        recent = _recent_prefixes[model]
+        if key in recent:
+            stats["prefix_repeats"] += 1
+            recent.move_to_end(key)
+        else:
+            recent[key] = None
+            if len(recent) > PREFIX_HISTORY_SIZE:
+                recent.popitem(last=False)
+
+        if cached is not None and usage.get("prompt_tokens"):
+            stats["reported"] += 1
+            stats["prompt_tokens"] += usage["prompt_tokens"]
+            stats["cached_tokens"] += cached
+
+
+def get_prompt_cache_counters() -> dict[str, dict[str, int]]:
+    """Get a copy of the counters of this process, per model."""
+    with _lock:
+        return {model: dict(stats) for model, stats in _stats.items()}
+
+
+def get_prompt_cache_stats(
+    other_counters: Iterable[dict[str, dict[str, int]]] = (),
+) -> dict:
+    """
+    Get the prefix cache statistics of this process and, optionally, others.
+
+    Args:
+        other_counters: Counters of other processes, as returned there by
+            get_prompt_cache_counters
+
+    Returns:
+        Dictionary with the hints in use and, per model, the requests, how
+        many repeated a recent prefix, and the prompt tokens the service
+        reported as cached out of those requests that reported usage
+    """
+    totals: dict[str, dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for counters in [get_prompt_cache_counters(), *other_counters]:
+        for model, stats in counters.items():
+            for name in COUNTERS:
+                totals[model][name] += stats.get(name, 0)
+
+    models = {}
+    for model, stats in totals.items():
+        models[model] = {
+            **stats,
+            "prefix_repeat_rate": round(stats["prefix_repeats"] / stats["requests"], 4),
+            "cache_hit_rate": round(stats["cached_tokens"] / stats["prompt_tokens"], 4)
+            if stats["prompt_tokens"]
+            else None,
+        }
+
+    return {"hints": Config.get("PROMPT_CACHE_HINTS", "none"), "models": models}
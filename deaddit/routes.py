@@ -1,17 +1,29 @@
 from flask import render_template, request
+from markupsafe import Markup
 from sqlalchemy import func
 from sqlalchemy.orm import aliased, joinedload
 
-from deaddit import app, db
+from deaddit import app, cache, db
 
+from .caching import post_tag, tagged_key
 from .config import Config
+from .feed import (
+    get_feed_page,
+    get_keyset_page,
+    get_subdeaddit_models,
+    resolve_feed_seed,
+)
 from .models import Comment, Post, Subdeaddit, User
 from .utils import (
+    build_comment_tree,
+    flatten_comment_tree,
     get_comment_counts_bulk,
-    paginate_posts_with_model_cycling,
     process_post_title,
 )
 
+# Rendered comment trees are invalidated per post, so they can live long
+COMMENT_TREE_CACHE_TIMEOUT = 3600
+
 
 @app.route("/")
 def index():
@@ -55,31 +67,18 @@ def index():
     # Get selected models from query parameters
     selected_models = request.args.getlist("models")
 
-    # Get all posts and randomize the order
-    query = Post.query.order_by(func.random())
-
-    # Apply model filter if models are selected
-    if selected_models:
-        query = query.filter(Post.model.in_(selected_models))
+    # Keep the same ordering across pages by carrying the feed seed along
+    seed = resolve_feed_seed(request.args.get("seed", type=int))
 
-    all_posts = query.all()
-
-    # Get all unique models (either selected or all)
-    if selected_models:
-        all_models = selected_models
-    else:
-        all_models = db.session.query(Post.model).distinct().all()
-        all_models = [model[0] for model in all_models]
+    # Get the current page of the seeded random feed
+    paginated_posts, has_more = get_feed_page(
+        seed, selected_models, page, posts_per_page
+    )
 
     # Process post titles
-    for post in all_posts:
+    for post in paginated_posts:
         post.title = process_post_title(post.title)
 
-    # Paginate posts with model cycling
-    paginated_posts, total_posts, has_more = paginate_posts_with_model_cycling(
-        all_posts, all_models, page, posts_per_page
-    )
-
     # Get comment counts efficiently
     post_ids = [post.id for post in paginated_posts]
     comment_counts = get_comment_counts_bulk(post_ids)
@@ -90,6 +89,7 @@ def index():
         comment_counts=comment_counts,
         page=page,
         has_more=has_more,
+        seed=seed,
         selected_models=selected_models,
         title="Deaddit - The Reddit clone with AI users",
         description="Explore Deaddit, the AI-generated Reddit clone featuring diverse discussions and content created by artificial intelligence.",
@@ -99,6 +99,7 @@ def index():
 @app.route("/d/<subdeaddit_name>")
 def subdeaddit(subdeaddit_name):
     page = request.args.get("page", default=1, type=int)
+    cursor = request.args.get("cursor")
     posts_per_page = 10
 
     # Get selected models from query parameters
@@ -107,38 +108,21 @@ def subdeaddit(subdeaddit_name):
     # Check if the subdeaddit exists
     Subdeaddit.query.filter_by(name=subdeaddit_name).first_or_404()
 
-    # Get all posts for this subdeaddit and randomize the order
-    query = Post.query.filter_by(subdeaddit_name=subdeaddit_name).order_by(
-        func.random()
-    )
-
-    # Apply model filter if models are selected
-    if selected_models:
-        query = query.filter(Post.model.in_(selected_models))
-
-    all_posts = query.all()
-
     # Get all unique models used in this subdeaddit
     if selected_models:
         all_models = selected_models
     else:
-        all_models = (
-            db.session.query(Post.model)
-            .filter(Post.subdeaddit_name == subdeaddit_name)
-            .distinct()
-            .all()
-        )
-        all_models = [model[0] for model in all_models]
+        all_models = get_subdeaddit_models(subdeaddit_name)
+
+    # Keyset paginate with one cursor per model lane
+    paginated_posts, next_cursor = get_keyset_page(
+        subdeaddit_name, all_models, cursor, posts_per_page
+    )
 
     # Process post titles
-    for post in all_posts:
+    for post in paginated_posts:
         post.title = process_post_title(post.title)
 
-    # Paginate posts with model cycling
-    paginated_posts, total_posts, has_more = paginate_posts_with_model_cycling(
-        all_posts, all_models, page, posts_per_page
-    )
-
     # Get comment counts efficiently
     post_ids = [post.id for post in paginated_posts]
     comment_counts = get_comment_counts_bulk(post_ids)
@@ -149,7 +133,8 @@ def subdeaddit(subdeaddit_name):
         comment_counts=comment_counts,
         subdeaddit_name=subdeaddit_name,
         page=page,
-        has_more=has_more,
+        has_more=next_cursor is not None,
+        next_cursor=next_cursor,
         selected_models=selected_models,
         title=f"Deaddit - d/{subdeaddit_name}",
     )
@@ -162,64 +147,40 @@ def post(subdeaddit_name, post_id):
     # Get selected models from query parameters
     selected_models = request.args.getlist("models")
 
-    # Query all comments for this post, ordered by upvote count
-    query = Comment.query.filter_by(post_id=post_id).order_by(
-        Comment.upvote_count.desc()
+    # The rendered comment tree is cached until the post's comments change
+    cache_key = tagged_key(
+        f"comment_tree_{post_id}_{','.join(sorted(selected_models))}",
+        post_tag(post_id),
     )
+    comment_tree_html = cache.get(cache_key)
+    if comment_tree_html is None:
+        # Query all comments for this post, ordered by upvote count
+        query = Comment.query.filter_by(post_id=post_id).order_by(
+            Comment.upvote_count.desc()
+        )
 
-    # Apply model filter if models are selected
-    if selected_models:
-        query = query.filter(Comment.model.in_(selected_models))
-
-    comments = query.all()
+        # Apply model filter if models are selected
+        if selected_models:
+            query = query.filter(Comment.model.in_(selected_models))
 
-    def build_comment_tree(comments):
-        comment_dict = {
-            comment.id: {
+        # Children keep the upvote ordering of the query
+        comment_tree = build_comment_tree(
+            query.all(),
+            lambda comment: {
                 "id": comment.id,
                 "content": comment.content,
                 "upvote_count": comment.upvote_count,
                 "user": comment.user,
                 "model": comment.model,
                 "created_at": comment.created_at,
-                "children": [],
-            }
-            for comment in comments
-        }
-
-        root_comments = []
-        for comment in comments:
-            if comment.parent_id is None or comment.parent_id == "":
-                root_comments.append(comment_dict[comment.id])
-            else:
-                parent_id = (
-                    int(comment.parent_id)
-                    if isinstance(comment.parent_id, str)
-                    and comment.parent_id.isdigit()
-                    else comment.parent_id
-                )
-                parent = comment_dict.get(parent_id)
-                if parent:
-                    parent["children"].append(comment_dict[comment.id])
-
-        # Sort children by upvote count
-        for comment in comment_dict.values():
-            comment["children"].sort(key=lambda x: x["upvote_count"], reverse=True)
-
-        # Sort root comments by upvote count
-        root_comments.sort(key=lambda x: x["upvote_count"], reverse=True)
-
-        return root_comments
-
-    def add_comment_levels(comments, level=0):
-        for comment in comments:
-            comment["level"] = level
-            add_comment_levels(comment["children"], level + 1)
-        return comments
-
-    # Build the comment tree
-    root_comments = build_comment_tree(comments)
-    comment_tree = add_comment_levels(root_comments)
+            },
+            children_key="children",
+        )
+        comment_tree_html = render_template(
+            "partials/comment_tree.html",
+            comment_rows=flatten_comment_tree(comment_tree),
+        )
+        cache.set(cache_key, comment_tree_html, timeout=COMMENT_TREE_CACHE_TIMEOUT)
 
     # Truncate the post title for the page title
     truncated_title = (post.title[:60] + "...") if len(post.title) > 60 else post.title
@@ -227,7 +188,7 @@ def post(subdeaddit_name, post_id):
     return render_template(
         "post.html",
         post=post,
-        comment_tree=comment_tree,
+        comment_tree_html=Markup(comment_tree_html),
         subdeaddit_name=subdeaddit_name,
         selected_models=selected_models,
         title=f"Deaddit - {truncated_title}",
@@ -0,0 +1,84 @@
+"""
+Schema upgrades for existing databases.
+
+db.create_all() only creates missing tables, so columns added to a model after
+the database was created never reach existing installs. This module adds them
+in place, and rewrites rows stored before a change to how content is stored.
+"""
+
+from loguru import logger
+from sqlalchemy import func, inspect, update
+from sqlalchemy.schema import CreateColumn
+
+from deaddit import db
+
+from .config import Config
+from .models import Comment, Post
+
+
+def upgrade_schema() -> list[str]:
+    """
+    Add model columns that are missing from existing tables.
+
+    Columns are added with their server default, and any index covering a new
+    column is created as well.
+
+    Returns:
+        List of added columns as "table.column"
+    """
+    inspector = inspect(db.engine)
+    dialect = db.engine.dialect
+    added = []
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            new_columns = [
+                column for column in table.columns if column.name not in existing
+            ]
+            for column in new_columns:
+                ddl = CreateColumn(column).compile(dialect=dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                added.append(f"{table.name}.{column.name}")
+                logger.info(f"Added column {table.name}.{column.name}")
+
+            for index in table.indexes:
+                if any(column in new_columns for column in index.columns):
+                    index.create(connection, checkfirst=True)
+
+    return added
+
+
+def rewrite_reddit_references() -> int:
+    """
+    Apply the ingest-time rewrite of process_content to older content.
+
+    Posts and comments ingested before "reddit" was replaced with "deaddit" at
+    ingest time are rewritten once per database, the CONTENT_REWRITTEN
+    setting records that it ran.
+
+    Returns:
+        Number of rows rewritten
+    """
+    if Config.get("CONTENT_REWRITTEN", "false") == "true":
+        return 0
+
+    rewritten = 0
+    for model in (Post, Comment):
+        # Case-sensitive like process_content, LIKE isn't in SQLite
+        rewrite = func.replace(model.content, "reddit", "deaddit")
+        rewritten += db.session.execute(
+            update(model)
+            .where(rewrite != model.content)
+            .values(content=rewrite)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.session.commit()
+    Config.set("CONTENT_REWRITTEN", "true")
+
+    if rewritten:
+        logger.info(f"Replaced reddit with deaddit in {rewritten} posts and comments")
+    return rewritten
@@ -2,19 +2,25 @@
 Utility functions for the Deaddit application.
 """
 
-from typing import Any
-
-from sqlalchemy import func
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from datetime import datetime, timezone
+from typing import Any, Optional
 
 from deaddit import cache, db
 
-from .models import Comment
+from .caching import post_tag, tagged_keys
+from .models import Post
 
 
 def get_comment_counts_bulk(post_ids: list[int]) -> dict[int, int]:
     """
     Efficiently get comment counts for multiple posts using a single query with caching.
 
+    Counts are cached per post, so pages that share posts share cached work.
+    Cached counts are read with one lookup and the misses are filled with one
+    query.
+
     Args:
         post_ids: List of post IDs to get comment counts for
 
@@ -25,30 +31,40 @@ def get_comment_counts_bulk(post_ids: list[int]) -> dict[int, int]:
         return {}
 
     try:
-        # Try to get cached counts first
-        cache_key = f"comment_counts_{sorted(post_ids)}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
-
-        comment_count_results = (
-            db.session.query(Comment.post_id, func.count(Comment.id).label("count"))
-            .filter(Comment.post_id.in_(post_ids))
-            .group_by(Comment.post_id)
-            .all()
+        # Try to get cached counts first, new comments on a post invalidate its count
+        post_ids = list(dict.fromkeys(post_ids))
+        keys = tagged_keys(
+            [(f"comment_count_{post_id}", [post_tag(post_id)]) for post_id in post_ids]
         )
-
+        cache_keys = dict(zip(post_ids, keys))
+        cached_counts = cache.get_many(*cache_keys.values())
         comment_counts = {
-            result.post_id: result.count for result in comment_count_results
+            post_id: count
+            for post_id, count in zip(post_ids, cached_counts)
+            if count is not None
         }
 
-        # Ensure all posts have a count (even if 0)
-        for post_id in post_ids:
-            if post_id not in comment_counts:
-                comment_counts[post_id] = 0
-
-        # Cache the result for 5 minutes
-        cache.set(cache_key, comment_counts, timeout=300)
+        missing_ids = [post_id for post_id in post_ids if post_id not in comment_counts]
+        if missing_ids:
+            # Counts are kept on the post row, see deaddit.counters
+            fetched_counts = dict(
+                db.session.query(Post.id, Post.comment_count)
+                .filter(Post.id.in_(missing_ids))
+                .all()
+            )
+
+            # Ensure all posts have a count (even if 0)
+            for post_id in missing_ids:
+                comment_counts[post_id] = fetched_counts.get(post_id, 0)
+
+            # Cache the counts for 5 minutes
+            cache.set_many(
+                {
+                    cache_keys[post_id]: comment_counts[post_id]
+                    for post_id in missing_ids
+                },
+                timeout=300,
+            )
 
         return comment_counts
     except Exception as e:
@@ -57,65 +73,115 @@ def get_comment_counts_bulk(post_ids: list[int]) -> dict[int, int]:
         return dict.fromkeys(post_ids, 0)
 
 
-@cache.memoize(timeout=300)
-def get_single_comment_count(post_id: int) -> int:
+def interleave_by_model(
+    lanes: Mapping[Optional[str], Iterable[Any]], model_order: list[Optional[str]]
+) -> Iterator[Any]:
     """
-    Get comment count for a single post with caching.
+    Lazily yield items round-robin from per-model lanes.
+
+    Each step costs O(1): lanes are iterators kept in a deque and an
+    exhausted lane is simply dropped, so models without posts never stall
+    the rotation.
 
     Args:
-        post_id: Post ID to get comment count for
+        lanes: Mapping of model name to an iterable of its posts (a list or a
+            database cursor)
+        model_order: Order in which to visit the models
 
-    Returns:
-        Comment count for the post
+    Yields:
+        Items from the lanes, one model at a time
     """
-    return Comment.query.filter_by(post_id=post_id).count()
-
-
-def paginate_posts_with_model_cycling(
-    all_posts: list[Any], all_models: list[str], page: int, posts_per_page: int
-) -> tuple[list[Any], int, bool]:
+    active = deque(iter(lanes[model]) for model in model_order if model in lanes)
+    exhausted = object()
+
+    while active:
+        lane = active.popleft()
+        item = next(lane, exhausted)
+        if item is not exhausted:
+            yield item
+            active.append(lane)
+
+
+def build_comment_tree(
+    comments: Iterable[Any],
+    make_node: Callable[[Any], dict[str, Any]],
+    children_key: str = "replies",
+) -> list[dict[str, Any]]:
     """
-    Paginate posts while cycling through models for balanced representation.
+    Build a nested comment tree in linear time.
+
+    Children are grouped under their parent in a single pass and keep the
+    order of the input, so ordering the comments (e.g. by upvotes) orders
+    every level of the tree. Comments whose parent is missing are left out.
 
     Args:
-        all_posts: List of all posts to paginate
-        all_models: List of model names to cycle through
-        page: Current page number (1-indexed)
-        posts_per_page: Number of posts per page
+        comments: Comments of one post
+        make_node: Function that turns a comment into its output dictionary
+        children_key: Key under which a node's replies are stored
 
     Returns:
-        Tuple of (paginated_posts, total_posts, has_more)
+        List of root comment nodes
     """
-    import random
-    from itertools import cycle
-
-    # Randomize the order of models
-    models_copy = all_models.copy()
-    random.shuffle(models_copy)
-    model_cycle = cycle(models_copy)
+    nodes = {}
+    parent_ids = {}
+    for comment in comments:
+        node = make_node(comment)
+        node[children_key] = []
+        nodes[comment.id] = node
+
+        # Parent IDs may have been ingested as strings
+        parent_id = comment.parent_id
+        if parent_id == "":
+            parent_id = None
+        elif isinstance(parent_id, str) and parent_id.isdigit():
+            parent_id = int(parent_id)
+        parent_ids[comment.id] = parent_id
+
+    roots = []
+    for comment_id, node in nodes.items():
+        parent_id = parent_ids[comment_id]
+        if parent_id is None:
+            roots.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id][children_key].append(node)
+
+    return roots
+
+
+def flatten_comment_tree(
+    roots: list[dict[str, Any]], children_key: str = "children"
+) -> list[dict[str, Any]]:
+    """
+    Flatten a comment tree into display order for non-recursive rendering.
 
-    # Create a dictionary to store posts by model
-    posts_by_model = {model: [] for model in models_copy}
+    Each row gets "level", "has_children", and "closes": the number of
+    ancestors whose last descendant is this row, i.e. how many enclosing
+    blocks a template must close after rendering it.
 
-    # Populate the posts_by_model dictionary
-    for post in all_posts:
-        if post.model in posts_by_model:
-            posts_by_model[post.model].append(post)
+    Args:
+        roots: Root nodes returned by build_comment_tree
+        children_key: Key under which a node's replies are stored
 
-    # Create the final ordered list of posts
-    ordered_posts = []
-    while len(ordered_posts) < len(all_posts):
-        current_model = next(model_cycle)
-        if posts_by_model[current_model]:
-            ordered_posts.append(posts_by_model[current_model].pop(0))
+    Returns:
+        List of rows, without the nested children
+    """
+    rows = []
+    stack = [(node, 0) for node in reversed(roots)]
+    while stack:
+        node, level = stack.pop()
+        children = node[children_key]
+        row = {key: value for key, value in node.items() if key != children_key}
+        row.update(level=level, has_children=bool(children), closes=0)
+        rows.append(row)
+        stack.extend((child, level + 1) for child in reversed(children))
 
-    # Apply pagination
-    offset = (page - 1) * posts_per_page
-    paginated_posts = ordered_posts[offset : offset + posts_per_page]
-    total_posts = len(all_posts)
-    has_more = total_posts > page * posts_per_page
+    # A leaf closes every ancestor between its level and the next row's level
+    for index, row in enumerate(rows):
+        if not row["has_children"]:
+            next_level = rows[index + 1]["level"] if index + 1 < len(rows) else 0
+            row["closes"] = row["level"] - next_level
 
-    return paginated_posts, total_posts, has_more
+    return rows
 
 
 def process_post_title(title: str) -> str:
@@ -137,3 +203,38 @@ def process_post_title(title: str) -> str:
     title = re.sub(r"reddit", "deaddit", title, flags=re.IGNORECASE)
 
     return title
+
+
+def process_content(content: str) -> str:
+    """
+    Replace Reddit references in post and comment bodies, applied at ingest time.
+
+    Args:
+        content: Original content
+
+    Returns:
+        Processed content
+    """
+    return content.replace("reddit", "deaddit")
+
+
+def parse_utc_datetime(value: str) -> datetime:
+    """
+    Parse an ISO 8601 date or date and time as stored, in UTC without a zone.
+
+    Times with an offset are converted to UTC, times without one are taken
+    to be in UTC already.
+
+    Args:
+        value: ISO 8601 date or date and time, e.g. 2024-05-01T12:00:00+02:00
+
+    Returns:
+        The naive UTC datetime
+
+    Raises:
+        ValueError: If the value is not an ISO 8601 date
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -9,6 +9,7 @@ from flask_socketio import disconnect, emit, join_room, leave_room
 from loguru import logger
 
 from deaddit import socketio
+from deaddit.jobs import start_job_updates_relay
 
 
 def handle_socket_errors(f):
@@ -54,6 +55,7 @@ def admin_connect_error(data):
 def join_job_updates(data):
     """Join job updates room for real-time job status."""
     join_room("job_updates")
+    start_job_updates_relay()
     logger.info("Client joined job_updates room")
     emit("joined", {"room": "job_updates"})
 